@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+
+from core.asgi import StreamingASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+# Request threads share pooled connections rather than keep one each
+os.environ.setdefault('DB_POOL_SIZE', '10')
+
+django.setup(set_prefix=False)
 
-application = get_asgi_application()
+# As get_asgi_application(), with streamed bodies read off the event loop
+application = StreamingASGIHandler()
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
 from pathlib import Path
+import importlib.util
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -38,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'core',
     'rest_framework',
     'rest_framework.authtoken',
@@ -47,6 +49,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -75,22 +78,108 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'app.wsgi.application'
+ASGI_APPLICATION = 'app.asgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
+# Without DB_POOL_SIZE, connections persist for DB_CONN_MAX_AGE seconds,
+# which suits WSGI servers with a fixed set of threads. Under ASGI every
+# request runs in a new thread, which would keep a connection of its own,
+# so app.asgi turns on the pool instead: each process then shares up to
+# DB_POOL_SIZE connections, handed back after every request.
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 0))
+DB_CONN_MAX_AGE = (
+    0 if DB_POOL_SIZE else int(os.environ.get('DB_CONN_MAX_AGE', 60))
+)
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': (
+            'core.db' if DB_POOL_SIZE else 'django.db.backends.postgresql'
+        ),
         'HOST': os.environ.get("DB_HOST"),
         'NAME': os.environ.get("DB_NAME"),
         'USER': os.environ.get("DB_USER"),
         'PASSWORD': os.environ.get("DB_PASS"),
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        # Check reused connections, from the pool or kept open
+        'CONN_HEALTH_CHECKS': bool(DB_POOL_SIZE or DB_CONN_MAX_AGE),
+        'POOL': {
+            'SIZE': DB_POOL_SIZE,
+            'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        },
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+# Token and list caches. Hits must not touch the database, so the
+# default is locmem, which keeps entries in each process. Signals only
+# invalidate the process they run in, so with several workers, or
+# management commands changing data, set CACHE_BACKEND to redis or
+# memcached (with CACHE_LOCATION) to share the caches between them.
+#
+# Each cache has a location of its own, so clearing one never empties
+# the other: a locmem store, or a Redis database, per cache. Memcached
+# flushes a whole server, so give each cache a server through
+# AUTH_TOKEN_CACHE_LOCATION and RESPONSE_CACHE_LOCATION.
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+CACHE_BACKENDS = {
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+}
+CACHE_LOCATION = os.environ.get(
+    'CACHE_LOCATION',
+    {
+        'redis': 'redis://127.0.0.1:6379',
+        'memcached': '127.0.0.1:11211',
+    }.get(CACHE_BACKEND),
+)
+
+
+def shared_cache(name, redis_db, timeout, max_entries):
+    """Return the settings of a cache on CACHE_BACKEND"""
+    location = {
+        'redis': f'{CACHE_LOCATION}/{redis_db}',
+        'memcached': CACHE_LOCATION,
+        'locmem': name,
+    }[CACHE_BACKEND]
+    env = name.upper().replace('-', '_')
+    config = {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+        'LOCATION': os.environ.get(f'{env}_CACHE_LOCATION', location),
+        'KEY_PREFIX': name,
+        'TIMEOUT': timeout,
+    }
+    if CACHE_BACKEND == 'locmem':
+        config['OPTIONS'] = {'MAX_ENTRIES': max_entries}
+    return config
+
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'auth_tokens': shared_cache(
+        'auth-token',
+        1,
+        int(os.environ.get('AUTH_TOKEN_CACHE_TTL', 60)),
+        int(os.environ.get('AUTH_TOKEN_CACHE_MAX_ENTRIES', 10000)),
+    ),
+    'responses': shared_cache(
+        'response',
+        2,
+        int(os.environ.get('RESPONSE_CACHE_TTL', 300)),
+        int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 10000)),
+    ),
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -131,6 +220,19 @@ MEDIA_URL = '/static/media/'
 STATIC_ROOT = '/vol/web/static'
 MEDIA_ROOT = '/vol/web/media'
 
+# Threads generating thumbnails and WebP variants of uploaded images
+IMAGE_VARIANT_WORKERS = int(os.environ.get('IMAGE_VARIANT_WORKERS', 2))
+
+# Limits for uploaded images; larger images are scaled down on upload
+IMAGE_UPLOAD_MAX_BYTES = int(
+    os.environ.get('IMAGE_UPLOAD_MAX_BYTES', 10 * 1024 * 1024)
+)
+IMAGE_UPLOAD_MAX_PIXELS = int(
+    os.environ.get('IMAGE_UPLOAD_MAX_PIXELS', 25_000_000)
+)
+IMAGE_MAX_DIMENSION = int(os.environ.get('IMAGE_MAX_DIMENSION', 2048))
+IMAGE_DECODE_CONCURRENCY = int(os.environ.get('IMAGE_DECODE_CONCURRENCY', 2))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
@@ -138,8 +240,42 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'core.User'
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS' : 'drf_spectacular.openapi.AutoSchema',
+    # JSON goes through orjson when installed, with DRF's exact output.
+    # MessagePack is served for Accept: application/msgpack.
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.ORJSONRenderer',
+        *(
+            ['core.renderers.MessagePackRenderer']
+            if importlib.util.find_spec('msgpack') else []
+        ),
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 SPECTACULAR_SETTINGS = {
     'COMPONENT_SPLIT_REQUEST': True,
-}
\ No newline at end of file
+}
+# Bearer token required to scrape /metrics. When unset, /metrics is
+# only served with DEBUG on.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Server-Timing breakdowns requested by staff are logged as JSON lines
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.timing': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
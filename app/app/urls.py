@@ -22,6 +22,8 @@ from drf_spectacular.views import (
 from django.conf.urls.static import static
 from django.conf import settings
 
+from core.metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/schema/', SpectacularAPIView.as_view(), name="api-schema"),
@@ -32,6 +34,8 @@ urlpatterns = [
     ),
     path('api/user/', include('user.urls')),
     path('api/recipie/', include('recipie.urls')),
+    path('api/async/recipie/', include('recipie.async_urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 if settings.DEBUG:
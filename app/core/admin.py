@@ -44,3 +44,4 @@ admin.site.register(models.User, UserAdmin)
 admin.site.register(models.Recipie)
 admin.site.register(models.Tag)
 admin.site.register(models.Ingredient)
+admin.site.register(models.ImportCheckpoint)
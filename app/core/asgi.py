@@ -0,0 +1,70 @@
+"""
+ASGI handler sending streamed responses without blocking the event loop
+
+Django 4.1 iterates streaming responses in the event loop, where a body
+read from the database, like the recipie export, raises
+SynchronousOnlyOperation. This handler reads the parts in a thread.
+"""
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+
+# Bytes of parts read per trip to the thread
+STREAM_BATCH_BYTES = 64 * 1024
+
+
+def _read_parts(parts, size):
+    """Return the next parts of an iterator, up to about size bytes"""
+    batch, total = [], 0
+    for part in parts:
+        batch.append(part)
+        total += len(part)
+        if total >= size:
+            break
+    return batch
+
+
+async def stream_parts(response):
+    """Yield the parts of a streaming response, reading them in a thread
+
+    Reads are thread sensitive, so a server side cursor is always used
+    from the thread, and connection, that opened it.
+    """
+    parts = iter(response)
+    read = sync_to_async(_read_parts, thread_sensitive=True)
+    while batch := await read(parts, STREAM_BATCH_BYTES):
+        for part in batch:
+            yield part
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """ASGIHandler reading streaming response bodies off the event loop"""
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+
+        headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode('ascii')
+            if isinstance(value, str):
+                value = value.encode('latin1')
+            headers.append((bytes(header), bytes(value)))
+        for cookie in response.cookies.values():
+            value = cookie.output(header='').encode('ascii').strip()
+            headers.append((b'Set-Cookie', value))
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': headers,
+        })
+        async for part in stream_parts(response):
+            for chunk, _ in self.chunk_bytes(part):
+                await send({
+                    'type': 'http.response.body',
+                    'body': chunk,
+                    'more_body': True,
+                })
+        await send({'type': 'http.response.body'})
+        await sync_to_async(response.close, thread_sensitive=True)()
@@ -0,0 +1,44 @@
+"""
+PostgreSQL backend drawing connections from an in-process pool
+
+Select it with ENGINE 'core.db' and size the pool with the SIZE and
+TIMEOUT entries of the POOL database setting. Closing the connection,
+as Django does at the end of each request when CONN_MAX_AGE is 0,
+returns it to the pool instead.
+"""
+
+from functools import partial
+
+from django.db.backends.postgresql import base
+
+from core.db.creation import DatabaseCreation
+from core.db.pool import get_pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def get_new_connection(self, conn_params):
+        options = self.settings_dict['POOL']
+        self.pool = get_pool(
+            self.alias, conn_params, options['SIZE'], options['TIMEOUT']
+        )
+        connection = self.pool.getconn(
+            partial(super().get_new_connection, conn_params),
+            check=self.settings_dict['CONN_HEALTH_CHECKS'],
+        )
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        with self.wrap_database_errors:
+            if self.in_atomic_block:
+                # Django keeps a connection closed inside atomic() around
+                # until the block exits, so it cannot be shared yet.
+                self.pool.discard(self.connection)
+            else:
+                self.pool.putconn(self.connection)
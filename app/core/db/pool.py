@@ -0,0 +1,226 @@
+"""
+In-process pool of PostgreSQL connections
+"""
+
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from psycopg2.extensions import (
+    TRANSACTION_STATUS_IDLE,
+    TRANSACTION_STATUS_INERROR,
+    TRANSACTION_STATUS_INTRANS,
+)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class _Waiter:
+    """A checkout waiting for a connection, or a slot to open one in"""
+
+    def __init__(self, lock):
+        self.condition = threading.Condition(lock)
+        self.granted = False
+        self.conn = None
+        self.released_at = None
+
+
+class ConnectionPool:
+    """Share up to size connections, waiting up to timeout for a free one
+
+    Free connections go to waiting checkouts in arrival order, so a busy
+    thread cannot keep taking back the connection it just returned.
+    Returned connections are rolled back if left in a transaction and
+    dropped if broken. Connections idle for longer than check_after
+    seconds are checked before being handed out again when asked to.
+    """
+
+    def __init__(self, label, database, size, timeout, check_after=1.0):
+        self.label = label
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.check_after = check_after
+        self.closed = False
+        self._lock = threading.Lock()
+        self._idle = deque()
+        self._waiters = deque()
+        self._open = 0
+        self.opened = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def _record_wait(self, started):
+        waited = time.monotonic() - started
+        self.waits += 1
+        self.wait_time += waited
+        self.max_wait_time = max(self.max_wait_time, waited)
+
+    def _wait(self):
+        """Queue for the next free connection or slot and return it"""
+        started = time.monotonic()
+        waiter = _Waiter(self._lock)
+        self._waiters.append(waiter)
+        while not waiter.granted:
+            remaining = started + self.timeout - time.monotonic()
+            if remaining <= 0:
+                self._waiters.remove(waiter)
+                self._record_wait(started)
+                self.timeouts += 1
+                raise psycopg2.OperationalError(
+                    f'No connection free in pool {self.label} '
+                    f'after {self.timeout} seconds'
+                )
+            waiter.condition.wait(remaining)
+        self._record_wait(started)
+        return waiter.conn, waiter.released_at
+
+    def _release(self, conn):
+        """Pass a connection, or with None its slot, to the next waiter"""
+        if not self._waiters:
+            return False
+        waiter = self._waiters.popleft()
+        waiter.granted = True
+        waiter.conn = conn
+        waiter.released_at = time.monotonic()
+        waiter.condition.notify()
+        return True
+
+    def getconn(self, connect, check=False):
+        """Return an idle connection, or one made by connect if below size"""
+        with self._lock:
+            self.checkouts += 1
+            if self._waiters:
+                conn, released_at = self._wait()
+            elif self._idle:
+                # Most recently used first, so spare connections stay idle
+                conn, released_at = self._idle.pop()
+            elif self._open < self.size:
+                conn, released_at = None, None
+                self._open += 1
+            else:
+                conn, released_at = self._wait()
+
+        if conn is not None:
+            idle_for = time.monotonic() - released_at
+            if not check or idle_for < self.check_after or _usable(conn):
+                return conn
+            # The slot is kept for the replacement connection
+            _close_quietly(conn)
+
+        try:
+            conn = connect()
+        except BaseException:
+            self._free_slot()
+            raise
+        with self._lock:
+            self.opened += 1
+        return conn
+
+    def putconn(self, conn):
+        """Take back a connection handed out by getconn"""
+        if not conn.closed and conn.info.transaction_status in (
+            TRANSACTION_STATUS_INTRANS, TRANSACTION_STATUS_INERROR
+        ):
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                _close_quietly(conn)
+        if (
+            self.closed
+            or conn.closed
+            or conn.info.transaction_status != TRANSACTION_STATUS_IDLE
+        ):
+            self.discard(conn)
+            return
+        with self._lock:
+            if not self._release(conn):
+                self._idle.append((conn, time.monotonic()))
+
+    def discard(self, conn):
+        """Close a connection handed out by getconn and free its slot"""
+        _close_quietly(conn)
+        self._free_slot()
+
+    def _free_slot(self):
+        with self._lock:
+            if not self._release(None):
+                self._open -= 1
+
+    def close(self):
+        """Close idle connections and those returned from now on"""
+        with self._lock:
+            self.closed = True
+            idle, self._idle = self._idle, deque()
+            self._open -= len(idle)
+        for conn, _ in idle:
+            _close_quietly(conn)
+
+    def stats(self):
+        """Return connection counts and the time spent waiting for one"""
+        with self._lock:
+            return {
+                'size': self.size,
+                'open': self._open,
+                'in_use': self._open - len(self._idle),
+                'idle': len(self._idle),
+                'opened': self.opened,
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+                'wait_time': self.wait_time,
+                'max_wait_time': self.max_wait_time,
+            }
+
+
+def _usable(conn):
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except psycopg2.Error:
+        return False
+    return True
+
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except psycopg2.Error:
+        pass
+
+
+def get_pool(alias, conn_params, size, timeout):
+    """Return the pool for a database alias and its connection parameters"""
+    key = (alias, tuple(sorted(conn_params.items())))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            database = conn_params.get('database')
+            pool = _pools[key] = ConnectionPool(
+                f'{alias}/{database}', database, size, timeout
+            )
+        return pool
+
+
+def close_pools(database=None):
+    """Close and forget the pools of one database, or of all of them"""
+    with _pools_lock:
+        keys = [
+            key for key, pool in _pools.items()
+            if database is None or pool.database == database
+        ]
+        pools = [_pools.pop(key) for key in keys]
+    for pool in pools:
+        pool.close()
+
+
+def pool_stats():
+    """Return the statistics of each pool in this process by label"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {pool.label: pool.stats() for pool in pools}
@@ -0,0 +1,350 @@
+"""
+Django command to benchmark the recipie APIs and record a baseline
+"""
+
+import json
+import statistics
+import subprocess
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.management.commands.benchmark_reads import HOST, percentile
+from core.management.commands.seed_perf_data import EMAIL_DOMAIN
+from core.models import Recipie, Tag, Ingredient
+from recipie.cache import RESPONSE_CACHE_ALIAS, bump_data_version
+from user.authentication import TOKEN_CACHE_ALIAS
+
+# Cache methods counted as round trips to the cache
+CACHE_METHODS = ('get', 'add', 'set', 'incr', 'delete')
+
+
+@contextmanager
+def count_cache_calls():
+    """Record the calls made to the token and response caches"""
+    calls = []
+    patched = [caches[TOKEN_CACHE_ALIAS], caches[RESPONSE_CACHE_ALIAS]]
+    for cache in patched:
+        for name in CACHE_METHODS:
+            def counted(*args, _method=getattr(cache, name), **kwargs):
+                calls.append(_method.__name__)
+                return _method(*args, **kwargs)
+            setattr(cache, name, counted)
+    try:
+        yield calls
+    finally:
+        for cache in patched:
+            for name in CACHE_METHODS:
+                delattr(cache, name)
+
+
+class Command(BaseCommand):
+    """Django command to time API cases and compare them to a baseline
+
+    Every case sends --iterations requests through the Django test client
+    after --warmup unrecorded ones, and records latency percentiles, the
+    number of queries and the number of cache calls per request. The
+    user's data version is bumped before each read, so reads miss the
+    response cache and measure the work behind them. Everything
+    runs in a transaction that is rolled back, so writes leave the data
+    as it was and runs can be repeated and compared.
+    """
+    help = 'Benchmark API endpoints and write or compare a JSON baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Email to benchmark as, by default the seeded user with '
+                 'the most recipies',
+        )
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument(
+            '--cases',
+            help='Comma separated case names to run, by default all',
+        )
+        parser.add_argument(
+            '--warm',
+            action='store_true',
+            help='Keep cached responses between reads',
+        )
+        parser.add_argument('--output', help='Write results to this file')
+        parser.add_argument(
+            '--compare',
+            help='Baseline file to compare with; fails on regressions',
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.2,
+            help='Allowed p50 slowdown before a case counts as regressed',
+        )
+        parser.add_argument(
+            '--min-delta',
+            type=float,
+            default=2.0,
+            help='Milliseconds p50 must also grow by to count as slower',
+        )
+
+    def _host(self):
+        """Return a host name the site accepts requests for"""
+        for allowed in settings.ALLOWED_HOSTS:
+            return HOST if allowed == '*' else allowed.lstrip('.')
+        return HOST
+
+    def _user(self, email):
+        users = get_user_model().objects.all()
+        if email:
+            user = users.filter(email=email).first()
+        else:
+            user = users.filter(
+                email__endswith=f'@{EMAIL_DOMAIN}'
+            ).annotate(
+                recipie_count=Count('recipie')
+            ).order_by('-recipie_count').first()
+        if user is None:
+            raise CommandError(
+                f'No user {email}' if email
+                else 'No seeded users; run seed_perf_data first'
+            )
+        if not Recipie.objects.filter(user=user).exists():
+            raise CommandError(f'{user.email} has no recipies')
+        return user
+
+    def _cases(self, user):
+        """Return request builders taking the iteration number by case"""
+        recipie_ids = list(
+            Recipie.objects.filter(user=user).order_by('-id').values_list(
+                'id', flat=True
+            )[:100]
+        )
+        tag_ids = list(
+            Tag.objects.filter(user=user).annotate(
+                uses=Count('recipie')
+            ).order_by('-uses', 'id').values_list('id', flat=True)
+        )
+        ingredient_ids = list(
+            Ingredient.objects.filter(user=user).values_list('id', flat=True)
+        )
+        recipies = reverse('recipie:recipie-list')
+        tags = reverse('recipie:tag-list')
+        ingredients = reverse('recipie:ingredient-list')
+
+        def recipie(i):
+            return reverse(
+                'recipie:recipie-detail',
+                args=[recipie_ids[i % len(recipie_ids)]],
+            )
+
+        def payload(i):
+            return {
+                'title': f'Benchmark curry {i}',
+                'time_minutes': 30,
+                'price': '7.50',
+                'tags': [{'name': 'Dinner'}, {'name': f'Benchmark {i}'}],
+                'ingredients': [{'name': 'Rice'}, {'name': 'Garlic'}],
+            }
+
+        def attr(url, ids, i):
+            return f'{url}{ids[i % len(ids)]}/'
+
+        cases = {
+            'recipie_list': lambda i: ('get', recipies, None),
+            'recipie_list_large': lambda i: (
+                'get', recipies, {'page_size': 1000}
+            ),
+            'recipie_list_sparse': lambda i: (
+                'get', recipies, {'fields': 'id,title,price', 'expand': ''}
+            ),
+            'recipie_detail': lambda i: ('get', recipie(i), None),
+            'recipie_search': lambda i: ('get', recipies, {'q': 'spicy'}),
+            'recipie_create': lambda i: ('post', recipies, payload(i)),
+            'recipie_update': lambda i: ('patch', recipie(i), payload(i)),
+            'tag_list': lambda i: ('get', tags, None),
+            'tag_list_assigned': lambda i: (
+                'get', tags, {'assigned_only': 1}
+            ),
+            'ingredient_list': lambda i: ('get', ingredients, None),
+            'ingredient_list_assigned': lambda i: (
+                'get', ingredients, {'assigned_only': 1}
+            ),
+        }
+        if tag_ids:
+            cases['recipie_filter_tags'] = lambda i: (
+                'get', recipies, {'tags': str(tag_ids[0])}
+            )
+            cases['recipie_filter_all_tags'] = lambda i: (
+                'get',
+                recipies,
+                {'tags': ','.join(map(str, tag_ids[:2])), 'match': 'all'},
+            )
+            cases['tag_update'] = lambda i: (
+                'patch', attr(tags, tag_ids, i), {'name': f'Tag {i}'}
+            )
+        if ingredient_ids:
+            cases['ingredient_update'] = lambda i: (
+                'patch',
+                attr(ingredients, ingredient_ids, i),
+                {'name': f'Ingredient {i}'},
+            )
+        return cases
+
+    def _request(self, client, method, path, data, warm):
+        if method == 'get' and not warm:
+            bump_data_version(self.user.pk)
+        with CaptureQueriesContext(connection) as queries, \
+                count_cache_calls() as cache_calls:
+            started = time.perf_counter()
+            response = getattr(client, method)(path, data, format=(
+                None if method == 'get' else 'json'
+            ))
+            elapsed = time.perf_counter() - started
+        if not 200 <= response.status_code < 300:
+            raise CommandError(
+                f'{method.upper()} {path} answered {response.status_code}'
+            )
+        return elapsed, len(queries), len(cache_calls)
+
+    def _run_case(self, client, build, options):
+        latencies, query_counts, cache_counts = [], [], []
+        for i in range(options['warmup'] + options['iterations']):
+            elapsed, queries, cache_calls = self._request(
+                client, *build(i), options['warm']
+            )
+            if i >= options['warmup']:
+                latencies.append(elapsed * 1000)
+                query_counts.append(queries)
+                cache_counts.append(cache_calls)
+        return {
+            'p50_ms': round(statistics.median(latencies), 3),
+            'p90_ms': round(percentile(latencies, 0.9), 3),
+            'p99_ms': round(percentile(latencies, 0.99), 3),
+            'max_ms': round(max(latencies), 3),
+            'mean_ms': round(statistics.mean(latencies), 3),
+            'queries': max(query_counts),
+            'cache_calls': max(cache_counts),
+        }
+
+    def _commit(self):
+        """Return the current git commit, if the code is in a checkout"""
+        try:
+            result = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                cwd=settings.BASE_DIR,
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+        except (OSError, subprocess.CalledProcessError):
+            return None
+        return result.stdout.strip()
+
+    def _compare(self, results, baseline, options):
+        """Print changes from the baseline and return the regressed cases"""
+        regressed = []
+        self.stdout.write(
+            f"\nCompared with {baseline.get('commit') or 'baseline'}"
+        )
+        self.stdout.write(
+            f"{'case':<26}{'p50 ms':>17}{'change':>9}{'queries':>12}"
+        )
+        for name, result in results['cases'].items():
+            before = baseline['cases'].get(name)
+            if before is None:
+                continue
+            change = result['p50_ms'] / before['p50_ms'] - 1
+            slower = (
+                change > options['threshold']
+                and result['p50_ms'] - before['p50_ms'] > options['min_delta']
+            )
+            more_queries = result['queries'] > before['queries']
+            if slower or more_queries:
+                regressed.append(name)
+            line = (
+                f"{name:<26}"
+                f"{before['p50_ms']:>7.1f} ->{result['p50_ms']:>7.1f}"
+                f"{change:>+9.0%}"
+                f"{before['queries']:>5} ->{result['queries']:>3}"
+            )
+            self.stdout.write(
+                self.style.ERROR(line) if slower or more_queries else line
+            )
+        return regressed
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1 or options['warmup'] < 0:
+            raise CommandError('--iterations must be positive')
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as handle:
+                baseline = json.load(handle)
+
+        user = self.user = self._user(options['user'])
+        cases = self._cases(user)
+        if options['cases']:
+            wanted = [name.strip() for name in options['cases'].split(',')]
+            unknown = set(wanted) - set(cases)
+            if unknown:
+                raise CommandError(
+                    f"Unknown cases: {', '.join(sorted(unknown))}"
+                )
+            cases = {name: cases[name] for name in wanted}
+
+        results = {
+            'created': datetime.now(timezone.utc).isoformat(),
+            'commit': self._commit(),
+            'user': user.email,
+            'recipies': Recipie.objects.filter(user=user).count(),
+            'iterations': options['iterations'],
+            'warm': options['warm'],
+            'cases': {},
+        }
+        self.stdout.write(
+            f"{user.email} with {results['recipies']} recipies, "
+            f"{options['iterations']} requests per case"
+        )
+        self.stdout.write(
+            f"{'case':<26}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}"
+            f"{'queries':>9}{'cache':>7}"
+        )
+
+        client = APIClient(SERVER_NAME=self._host())
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        with transaction.atomic():
+            for name, build in cases.items():
+                result = self._run_case(client, build, options)
+                results['cases'][name] = result
+                self.stdout.write(
+                    f"{name:<26}{result['p50_ms']:>9.1f}"
+                    f"{result['p90_ms']:>9.1f}{result['p99_ms']:>9.1f}"
+                    f"{result['queries']:>9}{result['cache_calls']:>7}"
+                )
+            transaction.set_rollback(True)
+        # Cached responses may include rolled back writes
+        bump_data_version(user.pk)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as handle:
+                json.dump(results, handle, indent=2)
+                handle.write('\n')
+            self.stdout.write(f"Wrote {options['output']}")
+
+        if baseline is not None:
+            regressed = self._compare(results, baseline, options)
+            if regressed:
+                raise CommandError(
+                    f"Regressed against {options['compare']}: "
+                    f"{', '.join(regressed)}"
+                )
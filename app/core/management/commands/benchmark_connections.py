@@ -0,0 +1,137 @@
+"""
+Django command to measure database connection setup per request
+"""
+
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from rest_framework.authtoken.models import Token
+
+from core.db.pool import close_pools, pool_stats
+from core.management.commands import benchmark_reads
+from core.management.commands.benchmark_reads import percentile
+
+
+class Command(benchmark_reads.Command):
+    """Django command to load test connection reuse through WSGI
+
+    The same uncached requests are served with a new connection per
+    request, with persistent connections and with the connection pool.
+    Each mode runs on fresh worker threads so no connection carries over.
+    """
+    help = 'Compare request latency with and without connection reuse'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            required=True,
+            help='Email of the user whose data is read',
+        )
+        parser.add_argument(
+            '--path',
+            default='recipies/?page_size=1',
+            help='Endpoint below /api/recipie/, with any query string',
+        )
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=8,
+            help='WSGI worker threads, like gunicorn --threads',
+        )
+        parser.add_argument(
+            '--pool-size',
+            type=int,
+            help='Connections in the pool, by default one per thread',
+        )
+
+    def _run(self, url, token, options):
+        """Return latencies of requests served by fresh worker threads"""
+        def request(request_url):
+            started = time.perf_counter()
+            status = self._wsgi_request(request_url, token, 0)
+            if not status.startswith('200'):
+                raise CommandError(f'{url} answered {status}')
+            return time.perf_counter() - started
+
+        urls = self._urls(url, {'cold': True})
+        with ThreadPoolExecutor(max_workers=options['threads']) as workers:
+            return list(workers.map(
+                request, [next(urls) for _ in range(options['requests'])]
+            ))
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['threads'] < 1:
+            raise CommandError('--requests and --threads must be positive')
+        options['pool_size'] = options['pool_size'] or options['threads']
+        try:
+            user = get_user_model().objects.get(email=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user {options['user']}")
+        token, _ = Token.objects.get_or_create(user=user)
+        self._request_numbers = iter(range(10 ** 12))
+        url = f"/api/recipie/{options['path']}"
+
+        default = connections.settings[DEFAULT_DB_ALIAS]
+        plain = {**default, 'ENGINE': 'django.db.backends.postgresql'}
+        modes = [
+            ('new per request', {**plain, 'CONN_MAX_AGE': 0}),
+            ('persistent', {**plain, 'CONN_MAX_AGE': 600}),
+            ('pooled', {
+                **default,
+                'ENGINE': 'core.db',
+                'CONN_MAX_AGE': 0,
+                'POOL': {**default['POOL'], 'SIZE': options['pool_size']},
+            }),
+        ]
+        opened = []
+
+        def count_connection(sender, connection, **kwargs):
+            if connection.settings_dict['ENGINE'] != 'core.db':
+                opened.append(connection)
+
+        self.stdout.write(
+            f"{options['requests']} requests, {options['threads']} threads, "
+            f"pool of {options['pool_size']}"
+        )
+        self.stdout.write(
+            f"{'connections':<16}{'opened':>8}{'p50 ms':>10}{'p99 ms':>10}"
+            f"{'req/s':>10}"
+        )
+        connection_created.connect(count_connection)
+        try:
+            for name, settings_dict in modes:
+                # Worker threads build their connections from these
+                connections.settings[DEFAULT_DB_ALIAS] = settings_dict
+                opened.clear()
+                close_pools()
+                started = time.perf_counter()
+                latencies = self._run(url, token.key, options)
+                elapsed = time.perf_counter() - started
+                stats = pool_stats()
+                if stats:
+                    (stats,) = stats.values()
+                    count = stats['opened']
+                else:
+                    count = len(opened)
+                self.stdout.write(
+                    f'{name:<16}{count:>8}'
+                    f'{statistics.median(latencies) * 1000:>10.1f}'
+                    f'{percentile(latencies, 0.99) * 1000:>10.1f}'
+                    f'{len(latencies) / elapsed:>10.1f}'
+                )
+        finally:
+            connection_created.disconnect(count_connection)
+            connections.settings[DEFAULT_DB_ALIAS] = default
+            close_pools()
+
+        self.stdout.write(
+            f"Pool: {stats['checkouts']} checkouts, {stats['waits']} waits, "
+            f"{stats['wait_time'] * 1000:.1f} ms waiting in total, "
+            f"{stats['max_wait_time'] * 1000:.1f} ms at most"
+        )
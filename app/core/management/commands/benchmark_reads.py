@@ -0,0 +1,247 @@
+"""
+Django command to compare read latency of the WSGI and ASGI paths
+"""
+
+import asyncio
+import itertools
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.authtoken.models import Token
+
+from app.asgi import application as asgi_application
+from app.wsgi import application as wsgi_application
+
+HOST = 'localhost'
+
+
+def percentile(values, fraction):
+    """Return the value below which the given fraction of values fall"""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    """Django command to benchmark reads over WSGI and ASGI in process
+
+    Clients send requests back to back, each waiting --client-delay after
+    a response arrives before it is done with the connection, as slow
+    clients do. WSGI requests are served by a pool of --threads workers
+    which stay blocked for that time; ASGI requests are served on an
+    event loop. The sync endpoint is measured over both interfaces and
+    the async variant over ASGI.
+    """
+    help = 'Compare p99 latency of sync and async reads'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            required=True,
+            help='Email of the user whose data is read',
+        )
+        parser.add_argument(
+            '--path',
+            default='recipies/',
+            help='Endpoint below /api/recipie/, with any query string',
+        )
+        parser.add_argument('--requests', type=int, default=400)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=8,
+            help='WSGI worker threads, like gunicorn --threads',
+        )
+        parser.add_argument(
+            '--cold',
+            action='store_true',
+            help='Make every URL unique so the response cache never hits',
+        )
+        parser.add_argument(
+            '--client-delay',
+            type=float,
+            default=0.05,
+            help='Seconds a client holds each response',
+        )
+
+    def _wsgi_request(self, url, token, client_delay):
+        """Serve one request through the WSGI handler"""
+        parts = urlsplit(url)
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': parts.path,
+            'QUERY_STRING': parts.query,
+            'SERVER_NAME': HOST,
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': HOST,
+            'HTTP_AUTHORIZATION': f'Token {token}',
+            'wsgi.input': BytesIO(),
+            'wsgi.errors': BytesIO(),
+            'wsgi.url_scheme': 'http',
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+            'wsgi.version': (1, 0),
+        }
+        statuses = []
+        response = wsgi_application(
+            environ, lambda status, headers: statuses.append(status)
+        )
+        try:
+            for _ in response:
+                pass
+            # The worker stays busy until a slow client has the response
+            time.sleep(client_delay)
+        finally:
+            response.close()
+        return statuses[0]
+
+    def _urls(self, url, options):
+        """Yield the URL to request, made unique per request if cold"""
+        separator = '&' if '?' in url else '?'
+        for n in self._request_numbers:
+            yield f'{url}{separator}nocache={n}' if options['cold'] else url
+
+    def _run_wsgi(self, url, token, options):
+        """Return request latencies of WSGI clients sharing a worker pool"""
+        latencies, lock = [], threading.Lock()
+        urls = self._urls(url, options)
+        per_client = options['requests'] // options['concurrency']
+        workers = ThreadPoolExecutor(max_workers=options['threads'])
+
+        def client():
+            for _ in range(per_client):
+                started = time.perf_counter()
+                with lock:
+                    request_url = next(urls)
+                status = workers.submit(
+                    self._wsgi_request,
+                    request_url,
+                    token,
+                    options['client_delay'],
+                ).result()
+                if not status.startswith('200'):
+                    raise CommandError(f'{url} answered {status}')
+                with lock:
+                    latencies.append(time.perf_counter() - started)
+
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            for future in [
+                pool.submit(client) for _ in range(options['concurrency'])
+            ]:
+                future.result()
+        workers.shutdown()
+        return latencies
+
+    async def _asgi_request(self, url, token, client_delay):
+        """Serve one request through the ASGI handler"""
+        parts = urlsplit(url)
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': parts.path,
+            'query_string': parts.query.encode(),
+            'headers': [
+                (b'host', HOST.encode()),
+                (b'authorization', f'Token {token}'.encode()),
+            ],
+            'server': (HOST, 80),
+            'client': ('127.0.0.1', 0),
+        }
+        status = None
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            elif not message.get('more_body'):
+                # Only this request waits on a slow client, not a thread
+                await asyncio.sleep(client_delay)
+
+        await asgi_application(scope, receive, send)
+        return status
+
+    async def _run_asgi(self, url, token, options):
+        """Return request latencies of ASGI clients on one event loop"""
+        latencies = []
+        urls = self._urls(url, options)
+        per_client = options['requests'] // options['concurrency']
+
+        async def client():
+            for _ in range(per_client):
+                started = time.perf_counter()
+                status = await self._asgi_request(
+                    next(urls), token, options['client_delay']
+                )
+                if status != 200:
+                    raise CommandError(f'{url} answered {status}')
+                latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(
+            *(client() for _ in range(options['concurrency']))
+        )
+        return latencies
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['requests'] < 1:
+            raise CommandError('--requests and --concurrency must be positive')
+        if connection.settings_dict['CONN_MAX_AGE']:
+            # Settings are loaded before app.asgi can turn on the pool
+            raise CommandError(
+                'ASGI request threads would each keep a connection; '
+                'set DB_POOL_SIZE or DB_CONN_MAX_AGE=0'
+            )
+        try:
+            user = get_user_model().objects.get(email=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user {options['user']}")
+        token, _ = Token.objects.get_or_create(user=user)
+        # Shared by all runs so cold URLs are never reused between them
+        self._request_numbers = itertools.count()
+        sync_url = f"/api/recipie/{options['path']}"
+        async_url = f"/api/async/recipie/{options['path']}"
+
+        runs = [
+            ('WSGI sync', lambda: self._run_wsgi(
+                sync_url, token.key, options
+            )),
+            ('ASGI sync', lambda: asyncio.run(self._run_asgi(
+                sync_url, token.key, options
+            ))),
+            ('ASGI async', lambda: asyncio.run(self._run_asgi(
+                async_url, token.key, options
+            ))),
+        ]
+        self.stdout.write(
+            f"{options['concurrency']} clients, {options['threads']} WSGI "
+            f"threads, {options['client_delay'] * 1000:.0f} ms client delay"
+        )
+        self.stdout.write(
+            f"{'path':<12}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+            f"{'req/s':>10}"
+        )
+        for name, run in runs:
+            started = time.perf_counter()
+            latencies = run()
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'{name:<12}'
+                f'{statistics.median(latencies) * 1000:>10.1f}'
+                f'{percentile(latencies, 0.99) * 1000:>10.1f}'
+                f'{max(latencies) * 1000:>10.1f}'
+                f'{len(latencies) / elapsed:>10.1f}'
+            )
@@ -0,0 +1,88 @@
+"""
+Django command to time response rendering on large recipie lists
+"""
+
+import json
+import time
+from collections import OrderedDict
+
+import msgpack
+from django.core.management import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from core.renderers import MessagePackRenderer, ORJSONRenderer
+
+
+def recipie_page(count):
+    """Return a list response body shaped like RecipieSerializer output"""
+    def named(prefix, start, n):
+        return [
+            OrderedDict(id=start + i, name=f'{prefix} {start + i}')
+            for i in range(n)
+        ]
+
+    results = []
+    for n in range(count):
+        image = f'http://localhost/static/media/upload/recipie/{n:064x}.jpg'
+        results.append(OrderedDict(
+            id=n,
+            title=f'Recipie {n} with a reasonably long title',
+            time_minutes=n % 120,
+            price=f'{n % 100}.{n % 100:02d}',
+            link=f'https://example.com/recipies/{n}',
+            tags=named('Tag', n, 3),
+            ingredients=named('Ingredient', n, 6),
+            image=image,
+            image_variants=OrderedDict(
+                thumbnail=image.replace('.jpg', '__thumbnail.jpg'),
+                thumbnail_webp=image.replace('.jpg', '__thumbnail.webp'),
+            ),
+        ))
+    return OrderedDict(
+        next='http://localhost/api/recipie/recipies/?cursor=cD0xMDAw',
+        previous=None,
+        results=results,
+    )
+
+
+class Command(BaseCommand):
+    """Django command to compare renderers on a large list response"""
+    help = 'Time DRF, orjson and MessagePack rendering of recipie lists'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--rounds', type=int, default=50)
+
+    def handle(self, *args, **options):
+        if options['recipes'] < 1 or options['rounds'] < 1:
+            raise CommandError('--recipes and --rounds must be positive')
+        data = recipie_page(options['recipes'])
+        expected = JSONRenderer().render(data)
+        if ORJSONRenderer().render(data) != expected:
+            raise CommandError('orjson output differs from JSONRenderer')
+        if msgpack.unpackb(
+            MessagePackRenderer().render(data)
+        ) != json.loads(expected):
+            raise CommandError('MessagePack values differ from JSON')
+
+        self.stdout.write(
+            f"{options['recipes']} recipies, best of {options['rounds']}"
+        )
+        self.stdout.write(
+            f"{'renderer':<22}{'ms':>8}{'bytes':>10}{'speedup':>10}"
+        )
+        baseline = None
+        for renderer in (
+            JSONRenderer(), ORJSONRenderer(), MessagePackRenderer()
+        ):
+            timings = []
+            for _ in range(options['rounds']):
+                started = time.perf_counter()
+                body = renderer.render(data)
+                timings.append(time.perf_counter() - started)
+            best = min(timings)
+            baseline = baseline or best
+            self.stdout.write(
+                f'{type(renderer).__name__:<22}{best * 1000:>8.2f}'
+                f'{len(body):>10}{baseline / best:>9.1f}x'
+            )
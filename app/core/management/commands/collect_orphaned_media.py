@@ -0,0 +1,190 @@
+"""
+Django command to delete recipie image files no row references
+"""
+
+import glob
+import os
+import re
+import time
+from itertools import islice
+
+from django.core.management import BaseCommand
+
+from core.models import Recipie
+from recipie.images import IMAGE_VARIANTS
+from recipie.uploads import OUTPUT_FORMATS
+
+VARIANT_FILE = re.compile(
+    rf'^(?P<root>.+)__(?:{"|".join(map(re.escape, IMAGE_VARIANTS))})\.\w+$'
+)
+
+
+class Command(BaseCommand):
+    """Django command to delete orphaned recipie image files
+
+    The upload directory is walked one directory at a time. Original
+    images are checked against core_recipie.image one batch per query, and
+    variants are kept for as long as their original is. Files younger than
+    --min-age are skipped so uploads that have not been committed yet, and
+    blobs just reused by an identical upload, are never collected. As the
+    batches are checked before their files are deleted, the files are
+    checked again in batches right before deletion, with one query each.
+    Under --rate such a batch holds at most a second of deletions.
+    """
+    help = 'Delete recipie image files that no recipie references'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=200,
+            help='Maximum files deleted per second, 0 for no limit',
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=3600,
+            help='Only collect files older than this many seconds',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report orphaned files without deleting them',
+        )
+
+    def _walk(self, top, cutoff):
+        """Yield each directory with its old and recent file names"""
+        for directory, _, files in os.walk(top):
+            old, recent = [], []
+            for name in files:
+                try:
+                    mtime = os.stat(os.path.join(directory, name)).st_mtime
+                except FileNotFoundError:
+                    continue
+                (old if mtime < cutoff else recent).append(name)
+            if old:
+                yield directory, old, recent
+
+    def _orphans(self, storage, directory, old, recent, batch_size):
+        """Yield old files of a directory no recipie references"""
+        variants, originals = {}, []
+        for name in old:
+            match = VARIANT_FILE.match(name)
+            if match:
+                variants.setdefault(match['root'], []).append(name)
+            else:
+                originals.append(name)
+
+        prefix = os.path.relpath(directory, storage.location)
+        prefix = prefix.replace(os.sep, '/')
+        # A recent original keeps its variants as well
+        kept_roots = {os.path.splitext(name)[0] for name in recent}
+        originals = iter(originals)
+        while batch := list(islice(originals, batch_size)):
+            stored = {f'{prefix}/{name}': name for name in batch}
+            referenced = set(
+                Recipie.objects.filter(image__in=stored)
+                .values_list('image', flat=True)
+            )
+            for path, name in stored.items():
+                if path in referenced:
+                    kept_roots.add(os.path.splitext(name)[0])
+                else:
+                    yield path
+
+        for root, files in variants.items():
+            if root not in kept_roots:
+                yield from (f'{prefix}/{name}' for name in files)
+
+    def _recent(self, path, cutoff):
+        """Return whether a file changed after cutoff, or is gone"""
+        try:
+            return os.stat(path).st_mtime >= cutoff
+        except FileNotFoundError:
+            return True
+
+    def _originals(self, storage, root, cutoff):
+        """Return the names an original of a variant's root may have
+
+        None is returned when an original on disk changed after cutoff.
+        """
+        names = {root + extension for extension, *_ in OUTPUT_FORMATS.values()}
+        prefix = os.path.dirname(root)
+        for path in glob.glob(glob.escape(storage.path(root)) + '.*'):
+            name = f'{prefix}/{os.path.basename(path)}'
+            if VARIANT_FILE.match(name):
+                continue
+            if self._recent(path, cutoff):
+                return None
+            names.add(name)
+        return names
+
+    def _still_orphaned(self, storage, paths, cutoff):
+        """Return the files of a batch still old and unreferenced"""
+        originals = {}
+        for path in paths:
+            if self._recent(storage.path(path), cutoff):
+                continue
+            match = VARIANT_FILE.match(path)
+            names = (
+                self._originals(storage, match['root'], cutoff)
+                if match else {path}
+            )
+            # A variant stays while any original of its root is recent
+            if names is not None:
+                originals[path] = names
+
+        referenced = set(
+            Recipie.objects.filter(
+                image__in=set().union(*originals.values())
+            ).values_list('image', flat=True)
+        ) if originals else set()
+        return [
+            path for path, names in originals.items()
+            if not names & referenced
+        ]
+
+    def handle(self, *args, **options):
+        storage = Recipie._meta.get_field('image').storage
+        top = storage.path(os.path.join('upload', 'recipie'))
+        cutoff = time.time() - options['min_age']
+        rate = options['rate']
+        dry_run = options['dry_run']
+
+        # Files checked again at once, at most a second's worth of deletions
+        delete_batch_size = options['batch_size']
+        if rate:
+            delete_batch_size = min(delete_batch_size, max(1, int(rate)))
+
+        found = freed = 0
+        started = time.monotonic()
+        for directory, old, recent in self._walk(top, cutoff):
+            orphans = iter(self._orphans(
+                storage, directory, old, recent, options['batch_size']
+            ))
+            while batch := list(islice(orphans, delete_batch_size)):
+                if not dry_run:
+                    batch = self._still_orphaned(storage, batch, cutoff)
+                for path in batch:
+                    try:
+                        size = storage.size(path)
+                    except FileNotFoundError:
+                        continue
+                    found += 1
+                    freed += size
+                    if options['verbosity'] > 1:
+                        self.stdout.write(path)
+                    if dry_run:
+                        continue
+                    storage.delete(path)
+                    if rate:
+                        # Keep the average deletion rate under the limit
+                        delay = found / rate - (time.monotonic() - started)
+                        if delay > 0:
+                            time.sleep(delay)
+
+        verb = 'Would delete' if dry_run else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {found} orphaned files ({freed} bytes)'
+        ))
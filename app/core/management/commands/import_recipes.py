@@ -0,0 +1,291 @@
+"""
+Django command to bulk import recipies from JSONL or CSV dumps
+"""
+
+import csv
+import io
+import json
+import os
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.models import ImportCheckpoint, Recipie, Tag, Ingredient
+from recipie.cache import bump_data_version
+
+STAGING_TABLE = 'import_recipie_staging'
+
+STAGING_COLUMNS = [
+    'line', 'email', 'title', 'description', 'time_minutes',
+    'price', 'link', 'tags', 'ingredients',
+]
+
+MAX_PRICE = Decimal('999.99')
+
+
+class Command(BaseCommand):
+    """Django command to bulk import recipies
+
+    Records are streamed in batches. Each batch is COPYed into a staging
+    table and merged into the recipie, tag, ingredient and through tables
+    with set-based statements. Tags and ingredients are deduplicated by
+    user and name. The number of records consumed is committed with every
+    batch, so an interrupted run resumes where it stopped, skipping the
+    records before it unparsed. Records that are malformed or invalid are
+    reported with their line and skipped.
+    """
+    help = 'Bulk import recipies from a JSONL or CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='JSONL or CSV file to import')
+        parser.add_argument(
+            '--format',
+            choices=['jsonl', 'csv'],
+            help='Input format, guessed from the file extension by default',
+        )
+        parser.add_argument(
+            '--user',
+            help='Owner email for records without a "user" field',
+        )
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore the saved checkpoint and import from the start',
+        )
+
+    def _parse_jsonl(self, line):
+        """Return the record on a JSONL line, or None if it is blank"""
+        return json.loads(line) if line.strip() else None
+
+    def _parse_csv(self, row):
+        for field in ('tags', 'ingredients'):
+            row[field] = [
+                name.strip()
+                for name in (row.get(field) or '').split(',')
+                if name.strip()
+            ]
+        return row
+
+    def _names(self, items):
+        """Return unique names from a list of strings or {'name'} dicts"""
+        names = []
+        for item in items or []:
+            name = item['name'] if isinstance(item, dict) else item
+            name = str(name).strip()
+            if name and name not in names and len(name) <= 255:
+                names.append(name)
+        return names
+
+    def _staging_row(self, line, record, default_user):
+        """Return a staging row for a record, or None if it is invalid"""
+        try:
+            title = str(record['title']).strip()
+            time_minutes = int(record['time_minutes'])
+            price = Decimal(str(record['price'])).quantize(Decimal('0.01'))
+        except (
+            KeyError, TypeError, ValueError, OverflowError, InvalidOperation
+        ):
+            return None
+
+        email = record.get('user') or default_user
+        link = str(record.get('link') or '')
+        if (
+            not email or not title or len(title) > 255 or len(link) > 255
+            or price.is_nan() or not -MAX_PRICE <= price <= MAX_PRICE
+            or not -2 ** 31 <= time_minutes < 2 ** 31
+        ):
+            return None
+
+        return [
+            line,
+            email,
+            title,
+            str(record.get('description') or ''),
+            time_minutes,
+            price,
+            link,
+            json.dumps(self._names(record.get('tags'))),
+            json.dumps(self._names(record.get('ingredients'))),
+        ]
+
+    def _merge_attrs(self, cursor, model, column):
+        """Insert missing names for a model and link them to recipies"""
+        table = model._meta.db_table
+        through = getattr(Recipie, column).through._meta.db_table
+        fk = f'{model._meta.model_name}_id'
+        cursor.execute(f"""
+            INSERT INTO {table} (name, user_id, updated_at)
+            SELECT DISTINCT n.name, s.user_id, now()
+            FROM {STAGING_TABLE} s
+            CROSS JOIN jsonb_array_elements_text(s.{column}) AS n(name)
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {table} t
+                WHERE t.user_id = s.user_id AND t.name = n.name
+            )
+        """)
+        cursor.execute(f"""
+            INSERT INTO {through} (recipie_id, {fk})
+            SELECT DISTINCT s.recipie_id, t.id
+            FROM {STAGING_TABLE} s
+            CROSS JOIN jsonb_array_elements_text(s.{column}) AS n(name)
+            CROSS JOIN LATERAL (
+                SELECT min(id) AS id FROM {table}
+                WHERE user_id = s.user_id AND name = n.name
+            ) t
+        """)
+
+    def _merge_batch(self, rows):
+        """COPY a batch into staging and merge it, returning touched users"""
+        recipie_table = Recipie._meta.db_table
+        user_table = get_user_model()._meta.db_table
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {STAGING_TABLE}')
+            cursor.copy_expert(
+                f'COPY {STAGING_TABLE} ({", ".join(STAGING_COLUMNS)}) '
+                f'FROM STDIN WITH (FORMAT csv, '
+                f'FORCE_NOT_NULL (title, description, link))',
+                buffer,
+            )
+            cursor.execute(f"""
+                UPDATE {STAGING_TABLE} s SET user_id = u.id
+                FROM {user_table} u WHERE u.email = s.email
+            """)
+            cursor.execute(
+                f'DELETE FROM {STAGING_TABLE} WHERE user_id IS NULL'
+            )
+            unknown_users = cursor.rowcount
+            cursor.execute(f"""
+                UPDATE {STAGING_TABLE} SET recipie_id =
+                    nextval(pg_get_serial_sequence('{recipie_table}', 'id'))
+            """)
+            cursor.execute(f"""
+                INSERT INTO {recipie_table} (
+                    id, user_id, title, description, time_minutes,
+                    price, link, image_variants, updated_at
+                )
+                SELECT recipie_id, user_id, title, description,
+                    time_minutes, price, link, '[]', now()
+                FROM {STAGING_TABLE} ORDER BY line
+            """)
+            self._merge_attrs(cursor, Tag, 'tags')
+            self._merge_attrs(cursor, Ingredient, 'ingredients')
+            cursor.execute(f'SELECT DISTINCT user_id FROM {STAGING_TABLE}')
+            user_ids = [row[0] for row in cursor.fetchall()]
+
+        return user_ids, unknown_users
+
+    def _create_staging_table(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                CREATE TEMPORARY TABLE IF NOT EXISTS {STAGING_TABLE} (
+                    line bigint,
+                    email text,
+                    title text,
+                    description text,
+                    time_minutes integer,
+                    price numeric(5, 2),
+                    link text,
+                    tags jsonb,
+                    ingredients jsonb,
+                    user_id bigint,
+                    recipie_id bigint
+                )
+            """)
+
+    def _open_records(self, path, input_format):
+        """Return the file, its unparsed records and their parser"""
+        input_format = input_format or (
+            'csv' if path.lower().endswith('.csv') else 'jsonl'
+        )
+        handle = open(path, newline='', encoding='utf-8')
+        if input_format == 'csv':
+            return handle, csv.DictReader(handle), self._parse_csv
+        return handle, handle, self._parse_jsonl
+
+    def _skip(self, line, reason):
+        self.stderr.write(f'Skipped line {line}: {reason}')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('import_recipes requires PostgreSQL')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        path = os.path.abspath(options['path'])
+        if not os.path.exists(path):
+            raise CommandError(f'File not found: {path}')
+
+        checkpoint, _ = ImportCheckpoint.objects.get_or_create(source=path)
+        if options['restart']:
+            checkpoint.position = 0
+            checkpoint.completed = False
+            checkpoint.save()
+        if checkpoint.completed:
+            self.stdout.write(f'{path} was already imported')
+            return
+        if checkpoint.position:
+            self.stdout.write(
+                f'Resuming after {checkpoint.position} records'
+            )
+
+        self._create_staging_table()
+        handle, records, parse = self._open_records(path, options['format'])
+        started = time.monotonic()
+        imported = skipped = 0
+        position = checkpoint.position
+        with handle:
+            records = enumerate(records, start=1)
+            for _ in islice(records, position):
+                pass
+            while batch := list(islice(records, options['batch_size'])):
+                rows = []
+                for line, record in batch:
+                    try:
+                        record = parse(record)
+                    except ValueError as exc:
+                        self._skip(line, f'malformed record ({exc})')
+                        skipped += 1
+                        continue
+                    if record is None:
+                        continue
+                    row = self._staging_row(line, record, options['user'])
+                    if row is None:
+                        self._skip(line, 'invalid record')
+                        skipped += 1
+                    else:
+                        rows.append(row)
+
+                with transaction.atomic():
+                    user_ids, unknown_users = self._merge_batch(rows)
+                    position = batch[-1][0]
+                    ImportCheckpoint.objects.filter(pk=checkpoint.pk).update(
+                        position=position
+                    )
+                for user_id in user_ids:
+                    bump_data_version(user_id)
+
+                imported += len(rows) - unknown_users
+                skipped += unknown_users
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'{position} records read, {imported} imported, '
+                    f'{skipped} skipped '
+                    f'({(imported + skipped) / elapsed:.0f} records/s)'
+                )
+
+        ImportCheckpoint.objects.filter(pk=checkpoint.pk).update(
+            completed=True
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} recipies, skipped {skipped} records '
+            f'in {time.monotonic() - started:.1f}s'
+        ))
@@ -0,0 +1,469 @@
+"""
+Django command to load test the API over HTTP at rising concurrency
+"""
+
+import http.client
+import io
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from django.urls import reverse
+from PIL import Image
+
+from core.management.commands.benchmark_reads import percentile
+from core.management.commands.seed_perf_data import (
+    DISHES,
+    EMAIL_DOMAIN,
+    MAINS,
+    PASSWORD,
+)
+from core.models import Recipie, Tag
+from recipie.cache import bump_data_version
+
+TITLE_PREFIX = 'Load test'
+# Upper bounds in milliseconds of the latency histogram buckets
+BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+MIX = {
+    'list': 50,
+    'filter': 15,
+    'search': 15,
+    'create': 12,
+    'upload': 5,
+    'login': 3,
+}
+
+
+def parse_mix(value):
+    """Parse name=weight pairs into a mix of endpoint weights"""
+    mix = {}
+    for pair in value.split(','):
+        name, _, weight = pair.partition('=')
+        name = name.strip()
+        if name not in MIX:
+            raise CommandError(f'Unknown endpoint {name!r} in --mix')
+        try:
+            mix[name] = int(weight)
+        except ValueError:
+            raise CommandError(f'Weight of {name} must be an integer')
+    if sum(mix.values()) < 1:
+        raise CommandError('--mix needs a positive weight')
+    return mix
+
+
+def histogram(latencies):
+    """Count latencies in milliseconds into BUCKETS plus an overflow"""
+    counts = [0] * (len(BUCKETS) + 1)
+    for latency in latencies:
+        index = next(
+            (i for i, bound in enumerate(BUCKETS) if latency < bound),
+            len(BUCKETS),
+        )
+        counts[index] += 1
+    return counts
+
+
+def sample_image():
+    """Return the bytes of a small JPEG to upload"""
+    image = Image.new('RGB', (640, 480), (200, 120, 40))
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=85)
+    return buffer.getvalue()
+
+
+class VirtualUser:
+    """A client of one seeded user sending requests over one connection"""
+
+    def __init__(self, host, port, email, tag_ids, image, seed):
+        self.connection = http.client.HTTPConnection(host, port, timeout=60)
+        self.email = email
+        self.tag_ids = tag_ids
+        self.image = image
+        self.rng = random.Random(seed)
+        self.token = None
+        self.created = []
+        self.results = []
+
+    def _send(self, method, path, body=None, content_type=None):
+        """Send a request and return the status and body, 0 on failure"""
+        headers = {}
+        if self.token:
+            headers['Authorization'] = f'Token {self.token}'
+        if content_type:
+            headers['Content-Type'] = content_type
+        try:
+            self.connection.request(method, path, body, headers)
+            response = self.connection.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            # Reconnects on the next request
+            self.connection.close()
+            return 0, b''
+
+    def _json(self, method, path, data):
+        return self._send(
+            method, path, json.dumps(data).encode(), 'application/json'
+        )
+
+    def login(self):
+        status, body = self._json(
+            'POST',
+            reverse('user:token'),
+            {'email': self.email, 'password': PASSWORD},
+        )
+        if status == 200:
+            self.token = json.loads(body)['token']
+        return status
+
+    def list(self):
+        return self._send('GET', reverse('recipie:recipie-list'))[0]
+
+    def filter(self):
+        if not self.tag_ids:
+            return self.list()
+        query = urlencode({'tags': self.rng.choice(self.tag_ids)})
+        return self._send(
+            'GET', f"{reverse('recipie:recipie-list')}?{query}"
+        )[0]
+
+    def search(self):
+        query = urlencode({
+            'q': f'{self.rng.choice(MAINS)} {self.rng.choice(DISHES)}'
+        })
+        return self._send(
+            'GET', f"{reverse('recipie:recipie-list')}?{query}"
+        )[0]
+
+    def create(self):
+        status, body = self._json('POST', reverse('recipie:recipie-list'), {
+            'title': f'{TITLE_PREFIX} {self.rng.choice(MAINS)}',
+            'time_minutes': self.rng.randint(5, 90),
+            'price': f'{self.rng.randint(100, 3000) / 100:.2f}',
+            'tags': [
+                {'name': 'Dinner'},
+                {'name': self.rng.choice(['Quick', 'Spicy', 'Budget'])},
+            ],
+            'ingredients': [{'name': 'Rice'}, {'name': 'Onion'}],
+        })
+        if status == 201:
+            self.created.append(json.loads(body)['id'])
+        return status
+
+    def upload(self):
+        """Upload an image to a recipie created by this client"""
+        if not self.created:
+            return None
+        boundary = uuid.uuid4().hex
+        body = b''.join([
+            f'--{boundary}\r\n'.encode(),
+            b'Content-Disposition: form-data; name="image"; '
+            b'filename="load.jpg"\r\n',
+            b'Content-Type: image/jpeg\r\n\r\n',
+            self.image,
+            f'\r\n--{boundary}--\r\n'.encode(),
+        ])
+        return self._send(
+            'POST',
+            reverse(
+                'recipie:recipie-upload-image',
+                args=[self.rng.choice(self.created)],
+            ),
+            body,
+            f'multipart/form-data; boundary={boundary}',
+        )[0]
+
+    def call(self, name):
+        """Run one endpoint and record its status and latency"""
+        started = time.perf_counter()
+        status = getattr(self, name)()
+        if status is None:
+            # Nothing to do yet, such as uploading before any create
+            return
+        elapsed = (time.perf_counter() - started) * 1000
+        self.results.append((name, status, elapsed))
+
+    def run(self, names, weights, deadline):
+        self.call('login')
+        while time.perf_counter() < deadline:
+            self.call(self.rng.choices(names, weights)[0])
+        self.connection.close()
+
+
+class Command(BaseCommand):
+    """Django command to load test the API with a mix of realistic calls
+
+    Each level of --concurrency runs that many clients for --duration
+    seconds. Clients sign in as seeded users, so run seed_perf_data
+    first, and keep one connection each, sending requests back to back:
+    token logins, recipie list polls, tag filters, searches, creates with
+    tags and image uploads, weighted by --mix. Unless --url is given an
+    instance is started with uvicorn against the configured database.
+    Throughput, error rates and latency histograms are reported for each
+    endpoint and level, so the level where throughput stops rising shows
+    where the server saturates. The load generator is a single Python
+    process and can saturate first; watch its CPU at high concurrency.
+    """
+    help = 'Load test the API over HTTP and sweep the concurrency'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            help='Base URL of a running instance sharing this database',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='uvicorn worker processes when starting an instance',
+        )
+        parser.add_argument(
+            '--concurrency',
+            default='1,4,16,32',
+            help='Comma separated numbers of concurrent clients',
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=20.0,
+            help='Seconds to run each concurrency level',
+        )
+        parser.add_argument(
+            '--mix',
+            help='Endpoint weights, such as list=50,filter=15,create=10',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write results to this file')
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Keep the recipies created by the test',
+        )
+
+    def _levels(self, value):
+        try:
+            levels = [int(level) for level in value.split(',')]
+        except ValueError:
+            raise CommandError('--concurrency must list integers')
+        if not levels or min(levels) < 1:
+            raise CommandError('--concurrency levels must be positive')
+        return levels
+
+    def _start_server(self, workers):
+        """Start uvicorn on a free port and return the process and URL"""
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        process = subprocess.Popen(
+            [
+                sys.executable, '-m', 'uvicorn', 'app.asgi:application',
+                '--host', '127.0.0.1',
+                '--port', str(port),
+                '--workers', str(workers),
+                '--no-access-log',
+                '--log-level', 'warning',
+            ],
+            cwd=settings.BASE_DIR,
+            env=os.environ.copy(),
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError('uvicorn exited while starting')
+            try:
+                socket.create_connection(('127.0.0.1', port), 1).close()
+                return process, f'http://127.0.0.1:{port}'
+            except OSError:
+                time.sleep(0.2)
+        process.terminate()
+        raise CommandError('uvicorn did not start within 30 seconds')
+
+    def _accounts(self):
+        """Return seeded emails and tag ids, heaviest users first"""
+        users = list(
+            get_user_model().objects.filter(
+                email__endswith=f'@{EMAIL_DOMAIN}'
+            ).order_by('id').values_list('id', 'email')
+        )
+        if not users:
+            raise CommandError('No seeded users; run seed_perf_data first')
+        tag_ids = {}
+        for user_id, tag_id in Tag.objects.filter(
+            user_id__in=[user_id for user_id, _ in users]
+        ).values_list('user_id', 'id'):
+            tag_ids.setdefault(user_id, []).append(tag_id)
+        return [(email, tag_ids.get(pk, [])) for pk, email in users]
+
+    def _run_level(self, url, clients, accounts, mix, options, image):
+        parts = urlsplit(url)
+        names, weights = zip(*mix.items())
+        users = [
+            VirtualUser(
+                parts.hostname,
+                parts.port,
+                *accounts[n % len(accounts)],
+                image,
+                seed=options['seed'] * 100003 + n,
+            )
+            for n in range(clients)
+        ]
+        started = time.perf_counter()
+        deadline = started + options['duration']
+        threads = [
+            threading.Thread(target=user.run, args=(names, weights, deadline))
+            for user in users
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        results = [result for user in users for result in user.results]
+        return self._summarize(results, elapsed)
+
+    def _summarize(self, results, elapsed):
+        endpoints = {}
+        for name in MIX:
+            calls = [result for result in results if result[0] == name]
+            if not calls:
+                continue
+            latencies = [latency for _, _, latency in calls]
+            statuses = Counter(status for _, status, _ in calls)
+            errors = sum(
+                count for status, count in statuses.items()
+                if not 200 <= status < 400
+            )
+            endpoints[name] = {
+                'requests': len(calls),
+                'errors': errors,
+                'throughput': round(len(calls) / elapsed, 2),
+                'error_rate': round(errors / len(calls), 4),
+                'statuses': {str(k): v for k, v in sorted(statuses.items())},
+                'p50_ms': round(statistics.median(latencies), 2),
+                'p90_ms': round(percentile(latencies, 0.9), 2),
+                'p99_ms': round(percentile(latencies, 0.99), 2),
+                'max_ms': round(max(latencies), 2),
+                'histogram': histogram(latencies),
+            }
+        latencies = [latency for _, _, latency in results]
+        errors = sum(summary['errors'] for summary in endpoints.values())
+        return {
+            'requests': len(results),
+            'throughput': round(len(results) / elapsed, 2),
+            'error_rate': round(errors / len(results), 4) if results else 0,
+            'p50_ms': round(statistics.median(latencies), 2)
+            if latencies else None,
+            'p99_ms': round(percentile(latencies, 0.99), 2)
+            if latencies else None,
+            'endpoints': endpoints,
+        }
+
+    def _report(self, clients, level):
+        self.stdout.write(
+            f"\n{clients} clients: {level['throughput']:.1f} req/s, "
+            f"{level['error_rate']:.1%} errors, p50 {level['p50_ms']} ms, "
+            f"p99 {level['p99_ms']} ms"
+        )
+        self.stdout.write(
+            f"{'endpoint':<10}{'reqs':>7}{'req/s':>8}{'errors':>8}"
+            f"{'p50':>8}{'p90':>8}{'p99':>8}  "
+            + ''.join(f'{f"<{bound}":>6}' for bound in BUCKETS)
+            + f'{f">={BUCKETS[-1]}":>7}'
+        )
+        for name, summary in level['endpoints'].items():
+            line = (
+                f"{name:<10}{summary['requests']:>7}"
+                f"{summary['throughput']:>8.1f}"
+                f"{summary['error_rate']:>8.1%}"
+                f"{summary['p50_ms']:>8.1f}{summary['p90_ms']:>8.1f}"
+                f"{summary['p99_ms']:>8.1f}  "
+                + ''.join(f'{count:>6}' for count in summary['histogram'][:-1])
+                + f"{summary['histogram'][-1]:>7}"
+            )
+            self.stdout.write(
+                self.style.ERROR(line) if summary['error_rate'] else line
+            )
+
+    def _cleanup(self):
+        """Delete recipies the test created and drop cached responses"""
+        created = Recipie.objects.filter(
+            user__email__endswith=f'@{EMAIL_DOMAIN}',
+            title__startswith=TITLE_PREFIX,
+        )
+        user_ids = set(created.values_list('user_id', flat=True))
+        deleted, _ = created.delete()
+        for user_id in user_ids:
+            bump_data_version(user_id)
+        return deleted
+
+    def handle(self, *args, **options):
+        levels = self._levels(options['concurrency'])
+        if options['duration'] <= 0:
+            raise CommandError('--duration must be positive')
+        if (
+            not options['url'] and options['workers'] > 1
+            and settings.CACHE_BACKEND == 'locmem'
+        ):
+            # Workers would each cache tokens and lists of their own
+            raise CommandError(
+                'CACHE_BACKEND=locmem is not shared between --workers'
+            )
+        mix = parse_mix(options['mix']) if options['mix'] else MIX
+        accounts = self._accounts()
+        image = sample_image()
+
+        process = None
+        url = options['url']
+        if not url:
+            process, url = self._start_server(options['workers'])
+        results = {
+            'url': url,
+            'duration': options['duration'],
+            'mix': mix,
+            'buckets_ms': list(BUCKETS),
+            'levels': {},
+        }
+        try:
+            self.stdout.write(
+                f"Load testing {url} for {options['duration']:g} s at "
+                f"{', '.join(map(str, levels))} clients"
+            )
+            for clients in levels:
+                level = self._run_level(
+                    url, clients, accounts, mix, options, image
+                )
+                results['levels'][str(clients)] = level
+                self._report(clients, level)
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+            if not options['keep']:
+                self.stdout.write(
+                    f'\nDeleted {self._cleanup()} rows created by the test'
+                )
+
+        peak = max(
+            results['levels'].items(),
+            key=lambda item: item[1]['throughput'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Throughput peaked at {peak[1]['throughput']:.1f} req/s "
+            f"with {peak[0]} clients"
+        ))
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as handle:
+                json.dump(results, handle, indent=2)
+                handle.write('\n')
+            self.stdout.write(f"Wrote {options['output']}")
@@ -0,0 +1,128 @@
+"""
+Django command to move recipie images to content addressed paths
+"""
+
+import os
+import re
+
+from django.core.files.base import File
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import Recipie
+from core.storage import content_addressed_path, file_digest
+from recipie.cache import bump_data_version
+from recipie.images import variant_name
+
+CONTENT_ADDRESSED = re.compile(
+    r'^upload/recipie/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.\w+$'
+)
+
+
+class Command(BaseCommand):
+    """Django command to move recipie images to content addressed paths
+
+    Recipies are walked in primary key batches. Each image is hashed and
+    copied to its sharded path, or linked to the copy already there, and
+    the batch's rows are rewritten in one transaction. A row is only
+    rewritten if it still has the image that was copied, so uploads made
+    meanwhile are kept. Originals are left in place unless --delete-old is
+    given.
+    """
+    help = 'Move recipie images to content addressed, sharded paths'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--delete-old',
+            action='store_true',
+            help='Delete the old files once their rows were rewritten',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would be moved without changing anything',
+        )
+
+    def _move(self, storage, recipie, dry_run):
+        """Store a recipie's image under its content address"""
+        old = recipie.image.name
+        with storage.open(old) as original:
+            digest = file_digest(File(original))
+            new = content_addressed_path(
+                os.path.join('upload', 'recipie'),
+                digest,
+                os.path.splitext(old)[1],
+            )
+            if not dry_run:
+                new = storage.save(new, File(original))
+
+        for variant in recipie.image_variants:
+            old_variant = variant_name(old, variant)
+            if not dry_run and storage.exists(old_variant):
+                with storage.open(old_variant) as content:
+                    storage.save(variant_name(new, variant), File(content))
+        return new
+
+    def _delete(self, storage, name, variants):
+        storage.delete(name)
+        for variant in variants:
+            storage.delete(variant_name(name, variant))
+
+    def _rewrite(self, changed):
+        """Point rows at their moved images, returning those rewritten"""
+        rewritten = []
+        now = timezone.now()
+        with transaction.atomic():
+            for recipie, old, new in changed:
+                if Recipie.objects.filter(pk=recipie.pk, image=old).update(
+                    image=new, updated_at=now
+                ):
+                    rewritten.append((recipie, old, new))
+        return rewritten
+
+    def handle(self, *args, **options):
+        storage = Recipie._meta.get_field('image').storage
+        dry_run = options['dry_run']
+        queryset = (
+            Recipie.objects.exclude(image='').exclude(image__isnull=True)
+            .only('id', 'user_id', 'image', 'image_variants')
+            .order_by('pk')
+        )
+
+        last_pk = 0
+        moved = missing = 0
+        while batch := list(
+            queryset.filter(pk__gt=last_pk)[:options['batch_size']]
+        ):
+            last_pk = batch[-1].pk
+            changed = []
+            for recipie in batch:
+                name = recipie.image.name
+                if CONTENT_ADDRESSED.match(name):
+                    continue
+                if not storage.exists(name):
+                    missing += 1
+                    self.stderr.write(f'Missing file for {recipie.pk}: {name}')
+                    continue
+                new = self._move(storage, recipie, dry_run)
+                changed.append((recipie, name, new))
+
+            if changed and not dry_run:
+                changed = self._rewrite(changed)
+                for user_id in {recipie.user_id for recipie, _, _ in changed}:
+                    bump_data_version(user_id)
+                if options['delete_old']:
+                    for recipie, name, _ in changed:
+                        self._delete(storage, name, recipie.image_variants)
+
+            moved += len(changed)
+            self.stdout.write(
+                f'Up to recipie {last_pk}: {moved} moved, {missing} missing'
+            )
+
+        verb = 'Would move' if dry_run else 'Moved'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {moved} images, {missing} files missing'
+        ))
@@ -0,0 +1,237 @@
+"""
+Django command to generate synthetic data for performance testing
+"""
+
+import random
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+
+from core.models import Recipie, Tag, Ingredient
+from recipie.cache import bump_data_version
+
+EMAIL_DOMAIN = 'perf.example.com'
+PASSWORD = 'perfpass123'
+
+ADJECTIVES = [
+    'Spicy', 'Creamy', 'Smoky', 'Quick', 'Crispy', 'Roasted', 'Sticky',
+    'Lemon', 'Garlic', 'Herby', 'Sweet', 'Tangy', 'Rustic', 'Classic',
+]
+DISHES = [
+    'curry', 'soup', 'stew', 'salad', 'pasta', 'risotto', 'tacos', 'pie',
+    'noodles', 'tart', 'pancakes', 'chili', 'burger', 'bowl', 'cake',
+]
+MAINS = [
+    'chicken', 'tofu', 'prawn', 'lentil', 'mushroom', 'beef', 'salmon',
+    'chickpea', 'pumpkin', 'lamb', 'aubergine', 'pork', 'bean', 'cod',
+]
+TAG_NAMES = [
+    'Vegan', 'Vegetarian', 'Dinner', 'Lunch', 'Breakfast', 'Dessert',
+    'Quick', 'Healthy', 'Comfort', 'Party', 'Spicy', 'Budget', 'Baking',
+    'Gluten free', 'Family', 'Summer', 'Winter', 'Batch cook',
+]
+INGREDIENT_NAMES = [
+    'Salt', 'Pepper', 'Olive oil', 'Garlic', 'Onion', 'Butter', 'Flour',
+    'Sugar', 'Egg', 'Milk', 'Rice', 'Tomato', 'Lemon', 'Ginger', 'Chili',
+    'Cumin', 'Coriander', 'Basil', 'Potato', 'Carrot', 'Cheese', 'Cream',
+]
+
+
+def zipf_weights(count, exponent):
+    """Return cumulative weights making item n about 1/n^s as likely"""
+    return list(accumulate(1 / (n ** exponent) for n in range(1, count + 1)))
+
+
+def numbered_names(base, count):
+    """Return count distinct names, numbering them once base runs out"""
+    names = []
+    for i in range(count):
+        repeat, index = divmod(i, len(base))
+        names.append(f'{base[index]} {repeat + 1}' if repeat else base[index])
+    return names
+
+
+class Command(BaseCommand):
+    """Django command to seed users, recipies, tags and ingredients
+
+    Recipies are spread over users and tags and ingredients over recipies
+    following Zipf distributions, so a few users own most recipies and a
+    few tags and ingredients are on most of them. Users are created under
+    @perf.example.com, and the same --seed always generates the same data.
+    """
+    help = 'Generate skewed synthetic data for benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument(
+            '--recipes',
+            type=int,
+            default=20000,
+            help='Recipies in total, spread unevenly over the users',
+        )
+        parser.add_argument(
+            '--tags', type=int, default=30, help='Tags per user'
+        )
+        parser.add_argument(
+            '--ingredients', type=int, default=80, help='Ingredients per user'
+        )
+        parser.add_argument(
+            '--skew',
+            type=float,
+            default=1.1,
+            help='Zipf exponent; 0 spreads everything evenly',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Delete previously seeded users and their data first',
+        )
+
+    def _create_users(self, count):
+        password = make_password(PASSWORD)
+        users = get_user_model().objects.bulk_create(
+            get_user_model()(
+                email=f'user{n}@{EMAIL_DOMAIN}',
+                name=f'Perf user {n}',
+                password=password,
+            )
+            for n in range(count)
+        )
+        return [user.id for user in users]
+
+    def _create_attrs(self, model, names, user_ids):
+        """Create the same names for every user, return ids per user"""
+        objs = model.objects.bulk_create(
+            (
+                model(user_id=user_id, name=name)
+                for user_id in user_ids
+                for name in names
+            ),
+            batch_size=self.batch_size,
+        )
+        per_user = len(names)
+        return {
+            user_id: [obj.id for obj in objs[i * per_user:(i + 1) * per_user]]
+            for i, user_id in enumerate(user_ids)
+        }
+
+    def _pick(self, ids, cum_weights, most):
+        """Return up to most distinct ids favouring the popular ones"""
+        if not ids or not most:
+            return set()
+        count = self.rng.randint(0, most)
+        return set(self.rng.choices(ids, cum_weights=cum_weights, k=count))
+
+    def _recipie(self, user_id):
+        rng = self.rng
+        main, dish = rng.choice(MAINS), rng.choice(DISHES)
+        link = f'https://example.com/{main}-{dish}'
+        return Recipie(
+            user_id=user_id,
+            title=f'{rng.choice(ADJECTIVES)} {main} {dish}',
+            description=(
+                f'A {rng.choice(ADJECTIVES).lower()} {dish} with {main} '
+                f'and {rng.choice(MAINS)}, ready in no time.'
+            ),
+            time_minutes=min(int(rng.expovariate(1 / 35)) + 5, 600),
+            price=Decimal(rng.randint(100, 15000)) / 100,
+            link=link if rng.random() < 0.3 else '',
+        )
+
+    def _create_recipies(self, options, user_ids, tag_ids, ingredient_ids):
+        user_weights = zipf_weights(len(user_ids), options['skew'])
+        tag_weights = zipf_weights(options['tags'], options['skew'])
+        ingredient_weights = zipf_weights(
+            options['ingredients'], options['skew']
+        )
+        tag_links = Recipie.tags.through
+        ingredient_links = Recipie.ingredients.through
+
+        remaining = options['recipes']
+        while remaining:
+            size = min(remaining, self.batch_size)
+            owners = self.rng.choices(
+                user_ids, cum_weights=user_weights, k=size
+            )
+            with transaction.atomic():
+                recipies = Recipie.objects.bulk_create(
+                    self._recipie(user_id) for user_id in owners
+                )
+                tags, ingredients = [], []
+                for recipie in recipies:
+                    tags += [
+                        tag_links(recipie_id=recipie.id, tag_id=tag_id)
+                        for tag_id in self._pick(
+                            tag_ids[recipie.user_id], tag_weights, 5
+                        )
+                    ]
+                    ingredients += [
+                        ingredient_links(
+                            recipie_id=recipie.id, ingredient_id=pk
+                        )
+                        for pk in self._pick(
+                            ingredient_ids[recipie.user_id],
+                            ingredient_weights,
+                            12,
+                        )
+                    ]
+                tag_links.objects.bulk_create(
+                    tags, batch_size=self.batch_size
+                )
+                ingredient_links.objects.bulk_create(
+                    ingredients, batch_size=self.batch_size
+                )
+            remaining -= size
+            self.stdout.write(
+                f'{options["recipes"] - remaining} recipies', ending='\r'
+            )
+        self.stdout.write('')
+
+    def handle(self, *args, **options):
+        for name in ('users', 'batch_size'):
+            if options[name] < 1:
+                raise CommandError(f'--{name.replace("_", "-")} must be >= 1')
+        for name in ('recipes', 'tags', 'ingredients'):
+            if options[name] < 0:
+                raise CommandError(f'--{name} must not be negative')
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        seeded = get_user_model().objects.filter(
+            email__endswith=f'@{EMAIL_DOMAIN}'
+        )
+
+        if options['clear']:
+            for user_id in seeded.values_list('id', flat=True):
+                bump_data_version(user_id)
+            deleted, _ = seeded.delete()
+            self.stdout.write(f'Deleted {deleted} seeded rows')
+        elif seeded.exists():
+            raise CommandError(
+                'Seeded users exist already; pass --clear to replace them'
+            )
+
+        with transaction.atomic():
+            user_ids = self._create_users(options['users'])
+            tag_ids = self._create_attrs(
+                Tag, numbered_names(TAG_NAMES, options['tags']), user_ids
+            )
+            ingredient_ids = self._create_attrs(
+                Ingredient,
+                numbered_names(INGREDIENT_NAMES, options['ingredients']),
+                user_ids,
+            )
+        self._create_recipies(options, user_ids, tag_ids, ingredient_ids)
+        for user_id in user_ids:
+            bump_data_version(user_id)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {options['users']} users and {options['recipes']} "
+            f"recipies; users sign in as user<n>@{EMAIL_DOMAIN} with "
+            f"password {PASSWORD}"
+        ))
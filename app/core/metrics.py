@@ -0,0 +1,398 @@
+"""
+Request metrics in the Prometheus text format
+
+Each thread records into its own shard, so requests never contend on a
+lock; a scrape merges the shards. When a thread ends its shard is folded
+into the totals of ended threads, so servers starting a thread per
+request do not pile up shards. Routes are labelled by URL name, and
+only names discovered in NAMESPACES are used as labels, so ids in paths
+never create new series. Every process keeps its own metrics, so scrape
+each worker or run one per container.
+"""
+
+import itertools
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.urls import URLResolver, get_resolver
+from django.utils.crypto import constant_time_compare
+
+from core.db.pool import pool_stats
+from recipie.cache import cache_stats
+
+NAMESPACES = ('recipie', 'recipie-async', 'user')
+METHODS = frozenset(
+    ['GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS']
+)
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_timer = ContextVar('query_timer', default=None)
+_local = threading.local()
+_shards = {}
+_shard_ids = itertools.count()
+_retired = {}
+# Reentrant, as garbage collection may retire a shard while it is held
+_shards_lock = threading.RLock()
+
+
+class QueryTimer:
+    """Database execute wrapper counting queries and the time they take
+
+    Queries are also added to the parent, the timer of an enclosing
+    timed_queries block.
+    """
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.count = 0
+        self.seconds = 0.0
+
+    def add(self, seconds):
+        timer = self
+        while timer is not None:
+            timer.seconds += seconds
+            timer.count += 1
+            timer = timer.parent
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.add(time.perf_counter() - started)
+
+
+def timed_execute(execute, sql, params, many, context):
+    """Execute wrapper reporting to the timer of the current request"""
+    timer = _timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_query_timing(sender, connection, **kwargs):
+    """Time the queries of every connection, in any thread
+
+    Async views run queries on other threads with their own connections,
+    so the timer is found through a context variable, which sync_to_async
+    carries over, rather than wrapping the connections of one thread.
+    """
+    if timed_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(timed_execute)
+
+
+@contextmanager
+def timed_queries():
+    """Count and time the queries run within the block"""
+    timer = QueryTimer(parent=_timer.get())
+    token = _timer.set(timer)
+    try:
+        yield timer
+    finally:
+        _timer.reset(token)
+
+
+class Series:
+    """Totals and histograms of the requests sharing one set of labels"""
+    __slots__ = (
+        'count', 'duration', 'durations', 'sized', 'size', 'sizes',
+        'queries', 'db_seconds',
+    )
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.durations = [0] * (len(DURATION_BUCKETS) + 1)
+        self.sized = 0
+        self.size = 0
+        self.sizes = [0] * (len(SIZE_BUCKETS) + 1)
+        self.queries = 0
+        self.db_seconds = 0.0
+
+    def observe(self, duration, size, queries, db_seconds):
+        self.count += 1
+        self.duration += duration
+        self.durations[bisect_left(DURATION_BUCKETS, duration)] += 1
+        if size is not None:
+            self.sized += 1
+            self.size += size
+            self.sizes[bisect_left(SIZE_BUCKETS, size)] += 1
+        self.queries += queries
+        self.db_seconds += db_seconds
+
+    def merge(self, other):
+        self.count += other.count
+        self.duration += other.duration
+        self.sized += other.sized
+        self.size += other.size
+        self.queries += other.queries
+        self.db_seconds += other.db_seconds
+        self.durations = [
+            mine + theirs
+            for mine, theirs in zip(self.durations, other.durations)
+        ]
+        self.sizes = [
+            mine + theirs for mine, theirs in zip(self.sizes, other.sizes)
+        ]
+
+
+@lru_cache(maxsize=None)
+def discovered_routes():
+    """Return the URL names of every pattern in NAMESPACES"""
+    names = set()
+
+    def walk(patterns, namespace):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                nested = pattern.namespace
+                if namespace and nested:
+                    nested = f'{namespace}:{nested}'
+                walk(pattern.url_patterns, nested or namespace)
+            elif pattern.name and namespace:
+                if namespace.split(':')[0] in NAMESPACES:
+                    names.add(f'{namespace}:{pattern.name}')
+
+    walk(get_resolver().url_patterns, None)
+    return frozenset(names)
+
+
+def request_labels(request, response):
+    """Return the route, action, method and status labels of a request"""
+    match = request.resolver_match
+    if match is None:
+        route, action = 'unmatched', ''
+    elif match.view_name in discovered_routes():
+        route = match.view_name
+        actions = getattr(match.func, 'actions', None) or {}
+        action = actions.get(request.method.lower(), '')
+    else:
+        route, action = 'other', ''
+    method = request.method if request.method in METHODS else 'other'
+    return route, action, method, str(response.status_code)
+
+
+class _ThreadAlive:
+    """Kept in thread local storage, which is freed when its thread ends"""
+
+
+def _merge(merged, shard):
+    # Copying is atomic; a series being updated may be a request behind
+    # in some of its fields, which the next scrape catches up on
+    for labels, series in shard.copy().items():
+        merged.setdefault(labels, Series()).merge(series)
+
+
+def _retire(shard_id):
+    """Fold the shard of an ended thread into the retired totals"""
+    with _shards_lock:
+        shard = _shards.pop(shard_id, None)
+        if shard is not None:
+            _merge(_retired, shard)
+
+
+def record(request, response, duration, timer):
+    """Add a served request to the shard of the current thread"""
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        shard_id = next(_shard_ids)
+        shard = _local.shard = {}
+        _local.alive = _ThreadAlive()
+        with _shards_lock:
+            _shards[shard_id] = shard
+        weakref.finalize(_local.alive, _retire, shard_id)
+    labels = request_labels(request, response)
+    series = shard.get(labels)
+    if series is None:
+        series = shard[labels] = Series()
+    size = None if response.streaming else len(response.content)
+    series.observe(duration, size, timer.count, timer.seconds)
+
+
+def collect():
+    """Return the series of all threads merged by labels"""
+    merged = {}
+    with _shards_lock:
+        _merge(merged, _retired)
+        shards = list(_shards.values())
+    for shard in shards:
+        _merge(merged, shard)
+    return merged
+
+
+def reset():
+    """Forget every recorded request, for tests"""
+    with _shards_lock:
+        for shard in list(_shards.values()):
+            shard.clear()
+        _retired.clear()
+
+
+def _escape(value):
+    value = str(value).replace('\\', r'\\').replace('"', r'\"')
+    return value.replace('\n', r'\n')
+
+
+def _labels(**labels):
+    return ','.join(
+        f'{key}="{_escape(value)}"' for key, value in labels.items()
+    )
+
+
+class Exposition:
+    """Lines of metric families in the Prometheus text format"""
+
+    def __init__(self):
+        self.lines = []
+
+    def family(self, name, kind, help_text):
+        self.lines.append(f'# HELP {name} {help_text}')
+        self.lines.append(f'# TYPE {name} {kind}')
+
+    def sample(self, name, labels, value):
+        self.lines.append(
+            f'{name}{{{labels}}} {value}' if labels else f'{name} {value}'
+        )
+
+    def histogram(self, name, labels, bounds, counts, total, count):
+        cumulative = 0
+        for bound, bucket in zip(bounds, counts):
+            cumulative += bucket
+            self.sample(
+                f'{name}_bucket', f'{labels},le="{bound}"', cumulative
+            )
+        self.sample(f'{name}_bucket', f'{labels},le="+Inf"', count)
+        self.sample(f'{name}_sum', labels, total)
+        self.sample(f'{name}_count', labels, count)
+
+    def render(self):
+        return '\n'.join(self.lines) + '\n'
+
+
+def _request_families(out, series):
+    rows = [
+        (
+            _labels(route=route, action=action, method=method, status=status),
+            values,
+        )
+        for (route, action, method, status), values in sorted(series.items())
+    ]
+    out.family('http_requests_total', 'counter', 'Requests served.')
+    for labels, values in rows:
+        out.sample('http_requests_total', labels, values.count)
+
+    out.family(
+        'http_request_duration_seconds', 'histogram', 'Time to serve requests.'
+    )
+    for labels, values in rows:
+        out.histogram(
+            'http_request_duration_seconds',
+            labels,
+            DURATION_BUCKETS,
+            values.durations,
+            values.duration,
+            values.count,
+        )
+
+    out.family(
+        'http_response_size_bytes',
+        'histogram',
+        'Size of response bodies, streamed responses excluded.',
+    )
+    for labels, values in rows:
+        out.histogram(
+            'http_response_size_bytes',
+            labels,
+            SIZE_BUCKETS,
+            values.sizes,
+            values.size,
+            values.sized,
+        )
+
+    out.family(
+        'http_request_db_queries_total',
+        'counter',
+        'Database queries run by requests.',
+    )
+    for labels, values in rows:
+        out.sample('http_request_db_queries_total', labels, values.queries)
+
+    out.family(
+        'http_request_db_duration_seconds_total',
+        'counter',
+        'Time requests spent in database queries.',
+    )
+    for labels, values in rows:
+        out.sample(
+            'http_request_db_duration_seconds_total', labels, values.db_seconds
+        )
+
+
+POOL_GAUGES = [
+    ('db_pool_size', 'size', 'Most connections a pool opens.'),
+    ('db_pool_connections_in_use', 'in_use', 'Connections handed out.'),
+    ('db_pool_connections_idle', 'idle', 'Open connections not in use.'),
+]
+POOL_COUNTERS = [
+    ('db_pool_connections_opened_total', 'opened', 'Connections opened.'),
+    ('db_pool_checkouts_total', 'checkouts', 'Connections handed out.'),
+    ('db_pool_waits_total', 'waits', 'Checkouts that waited.'),
+    ('db_pool_timeouts_total', 'timeouts', 'Checkouts that gave up.'),
+    ('db_pool_wait_seconds_total', 'wait_time', 'Time spent waiting.'),
+]
+
+
+def _pool_families(out, pools):
+    for kind, families in [
+        ('gauge', POOL_GAUGES),
+        ('counter', POOL_COUNTERS),
+    ]:
+        for name, key, help_text in families:
+            out.family(name, kind, help_text)
+            for pool, stats in sorted(pools.items()):
+                out.sample(name, _labels(pool=pool), stats[key])
+
+
+def render_metrics():
+    """Return every metric of this process in the Prometheus text format"""
+    out = Exposition()
+    _request_families(out, collect())
+    _pool_families(out, pool_stats())
+    stats = cache_stats()
+    for name in ('hits', 'misses'):
+        out.family(
+            f'response_cache_{name}_total',
+            'counter',
+            f'Cached list response {name}.',
+        )
+        out.sample(f'response_cache_{name}_total', '', stats[name])
+    return out.render()
+
+
+def metrics_view(request):
+    """Serve metrics to requests with METRICS_TOKEN as a bearer token
+
+    Without METRICS_TOKEN set, metrics are only served when DEBUG is on.
+    """
+    token = settings.METRICS_TOKEN
+    if not token:
+        if not settings.DEBUG:
+            raise Http404
+    elif not constant_time_compare(
+        request.headers.get('Authorization', ''), f'Bearer {token}'
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE)
@@ -0,0 +1,45 @@
+"""
+Middleware for the app
+"""
+
+import asyncio
+import time
+
+from core import metrics
+
+
+class MetricsMiddleware:
+    """Record the duration, size and database work of each request
+
+    Runs in sync or async mode to match the handler, so async views are
+    not moved onto a thread for it.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Lets Django see the instance as a coroutine function
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with metrics.timed_queries() as timer:
+            response = self.get_response(request)
+        metrics.record(
+            request, response, time.perf_counter() - started, timer
+        )
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        with metrics.timed_queries() as timer:
+            response = await self.get_response(request)
+        metrics.record(
+            request, response, time.perf_counter() - started, timer
+        )
+        return response
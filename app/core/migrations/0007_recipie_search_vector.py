@@ -0,0 +1,79 @@
+# Generated by Django 4.1.13 on 2026-10-18 03:08
+# Non-atomic, so existing rows are backfilled in committed batches and
+# the GIN index is built with CREATE INDEX CONCURRENTLY, without holding
+# locks that block writes for the whole migration.
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+SEARCH_VECTOR = """
+    setweight(to_tsvector('pg_catalog.english', coalesce({row}title, '')), 'A') ||
+    setweight(to_tsvector('pg_catalog.english', coalesce({row}description, '')), 'B')
+"""
+
+SEARCH_VECTOR_TRIGGER = f"""
+CREATE FUNCTION core_recipie_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := {SEARCH_VECTOR.format(row='NEW.')};
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_recipie_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, description, search_vector
+    ON core_recipie
+    FOR EACH ROW EXECUTE FUNCTION core_recipie_search_vector_update();
+"""
+
+DROP_SEARCH_VECTOR_TRIGGER = """
+DROP TRIGGER core_recipie_search_vector_trigger ON core_recipie;
+DROP FUNCTION core_recipie_search_vector_update();
+"""
+
+BACKFILL_BATCH_SIZE = 10000
+
+
+def backfill_search_vector(apps, schema_editor):
+    """Fill search_vector of existing rows, one committed id range at a time
+
+    Rows written since the trigger was created already have theirs.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT min(id), max(id) FROM core_recipie')
+        low, high = cursor.fetchone()
+        if low is None:
+            return
+        for start in range(low, high + 1, BACKFILL_BATCH_SIZE):
+            cursor.execute(
+                f'UPDATE core_recipie SET search_vector = '
+                f'{SEARCH_VECTOR.format(row="")} '
+                f'WHERE id >= %s AND id < %s AND search_vector IS NULL',
+                [start, start + BACKFILL_BATCH_SIZE],
+            )
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('core', '0006_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipie',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(SEARCH_VECTOR_TRIGGER, DROP_SEARCH_VECTOR_TRIGGER),
+        migrations.RunPython(
+            backfill_search_vector, migrations.RunPython.noop
+        ),
+        AddIndexConcurrently(
+            model_name='recipie',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='recipie_search_gin'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Indexes for the hot list, filter and m2m reverse lookup queries.
+# Built with CREATE INDEX CONCURRENTLY so writes are not blocked.
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+def through_index(table, lead, other):
+    """Return a concurrent (lead, other) index on an m2m through table"""
+    name = f'{table}_{lead}_{other}_idx'
+    return migrations.RunSQL(
+        f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} '
+        f'ON {table} ({lead}, {other});',
+        f'DROP INDEX CONCURRENTLY IF EXISTS {name};',
+    )
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('core', '0007_recipie_search_vector'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='recipie',
+            index=models.Index(
+                fields=['user', '-id'],
+                name='recipie_user_id_idx',
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name='tag',
+            index=models.Index(
+                fields=['user', '-name', '-id'],
+                name='tag_user_name_idx',
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name='ingredient',
+            index=models.Index(
+                fields=['user', '-name', '-id'],
+                name='ingredient_user_name_idx',
+            ),
+        ),
+        through_index('core_recipie_tags', 'tag_id', 'recipie_id'),
+        through_index('core_recipie_ingredients', 'ingredient_id', 'recipie_id'),
+    ]
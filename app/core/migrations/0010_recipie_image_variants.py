@@ -0,0 +1,18 @@
+# Generated by Django 4.1.13 on 2026-10-18 03:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_importcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipie',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+    ]
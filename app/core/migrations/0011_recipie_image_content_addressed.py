@@ -0,0 +1,20 @@
+# Generated by Django 4.1.13 on 2026-10-18 03:22
+
+import core.models
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_recipie_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipie',
+            name='image',
+            field=models.ImageField(max_length=255, null=True, storage=core.storage.ContentAddressedStorage(), upload_to=core.models.recipie_image_file_path),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Index for looking up recipies by stored image name.
+# Built with CREATE INDEX CONCURRENTLY so writes are not blocked.
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('core', '0011_recipie_image_content_addressed'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='recipie',
+            index=models.Index(fields=['image'], name='recipie_image_idx'),
+        ),
+    ]
@@ -9,17 +9,26 @@ from django.contrib.auth.models import (
     PermissionsMixin
 )
 from django.conf import settings
-import uuid
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 import os
 
+from core.storage import (
+    ContentAddressedStorage,
+    content_addressed_path,
+    file_digest,
+)
+
 # Create your models here.
 
 
-def recipie_image_file_path(instamce, filename):
-    """generate file path for image file"""
+def recipie_image_file_path(instance, filename):
+    """generate content addressed path for image file"""
     ext = os.path.splitext(filename)[1]
-    filename = f'{uuid.uuid4()}{ext}'
-    return os.path.join('upload', 'recipie', filename)
+    digest = file_digest(instance.image)
+    return content_addressed_path(
+        os.path.join('upload', 'recipie'), digest, ext
+    )
 
 
 class UserManager(BaseUserManager):
@@ -73,7 +82,24 @@ class Recipie(models.Model):
     link = models.CharField(max_length=255, blank=True)
     tags = models.ManyToManyField('Tag')
     ingredients = models.ManyToManyField('Ingredient')
-    image = models.ImageField(null=True, upload_to=recipie_image_file_path)
+    image = models.ImageField(
+        null=True,
+        upload_to=recipie_image_file_path,
+        storage=ContentAddressedStorage(),
+        max_length=255,
+    )
+    # Names of the generated image variants, filled in by a background job
+    image_variants = models.JSONField(default=list, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Maintained by a database trigger from title and description
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='recipie_search_gin'),
+            models.Index(fields=['user', '-id'], name='recipie_user_id_idx'),
+            models.Index(fields=['image'], name='recipie_image_idx'),
+        ]
 
     def __str__(self) -> str:
         return self.title
@@ -86,6 +112,15 @@ class Tag(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', '-name', '-id'],
+                name='tag_user_name_idx',
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.name
@@ -98,6 +133,26 @@ class Ingredient(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', '-name', '-id'],
+                name='ingredient_user_name_idx',
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.name
+
+
+class ImportCheckpoint(models.Model):
+    """Progress of a bulk import, committed with each imported batch"""
+    source = models.CharField(max_length=1024, unique=True)
+    position = models.BigIntegerField(default=0)
+    completed = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return self.source
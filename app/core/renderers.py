@@ -0,0 +1,73 @@
+"""
+Fast renderers used for every API response
+
+orjson and msgpack are optional. Without orjson the JSON renderer falls
+back to DRF's encoder, and MessagePack is only offered when msgpack is
+installed.
+"""
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Anything orjson would encode differently from DRF goes to this default
+_encoder = JSONEncoder()
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSON renderer producing the same bytes as DRF's, using orjson"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        if data is None:
+            return b''
+
+        try:
+            ret = orjson.dumps(
+                data,
+                default=_encoder.default,
+                option=(
+                    orjson.OPT_PASSTHROUGH_DATETIME
+                    | orjson.OPT_PASSTHROUGH_DATACLASS
+                    | orjson.OPT_NON_STR_KEYS
+                ),
+            )
+        except orjson.JSONEncodeError:
+            # For example integers wider than 64 bits
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        # Escaped like DRF does, so the output is a JavaScript subset
+        return ret.replace(
+            '\u2028'.encode(), b'\\u2028'
+        ).replace('\u2029'.encode(), b'\\u2029')
+
+
+class MessagePackRenderer(BaseRenderer):
+    """MessagePack with the same values as the JSON representation"""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_encoder.default)
@@ -0,0 +1,60 @@
+"""
+Signal handlers keeping Recipie.updated_at in step with its relations
+"""
+
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.models import Recipie, Tag, Ingredient
+
+
+def touch_recipies(**filters):
+    """Mark matching recipies as modified"""
+    Recipie.objects.filter(**filters).update(updated_at=timezone.now())
+
+
+@receiver(m2m_changed, sender=Recipie.tags.through)
+@receiver(m2m_changed, sender=Recipie.ingredients.through)
+def touch_on_link_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Touch recipies whose tags or ingredients were linked or unlinked"""
+    if not reverse:
+        if action.startswith('post_'):
+            touch_recipies(pk=instance.pk)
+    elif action == 'pre_clear':
+        instance._linked_recipie_ids = list(
+            instance.recipie_set.values_list('pk', flat=True)
+        )
+    elif action == 'post_clear':
+        touch_recipies(pk__in=instance._linked_recipie_ids)
+    elif action in ('post_add', 'post_remove'):
+        touch_recipies(pk__in=pk_set)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def touch_on_attr_change(sender, instance, created, **kwargs):
+    """Touch recipies showing a renamed tag or ingredient"""
+    if not created:
+        touch_recipies(pk__in=instance.recipie_set.values('pk'))
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def remember_linked_recipies(sender, instance, **kwargs):
+    """Collect recipies to touch once the links are deleted"""
+    instance._linked_recipie_ids = list(
+        instance.recipie_set.values_list('pk', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def touch_on_attr_delete(sender, instance, **kwargs):
+    """Touch recipies that showed a deleted tag or ingredient"""
+    touch_recipies(pk__in=instance._linked_recipie_ids)
@@ -0,0 +1,83 @@
+"""
+Content addressed storage for uploaded files
+"""
+
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+
+
+def file_digest(file):
+    """Return the sha256 hex digest of a file, leaving it rewound"""
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def content_addressed_path(prefix, digest, ext):
+    """Return a path for a digest, sharded over two directory levels"""
+    return os.path.join(
+        prefix, digest[:2], digest[2:4], f'{digest}{ext.lower()}'
+    )
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """File storage that never writes the same name twice
+
+    Names are derived from the file contents, so an existing file with the
+    requested name and size already holds the same bytes. It is reused
+    instead of being stored again under a new name, and touched so the
+    orphaned media collector sees it as recently written. Files are
+    written under a temporary name and renamed into place, so a name never
+    holds a partial file.
+    """
+
+    def _is_complete(self, name, content):
+        try:
+            return os.path.getsize(self.path(name)) == content.size
+        except OSError:
+            return False
+
+    def save(self, name, content, max_length=None):
+        if name is not None and self._is_complete(name, content):
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length=max_length)
+
+    def get_available_name(self, name, max_length=None):
+        """Keep the name, as _save replaces whatever is stored under it"""
+        return name
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        if self.directory_permissions_mode is not None:
+            old_umask = os.umask(0o777 & ~self.directory_permissions_mode)
+            try:
+                os.makedirs(
+                    directory, self.directory_permissions_mode, exist_ok=True
+                )
+            finally:
+                os.umask(old_umask)
+        else:
+            os.makedirs(directory, exist_ok=True)
+
+        fd, temp_path = tempfile.mkstemp(
+            dir=directory, prefix='.', suffix='.part'
+        )
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                for chunk in content.chunks():
+                    temp.write(chunk)
+            # mkstemp creates files readable by their owner only
+            os.chmod(temp_path, self.file_permissions_mode or 0o644)
+            os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return str(name).replace('\\', '/')
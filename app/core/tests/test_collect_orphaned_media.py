@@ -0,0 +1,155 @@
+"""Tests for the collect_orphaned_media management command"""
+
+import os
+import tempfile
+import time
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from core.management.commands.collect_orphaned_media import Command
+from core.models import Recipie
+from recipie.images import variant_name
+
+SHARD = 'upload/recipie/ab/cd'
+
+
+class CollectOrphanedMediaTests(TestCase):
+    """Test collecting unreferenced recipie images"""
+
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.settings = override_settings(MEDIA_ROOT=self.media.name)
+        self.settings.enable()
+        self.storage = Recipie._meta.get_field('image').storage
+        self.user = get_user_model().objects.create_user(
+            email='gc@example.com',
+            password='testpass123',
+        )
+
+    def tearDown(self):
+        self.settings.disable()
+        self.media.cleanup()
+
+    def _store(self, name, age=7200):
+        """Store a file last modified age seconds ago"""
+        self.storage.save(name, ContentFile(b'bytes'))
+        stamp = time.time() - age
+        os.utime(self.storage.path(name), (stamp, stamp))
+        return name
+
+    def _recipie(self, image):
+        return Recipie.objects.create(
+            user=self.user,
+            title='Sample',
+            time_minutes=1,
+            price=Decimal('1.00'),
+            image=image,
+        )
+
+    def _collect(self, **options):
+        out = StringIO()
+        call_command('collect_orphaned_media', rate=0, stdout=out, **options)
+        return out.getvalue()
+
+    def test_collects_orphans(self):
+        """Test unreferenced files and their variants are deleted"""
+        kept = self._store(f'{SHARD}/kept.jpg')
+        kept_variant = self._store(variant_name(kept, 'thumbnail'))
+        self._recipie(kept)
+        orphan = self._store(f'{SHARD}/orphan.jpg')
+        orphan_variant = self._store(variant_name(orphan, 'medium_webp'))
+        stray_variant = self._store(
+            variant_name(f'{SHARD}/gone.png', 'thumbnail')
+        )
+        legacy = self._store('upload/recipie/legacy.jpg')
+
+        out = self._collect()
+
+        self.assertIn('Deleted 4 orphaned files', out)
+        self.assertTrue(self.storage.exists(kept))
+        self.assertTrue(self.storage.exists(kept_variant))
+        for name in (orphan, orphan_variant, stray_variant, legacy):
+            self.assertFalse(self.storage.exists(name))
+
+    def test_recent_files_kept(self):
+        """Test files newer than the minimum age are left alone"""
+        recent = self._store(f'{SHARD}/recent.jpg', age=0)
+        variant = self._store(variant_name(recent, 'thumbnail'))
+
+        out = self._collect()
+
+        self.assertIn('Deleted 0 orphaned files', out)
+        self.assertTrue(self.storage.exists(recent))
+        self.assertTrue(self.storage.exists(variant))
+
+    def test_dry_run(self):
+        """Test a dry run reports orphans without deleting them"""
+        orphan = self._store(f'{SHARD}/orphan.jpg')
+
+        out = self._collect(dry_run=True, verbosity=2)
+
+        self.assertIn(orphan, out)
+        self.assertIn('Would delete 1 orphaned files (5 bytes)', out)
+        self.assertTrue(self.storage.exists(orphan))
+
+    def test_one_query_per_batch(self):
+        """Test references are looked up per batch, not per file"""
+        names = [self._store(f'{SHARD}/{i}.jpg') for i in range(10)]
+        self._recipie(names[0])
+
+        with self.assertNumQueries(2):
+            out = self._collect(batch_size=5, dry_run=True)
+
+        self.assertIn('Would delete 9 orphaned files', out)
+
+    def test_one_query_per_delete_batch(self):
+        """Test files are checked again per batch before deletion"""
+        names = [self._store(f'{SHARD}/{i}.jpg') for i in range(10)]
+        names += [self._store(variant_name(names[1], 'thumbnail'))]
+        self._recipie(names[0])
+
+        # Two batches scanned, then two of the ten orphans checked again
+        with self.assertNumQueries(4):
+            out = self._collect(batch_size=5)
+
+        self.assertIn('Deleted 10 orphaned files', out)
+
+    def test_checked_again_before_delete(self):
+        """Test files used or touched since the scan are kept"""
+        used = self._store(f'{SHARD}/used.jpg')
+        used_variant = self._store(variant_name(used, 'medium_webp'))
+        touched = self._store(f'{SHARD}/touched.jpg')
+        variant = self._store(variant_name(touched, 'thumbnail'))
+        orphan = self._store(f'{SHARD}/orphan.jpg')
+        orphans = Command._orphans
+
+        def scan_then_upload(command, *args):
+            found = list(orphans(command, *args))
+            # An upload commits and another reuses a blob meanwhile
+            self._recipie(used)
+            os.utime(self.storage.path(touched))
+            return found
+
+        with patch.object(Command, '_orphans', scan_then_upload):
+            out = self._collect()
+
+        self.assertIn('Deleted 1 orphaned files', out)
+        self.assertFalse(self.storage.exists(orphan))
+        for name in (used, used_variant, touched, variant):
+            self.assertTrue(self.storage.exists(name))
+
+    @patch('core.management.commands.collect_orphaned_media.time.sleep')
+    def test_rate_limited(self, patched_sleep):
+        """Test deletions are spaced out to the requested rate"""
+        for i in range(3):
+            self._store(f'{SHARD}/{i}.jpg')
+
+        call_command('collect_orphaned_media', rate=1, stdout=StringIO())
+
+        self.assertEqual(patched_sleep.call_count, 3)
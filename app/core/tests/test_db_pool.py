@@ -0,0 +1,114 @@
+"""
+Tests for the pooled database backend
+"""
+
+import threading
+
+from django.db import DEFAULT_DB_ALIAS, connection, OperationalError
+from django.test import TestCase
+
+from core.db.base import DatabaseWrapper
+from core.db.pool import close_pools, pool_stats
+
+
+def pooled_connection(**pool):
+    """Return a pooled connection to the test database"""
+    return DatabaseWrapper(
+        {
+            **connection.settings_dict,
+            'ENGINE': 'core.db',
+            'CONN_MAX_AGE': 0,
+            # Keeps these connections apart from any pool the tests use
+            'OPTIONS': {'application_name': 'pool-tests'},
+            'POOL': {'SIZE': 2, 'TIMEOUT': 1, **pool},
+        },
+        DEFAULT_DB_ALIAS,
+    )
+
+
+def backend_pid(conn):
+    with conn.cursor() as cursor:
+        cursor.execute('SELECT pg_backend_pid()')
+        return cursor.fetchone()[0]
+
+
+class ConnectionPoolTests(TestCase):
+    """Test connections are shared through the pool"""
+
+    def tearDown(self):
+        close_pools(connection.settings_dict['NAME'])
+
+    def stats(self, conn):
+        return pool_stats()[conn.pool.label]
+
+    def test_connection_reused(self):
+        """Test closing returns the connection for the next checkout"""
+        first = pooled_connection()
+        pid = backend_pid(first)
+        first.close()
+        second = pooled_connection()
+
+        self.assertEqual(backend_pid(second), pid)
+        stats = self.stats(second)
+        self.assertEqual(stats['opened'], 1)
+        self.assertEqual(stats['checkouts'], 2)
+        self.assertEqual(stats['in_use'], 1)
+        second.close()
+        self.assertEqual(self.stats(second)['idle'], 1)
+
+    def test_wait_for_free_connection(self):
+        """Test checkouts wait for a connection when the pool is full"""
+        first = pooled_connection(SIZE=1)
+        pid = backend_pid(first)
+        first.inc_thread_sharing()
+        threading.Timer(0.1, first.close).start()
+
+        second = pooled_connection(SIZE=1)
+
+        self.assertEqual(backend_pid(second), pid)
+        stats = self.stats(second)
+        self.assertEqual(stats['waits'], 1)
+        self.assertGreater(stats['wait_time'], 0.05)
+        second.close()
+
+    def test_wait_times_out(self):
+        """Test checkouts fail once the pool timeout passes"""
+        first = pooled_connection(SIZE=1, TIMEOUT=0.1)
+        first.ensure_connection()
+        second = pooled_connection(SIZE=1, TIMEOUT=0.1)
+
+        with self.assertRaises(OperationalError):
+            second.ensure_connection()
+
+        self.assertEqual(self.stats(first)['timeouts'], 1)
+        first.close()
+
+    def test_open_transaction_rolled_back(self):
+        """Test connections come back from the pool outside a transaction"""
+        first = pooled_connection()
+        with first.cursor() as cursor:
+            cursor.execute('BEGIN')
+            cursor.execute('CREATE TEMPORARY TABLE pooled (id int)')
+        first.close()
+        second = pooled_connection()
+
+        with second.cursor() as cursor:
+            cursor.execute("SELECT to_regclass('pooled')")
+            self.assertIsNone(cursor.fetchone()[0])
+        second.close()
+
+    def test_broken_connection_replaced(self):
+        """Test health checks replace connections the server dropped"""
+        first = pooled_connection()
+        pid = backend_pid(first)
+        first.pool.check_after = 0
+        first.close()
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_terminate_backend(%s)', [pid])
+
+        second = pooled_connection()
+
+        self.assertNotEqual(backend_pid(second), pid)
+        self.assertEqual(self.stats(second)['opened'], 2)
+        self.assertEqual(self.stats(second)['open'], 1)
+        second.close()
@@ -0,0 +1,228 @@
+"""Tests for the import_recipes management command"""
+
+import json
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from core.management.commands.import_recipes import Command
+from core.models import ImportCheckpoint, Recipie, Tag, Ingredient
+
+
+class ImportRecipesTests(TestCase):
+    """Test bulk importing recipies"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='import@example.com',
+            password='testpass123',
+        )
+        self.other = get_user_model().objects.create_user(
+            email='other@example.com',
+            password='testpass123',
+        )
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _write(self, name, content):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w', encoding='utf-8') as handle:
+            handle.write(content)
+        return path
+
+    def _jsonl(self, records):
+        return self._write(
+            'recipies.jsonl',
+            ''.join(json.dumps(record) + '\n' for record in records),
+        )
+
+    def _import(self, path, **options):
+        options.setdefault('user', self.user.email)
+        call_command(
+            'import_recipes', path, stdout=StringIO(), stderr=StringIO(),
+            **options
+        )
+
+    def test_import_jsonl(self):
+        """Test records are imported with deduplicated tags"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        path = self._jsonl([
+            {
+                'title': 'Curry',
+                'time_minutes': 30,
+                'price': '5.50',
+                'tags': ['Vegan', 'Dinner'],
+                'ingredients': [{'name': 'Rice'}],
+            },
+            {
+                'title': 'Salad',
+                'time_minutes': 5,
+                'price': 2,
+                'tags': ['Vegan', 'Vegan'],
+                'ingredients': ['Rice', 'Lettuce'],
+            },
+            {
+                'user': self.other.email,
+                'title': 'Soup',
+                'time_minutes': 20,
+                'price': '3.00',
+                'tags': ['Vegan'],
+            },
+        ])
+
+        self._import(path, batch_size=2)
+
+        recipies = Recipie.objects.filter(user=self.user).order_by('id')
+        self.assertEqual([r.title for r in recipies], ['Curry', 'Salad'])
+        self.assertEqual(recipies[1].price, Decimal('2.00'))
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(
+            Ingredient.objects.filter(user=self.user).count(), 2
+        )
+        self.assertEqual(
+            sorted(recipies[0].tags.values_list('name', flat=True)),
+            ['Dinner', 'Vegan'],
+        )
+        self.assertEqual(recipies[1].tags.count(), 1)
+        soup = Recipie.objects.get(user=self.other)
+        self.assertEqual(soup.tags.get().user, self.other)
+        self.assertTrue(
+            Recipie.objects.filter(
+                pk=soup.pk, search_vector__isnull=False
+            ).exists()
+        )
+        self.assertTrue(ImportCheckpoint.objects.get(source=path).completed)
+
+    def test_import_csv(self):
+        """Test records are imported from the export CSV layout"""
+        path = self._write(
+            'recipies.csv',
+            'title,time_minutes,price,link,description,tags,ingredients\n'
+            'Pie,45,4.25,,Apple pie,"Dessert, Baking",Apples\n',
+        )
+
+        self._import(path)
+
+        recipie = Recipie.objects.get(user=self.user)
+        self.assertEqual(recipie.description, 'Apple pie')
+        self.assertEqual(
+            sorted(recipie.tags.values_list('name', flat=True)),
+            ['Baking', 'Dessert'],
+        )
+        self.assertEqual(recipie.ingredients.get().name, 'Apples')
+
+    def test_invalid_records_skipped(self):
+        """Test invalid records and unknown owners are skipped"""
+        path = self._jsonl([
+            {'title': 'Ok', 'time_minutes': 1, 'price': '1.00'},
+            {'title': '', 'time_minutes': 1, 'price': '1.00'},
+            {'title': 'Bad time', 'time_minutes': 'x', 'price': '1.00'},
+            {'title': 'Too dear', 'time_minutes': 1, 'price': '1000'},
+            {
+                'user': 'nobody@example.com',
+                'title': 'Orphan',
+                'time_minutes': 1,
+                'price': '1.00',
+            },
+        ])
+        out = StringIO()
+
+        call_command(
+            'import_recipes', path, user=self.user.email, stdout=out,
+            stderr=StringIO(),
+        )
+
+        self.assertEqual(
+            list(Recipie.objects.values_list('title', flat=True)), ['Ok']
+        )
+        self.assertIn('Imported 1 recipies, skipped 4 records', out.getvalue())
+
+    def test_malformed_lines_skipped(self):
+        """Test unparsable lines and non-finite prices are skipped"""
+        path = self._write('recipies.jsonl', '\n'.join([
+            '{"title": "First", "time_minutes": 1, "price": "1.00"}',
+            '{"title": "Cut off", ',
+            '',
+            '{"title": "Nan", "time_minutes": 1, "price": NaN}',
+            '{"title": "Inf", "time_minutes": 1, "price": "Infinity"}',
+            '{"title": "Long", "time_minutes": Infinity, "price": "1"}',
+            '{"title": "Last", "time_minutes": 2, "price": "2.00"}',
+        ]))
+        out, err = StringIO(), StringIO()
+
+        call_command(
+            'import_recipes', path, user=self.user.email, stdout=out,
+            stderr=err,
+        )
+
+        self.assertEqual(
+            sorted(Recipie.objects.values_list('title', flat=True)),
+            ['First', 'Last'],
+        )
+        self.assertIn('Imported 2 recipies, skipped 4 records', out.getvalue())
+        for line in (2, 4, 5, 6):
+            self.assertIn(f'Skipped line {line}:', err.getvalue())
+
+    def test_resume_skips_lines_unparsed(self):
+        """Test lines before the checkpoint are not parsed again"""
+        path = self._write('recipies.jsonl', '\n'.join([
+            'not json',
+            'not json either',
+            '{"title": "Rest", "time_minutes": 1, "price": "1.00"}',
+        ]))
+        ImportCheckpoint.objects.create(source=path, position=2)
+        err = StringIO()
+
+        with patch.object(
+            Command, '_parse_jsonl', autospec=True,
+            side_effect=Command._parse_jsonl,
+        ) as parse:
+            call_command(
+                'import_recipes', path, user=self.user.email,
+                stdout=StringIO(), stderr=err,
+            )
+
+        self.assertEqual(parse.call_count, 1)
+        self.assertEqual(err.getvalue(), '')
+        self.assertEqual(Recipie.objects.get().title, 'Rest')
+
+    def test_resume_after_failure(self):
+        """Test an interrupted import resumes without duplicates"""
+        path = self._jsonl([
+            {'title': f'Recipie {i}', 'time_minutes': i, 'price': '1.00'}
+            for i in range(5)
+        ])
+        merge = Command._merge_batch
+        calls = []
+
+        def failing_merge(command, rows):
+            calls.append(rows)
+            if len(calls) == 2:
+                raise RuntimeError('connection lost')
+            return merge(command, rows)
+
+        with patch.object(Command, '_merge_batch', failing_merge):
+            with self.assertRaises(RuntimeError):
+                self._import(path, batch_size=2)
+
+        self.assertEqual(Recipie.objects.count(), 2)
+        self.assertEqual(ImportCheckpoint.objects.get().position, 2)
+
+        self._import(path, batch_size=2)
+
+        self.assertEqual(
+            sorted(Recipie.objects.values_list('time_minutes', flat=True)),
+            [0, 1, 2, 3, 4],
+        )
+        out = StringIO()
+        call_command('import_recipes', path, stdout=out)
+        self.assertIn('already imported', out.getvalue())
+        self.assertEqual(Recipie.objects.count(), 5)
@@ -0,0 +1,94 @@
+"""
+Tests the planner uses the indexes for the hot query shapes
+"""
+
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Exists, OuterRef
+from django.test import TestCase
+
+from core import models
+
+
+class IndexUsageTests(TestCase):
+    """EXPLAIN the queries the API runs and check the index chosen"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@example.com',
+            'testpass123',
+        )
+        for i in range(3):
+            recipie = models.Recipie.objects.create(
+                user=self.user,
+                title=f'title{i}',
+                time_minutes=5,
+                price=Decimal('5.00'),
+            )
+            recipie.tags.add(
+                models.Tag.objects.create(user=self.user, name=f'tag{i}')
+            )
+            recipie.ingredients.add(
+                models.Ingredient.objects.create(user=self.user, name=f'i{i}')
+            )
+        # Tiny test tables are cheapest to scan, so rule seq scans out
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_bitmapscan = off')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+        self.assertNotIn('Sort', plan)
+
+    def test_recipie_list_uses_user_id_index(self):
+        """Test listing a user's recipies newest first uses the index"""
+        queryset = models.Recipie.objects.filter(
+            user=self.user
+        ).order_by('-id')[:100]
+
+        self.assertUsesIndex(queryset, 'recipie_user_id_idx')
+
+    def test_tag_list_uses_user_name_index(self):
+        """Test listing a user's tags by name uses the index"""
+        queryset = models.Tag.objects.filter(
+            user=self.user
+        ).order_by('-name', '-id')[:100]
+
+        self.assertUsesIndex(queryset, 'tag_user_name_idx')
+
+    def test_ingredient_list_uses_user_name_index(self):
+        """Test listing a user's ingredients by name uses the index"""
+        queryset = models.Ingredient.objects.filter(
+            user=self.user
+        ).order_by('-name', '-id')[:100]
+
+        self.assertUsesIndex(queryset, 'ingredient_user_name_idx')
+
+    def test_tag_reverse_lookup_uses_covering_index(self):
+        """Test finding recipies of a tag is an index only scan"""
+        tag = models.Tag.objects.first()
+        queryset = models.Recipie.tags.through.objects.filter(
+            tag=tag
+        ).values('recipie_id')
+
+        self.assertIn(
+            'Index Only Scan using core_recipie_tags_tag_id_recipie_id_idx',
+            queryset.explain(),
+        )
+
+    def test_ingredient_reverse_lookup_uses_covering_index(self):
+        """Test the assigned_only EXISTS probe uses the covering index"""
+        through = models.Recipie.ingredients.through
+        queryset = models.Ingredient.objects.filter(
+            Exists(through.objects.filter(ingredient_id=OuterRef('pk'))),
+            user=self.user,
+        )
+
+        self.assertIn(
+            'core_recipie_ingredients_ingredient_id_recipie_id_idx',
+            queryset.explain(),
+        )
@@ -0,0 +1,102 @@
+"""Tests for the load_test management command"""
+
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import LiveServerTestCase, SimpleTestCase, override_settings
+
+from core.management.commands.load_test import (
+    BUCKETS,
+    histogram,
+    parse_mix,
+)
+from core.models import Recipie
+
+
+class LoadTestHelperTests(SimpleTestCase):
+    """Test parsing the mix and bucketing latencies"""
+
+    def test_parse_mix(self):
+        """Test weights are read per endpoint"""
+        self.assertEqual(
+            parse_mix('list=3, create=1'), {'list': 3, 'create': 1}
+        )
+
+    def test_parse_mix_rejects_unknown(self):
+        """Test unknown endpoints and bad weights are refused"""
+        for value in ('delete=1', 'list=x', 'list=0'):
+            with self.assertRaises(CommandError):
+                parse_mix(value)
+
+    @override_settings(CACHE_BACKEND='locmem')
+    def test_refuses_locmem_with_workers(self):
+        """Test several workers are refused caches of their own"""
+        with self.assertRaisesMessage(CommandError, 'CACHE_BACKEND'):
+            call_command('load_test', '--workers', '2', stdout=StringIO())
+
+    def test_histogram(self):
+        """Test latencies land in the first bucket they are below"""
+        counts = histogram([1, 5, 9.9, 60, 3000])
+
+        self.assertEqual(len(counts), len(BUCKETS) + 1)
+        self.assertEqual(counts[:3], [1, 2, 0])
+        self.assertEqual(counts[4], 1)
+        self.assertEqual(counts[-1], 1)
+
+
+class LoadTestTests(LiveServerTestCase):
+    """Test load testing a live server"""
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.settings = override_settings(
+            MEDIA_ROOT=self.dir.name,
+            PASSWORD_HASHERS=[
+                'django.contrib.auth.hashers.MD5PasswordHasher',
+            ],
+        )
+        self.settings.enable()
+        call_command(
+            'seed_perf_data',
+            users=2,
+            recipes=20,
+            tags=4,
+            ingredients=4,
+            stdout=StringIO(),
+        )
+
+    def tearDown(self):
+        self.settings.disable()
+        self.dir.cleanup()
+
+    def test_sweep(self):
+        """Test each level and endpoint is reported and data cleaned up"""
+        output = os.path.join(self.dir.name, 'load.json')
+        with patch('recipie.images.get_executor'):
+            call_command(
+                'load_test',
+                url=self.live_server_url,
+                concurrency='1,2',
+                duration=0.5,
+                mix='list=2,filter=1,search=1,create=2,upload=2',
+                output=output,
+                stdout=StringIO(),
+            )
+
+        with open(output) as handle:
+            results = json.load(handle)
+        self.assertEqual(list(results['levels']), ['1', '2'])
+        endpoints = results['levels']['2']['endpoints']
+        self.assertEqual(endpoints['login']['requests'], 2)
+        for summary in endpoints.values():
+            self.assertEqual(summary['error_rate'], 0)
+            self.assertEqual(sum(summary['histogram']), summary['requests'])
+        self.assertFalse(
+            Recipie.objects.filter(title__startswith='Load test').exists()
+        )
+        self.assertEqual(Recipie.objects.count(), 20)
@@ -0,0 +1,222 @@
+"""
+Tests for request metrics and the /metrics endpoint
+"""
+
+import re
+import threading
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import metrics
+from core.models import Recipie
+
+METRICS_URL = reverse('metrics')
+METRICS_TOKEN = 's3cret'
+
+
+def scrape(client):
+    """Return samples of /metrics as a dict of name and labels to value"""
+    res = client.get(
+        METRICS_URL, HTTP_AUTHORIZATION=f'Bearer {METRICS_TOKEN}'
+    )
+    samples = {}
+    for line in res.content.decode().splitlines():
+        if line.startswith('#'):
+            continue
+        name, value = line.rsplit(' ', 1)
+        samples[name] = float(value)
+    return samples
+
+
+def labels(route, action, method='GET', code=200):
+    return (
+        f'{{route="{route}",action="{action}",method="{method}",'
+        f'status="{code}"}}'
+    )
+
+
+@override_settings(METRICS_TOKEN=METRICS_TOKEN)
+class MetricsTests(TestCase):
+    """Test requests are recorded with bounded labels"""
+
+    def setUp(self):
+        metrics.reset()
+        self.user = get_user_model().objects.create_user(
+            email='metrics@example.com',
+            password='testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipies = [
+            Recipie.objects.create(
+                user=self.user,
+                title=f'Recipie {i}',
+                time_minutes=5,
+                price=Decimal('2.00'),
+            )
+            for i in range(3)
+        ]
+
+    def test_routes_not_paths(self):
+        """Test requests for different ids share the detail series"""
+        for recipie in self.recipies:
+            self.client.get(
+                reverse('recipie:recipie-detail', args=[recipie.id])
+            )
+        self.client.get(reverse('recipie:recipie-list'))
+
+        samples = scrape(self.client)
+        detail = labels('recipie:recipie-detail', 'retrieve')
+        self.assertEqual(samples[f'http_requests_total{detail}'], 3)
+        self.assertEqual(
+            samples[
+                'http_requests_total'
+                + labels('recipie:recipie-list', 'list')
+            ],
+            1,
+        )
+        self.assertGreater(
+            samples[f'http_request_db_queries_total{detail}'], 0
+        )
+        self.assertGreater(
+            samples[f'http_request_db_duration_seconds_total{detail}'], 0
+        )
+        self.assertEqual(
+            samples[
+                'http_request_duration_seconds_bucket'
+                + detail[:-1] + ',le="+Inf"}'
+            ],
+            3,
+        )
+        self.assertEqual(
+            len([name for name in samples
+                 if name.startswith('http_requests_total')]),
+            2,
+        )
+
+    def test_unknown_routes(self):
+        """Test unmatched and undiscovered URLs are pooled together"""
+        self.client.get('/api/recipie/nothing-here/')
+        self.client.get('/api/nothing/1/')
+        self.client.get('/admin/login/')
+
+        samples = scrape(self.client)
+        self.assertEqual(
+            samples['http_requests_total' + labels('unmatched', '', code=404)],
+            2,
+        )
+        self.assertEqual(
+            samples['http_requests_total' + labels('other', '')], 1
+        )
+
+    def test_response_sizes(self):
+        """Test response sizes are observed"""
+        res = self.client.get(reverse('recipie:tag-list'))
+
+        samples = scrape(self.client)
+        series = labels('recipie:tag-list', 'list')
+        self.assertEqual(
+            samples[f'http_response_size_bytes_sum{series}'],
+            len(res.content),
+        )
+
+    def test_pool_and_cache_stats(self):
+        """Test response cache counters are exported"""
+        self.client.get(reverse('recipie:recipie-list'))
+        self.client.get(reverse('recipie:recipie-list'))
+
+        samples = scrape(self.client)
+        self.assertGreaterEqual(samples['response_cache_hits_total'], 1)
+        self.assertIn('response_cache_misses_total', samples)
+
+    def test_threads_are_merged(self):
+        """Test requests recorded on other threads are collected"""
+        request = self.client.get(reverse('recipie:tag-list')).wsgi_request
+        response = self.client.get(reverse('recipie:tag-list'))
+        timer = metrics.QueryTimer()
+
+        threads = [
+            threading.Thread(
+                target=metrics.record, args=(request, response, 0.01, timer)
+            )
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        samples = scrape(self.client)
+        series = labels('recipie:tag-list', 'list')
+        self.assertEqual(samples[f'http_requests_total{series}'], 6)
+
+    def test_ended_threads_retired(self):
+        """Test shards of ended threads are folded in, not kept"""
+        request = self.client.get(reverse('recipie:tag-list')).wsgi_request
+        response = self.client.get(reverse('recipie:tag-list'))
+        timer = metrics.QueryTimer()
+
+        for _ in range(50):
+            thread = threading.Thread(
+                target=metrics.record, args=(request, response, 0.01, timer)
+            )
+            thread.start()
+            thread.join()
+
+        self.assertLessEqual(len(metrics._shards), threading.active_count())
+        series = labels('recipie:tag-list', 'list')
+        self.assertEqual(
+            scrape(self.client)[f'http_requests_total{series}'], 52
+        )
+
+    def test_token_required(self):
+        """Test the endpoint wants the bearer token"""
+        res = self.client.get(METRICS_URL)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        res = self.client.get(
+            METRICS_URL, HTTP_AUTHORIZATION=f'Bearer {METRICS_TOKEN}'
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res['Content-Type'].startswith('text/plain'))
+        self.assertTrue(
+            re.search(rb'^# TYPE http_requests_total counter$',
+                      res.content, re.M)
+        )
+
+    @override_settings(METRICS_TOKEN=None, DEBUG=False)
+    def test_hidden_without_token(self):
+        """Test the endpoint is not served without a token outside DEBUG"""
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(METRICS_TOKEN=None, DEBUG=True)
+    def test_open_in_debug_without_token(self):
+        """Test the endpoint is open in DEBUG when no token is set"""
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    async def test_async_requests(self):
+        """Test requests through the ASGI handler are recorded"""
+        token = await Token.objects.acreate(user=self.user)
+
+        res = await AsyncClient().get(
+            reverse('recipie-async:recipie-list'),
+            AUTHORIZATION=f'Token {token.key}',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        series = metrics.collect()[
+            ('recipie-async:recipie-list', 'list', 'GET', '200')
+        ]
+        self.assertEqual(series.count, 1)
+        # Counted although the ORM ran on another thread
+        self.assertGreater(series.queries, 0)
@@ -0,0 +1,135 @@
+"""Tests for the migrate_image_paths management command"""
+
+import hashlib
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase
+
+from core.management.commands.migrate_image_paths import Command
+from core.models import Recipie
+from recipie.images import variant_name
+
+
+class MigrateImagePathsTests(TestCase):
+    """Test moving legacy images to content addressed paths"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='images@example.com',
+            password='testpass123',
+        )
+        self.storage = Recipie._meta.get_field('image').storage
+        self.names = []
+
+    def tearDown(self):
+        for name in self.names:
+            self.storage.delete(name)
+
+    def _legacy(self, name, content, variants=()):
+        """Create a recipie whose image is stored under a legacy name"""
+        name = f'upload/recipie/{name}.jpg'
+        self.storage.save(name, ContentFile(content))
+        self.names.append(name)
+        for variant in variants:
+            path = variant_name(name, variant)
+            self.storage.save(path, ContentFile(b'variant'))
+            self.names.append(path)
+        recipie = Recipie.objects.create(
+            user=self.user,
+            title=name,
+            time_minutes=1,
+            price=Decimal('1.00'),
+            image=name,
+            image_variants=list(variants),
+        )
+        return recipie
+
+    def _expected(self, content):
+        digest = hashlib.sha256(content).hexdigest()
+        name = f'upload/recipie/{digest[:2]}/{digest[2:4]}/{digest}.jpg'
+        self.names.append(name)
+        return name
+
+    def test_moves_and_deduplicates(self):
+        """Test identical legacy files end up as one sharded blob"""
+        first = self._legacy('a', b'same', variants=['thumbnail'])
+        second = self._legacy('b', b'same')
+        other = self._legacy('c', b'other')
+        expected = self._expected(b'same')
+        self.names.append(variant_name(expected, 'thumbnail'))
+
+        call_command('migrate_image_paths', batch_size=2, stdout=StringIO())
+
+        for recipie in (first, second, other):
+            recipie.refresh_from_db()
+        self.assertEqual(first.image.name, expected)
+        self.assertEqual(second.image.name, expected)
+        self.assertEqual(other.image.name, self._expected(b'other'))
+        self.assertTrue(self.storage.exists(expected))
+        self.assertTrue(
+            self.storage.exists(variant_name(expected, 'thumbnail'))
+        )
+        self.assertTrue(self.storage.exists('upload/recipie/a.jpg'))
+
+    def test_delete_old(self):
+        """Test old files are removed with --delete-old"""
+        recipie = self._legacy('d', b'delete me', variants=['medium'])
+        expected = self._expected(b'delete me')
+        self.names.append(variant_name(expected, 'medium'))
+
+        call_command('migrate_image_paths', delete_old=True, stdout=StringIO())
+
+        recipie.refresh_from_db()
+        self.assertEqual(recipie.image.name, expected)
+        self.assertFalse(self.storage.exists('upload/recipie/d.jpg'))
+        self.assertFalse(
+            self.storage.exists('upload/recipie/d__medium.jpg')
+        )
+
+    def test_dry_run_and_missing(self):
+        """Test a dry run changes nothing and missing files are reported"""
+        recipie = self._legacy('e', b'keep')
+        Recipie.objects.create(
+            user=self.user,
+            title='missing',
+            time_minutes=1,
+            price=Decimal('1.00'),
+            image='upload/recipie/missing.jpg',
+        )
+        out = StringIO()
+
+        call_command(
+            'migrate_image_paths', dry_run=True, stdout=out, stderr=StringIO()
+        )
+
+        recipie.refresh_from_db()
+        self.assertEqual(recipie.image.name, 'upload/recipie/e.jpg')
+        self.assertFalse(self.storage.exists(self._expected(b'keep')))
+        self.assertIn('Would move 1 images, 1 files missing', out.getvalue())
+
+    def test_keeps_concurrent_upload(self):
+        """Test a row given a new image during the copy is left alone"""
+        recipie = self._legacy('f', b'replaced')
+        self._expected(b'replaced')
+        move = Command._move
+
+        def move_then_upload(command, storage, row, dry_run):
+            new = move(command, storage, row, dry_run)
+            Recipie.objects.filter(pk=row.pk).update(
+                image='upload/recipie/uploaded.jpg'
+            )
+            return new
+
+        out = StringIO()
+        with patch.object(Command, '_move', move_then_upload):
+            call_command('migrate_image_paths', delete_old=True, stdout=out)
+
+        recipie.refresh_from_db()
+        self.assertEqual(recipie.image.name, 'upload/recipie/uploaded.jpg')
+        self.assertTrue(self.storage.exists('upload/recipie/f.jpg'))
+        self.assertIn('Moved 0 images', out.getvalue())
@@ -1,8 +1,10 @@
 """
 Tests for models.py
 """
+import hashlib
+import os
+from django.core.files.base import ContentFile
 from django.test import TestCase
-from unittest.mock import patch
 from django.contrib.auth import get_user_model
 from decimal import Decimal
 from core import models
@@ -94,11 +96,63 @@ class ModelTest(TestCase):
 
         self.assertEqual(ingredient.name, str(ingredient))
 
-    @patch('core.models.uuid.uuid4')
-    def test_recipie_file_name_uuid(self, mock_uuid):
-        """Test generating image path"""
-        uuid = 'test-uuid'
-        mock_uuid.return_value = uuid
-        file_path = models.recipie_image_file_path(None, 'example.jpg')
+    def test_recipie_file_name_content_addressed(self):
+        """Test generating a sharded image path from the file contents"""
+        recipie = models.Recipie(image=ContentFile(b'image', 'example.JPG'))
+        digest = hashlib.sha256(b'image').hexdigest()
 
-        self.assertEqual(file_path, f'upload/recipie/{uuid}.jpg')
+        file_path = models.recipie_image_file_path(recipie, 'example.JPG')
+
+        self.assertEqual(
+            file_path,
+            f'upload/recipie/{digest[:2]}/{digest[2:4]}/{digest}.jpg',
+        )
+
+    def test_identical_images_stored_once(self):
+        """Test identical uploads share one stored file"""
+        user = create_user()
+        recipies = [
+            models.Recipie.objects.create(
+                user=user,
+                title=f'sample {i}',
+                time_minutes=5,
+                price=Decimal('5.0'),
+                image=ContentFile(b'same bytes', f'upload{i}.jpg'),
+            )
+            for i in range(2)
+        ]
+        name = recipies[0].image.name
+
+        self.assertEqual(recipies[1].image.name, name)
+        storage = recipies[0].image.storage
+        self.assertEqual(
+            os.listdir(os.path.dirname(storage.path(name))),
+            [os.path.basename(name)],
+        )
+        storage.delete(name)
+
+    def test_recipie_touched_on_relation_changes(self):
+        """Test recipie updated_at follows its tags and ingredients"""
+        user = create_user()
+        recipie = models.Recipie.objects.create(
+            user=user,
+            title='sample title',
+            time_minutes=5,
+            price=Decimal('50.0'),
+        )
+        tag = models.Tag.objects.create(user=user, name='tag')
+        ingredient = models.Ingredient.objects.create(user=user, name='ing')
+
+        def touched(action):
+            before = models.Recipie.objects.get(id=recipie.id).updated_at
+            action()
+            after = models.Recipie.objects.get(id=recipie.id).updated_at
+            return after > before
+
+        self.assertTrue(touched(lambda: recipie.tags.add(tag)))
+        self.assertTrue(touched(lambda: tag.recipie_set.clear()))
+        self.assertTrue(touched(lambda: ingredient.recipie_set.add(recipie)))
+
+        ingredient.name = 'renamed'
+        self.assertTrue(touched(ingredient.save))
+        self.assertTrue(touched(ingredient.delete))
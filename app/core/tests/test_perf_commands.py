@@ -0,0 +1,147 @@
+"""Tests for the seed_perf_data and benchmark_api management commands"""
+
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Count
+from django.test import TestCase
+
+from core.models import Recipie, Tag, Ingredient
+from user.authentication import TOKEN_CACHE_ALIAS
+
+SEED = {
+    'users': 4,
+    'recipes': 120,
+    'tags': 6,
+    'ingredients': 10,
+    'stdout': StringIO(),
+}
+
+
+def seeded_recipies():
+    return list(
+        Recipie.objects.order_by('id').values_list(
+            'user__email', 'title', 'price'
+        )
+    )
+
+
+class SeedPerfDataTests(TestCase):
+    """Test generating synthetic data"""
+
+    def test_seeds_counts(self):
+        """Test users, attributes and recipies are created as asked"""
+        call_command('seed_perf_data', **SEED)
+
+        self.assertEqual(get_user_model().objects.count(), 4)
+        self.assertEqual(Recipie.objects.count(), 120)
+        self.assertEqual(Tag.objects.count(), 24)
+        self.assertEqual(Ingredient.objects.count(), 40)
+        for recipie in Recipie.objects.prefetch_related('tags'):
+            for tag in recipie.tags.all():
+                self.assertEqual(tag.user_id, recipie.user_id)
+
+    def test_skewed_owners(self):
+        """Test the first seeded user owns the most recipies"""
+        call_command('seed_perf_data', **SEED)
+
+        counts = get_user_model().objects.annotate(
+            recipies=Count('recipie')
+        ).order_by('-recipies').values_list('email', flat=True)
+        self.assertEqual(counts[0], 'user0@perf.example.com')
+
+    def test_same_seed_same_data(self):
+        """Test a seed always generates the same recipies"""
+        call_command('seed_perf_data', **SEED)
+        first = seeded_recipies()
+        call_command('seed_perf_data', clear=True, **SEED)
+
+        self.assertEqual(seeded_recipies(), first)
+        self.assertEqual(get_user_model().objects.count(), 4)
+
+    def test_existing_data_requires_clear(self):
+        """Test seeding twice without --clear is refused"""
+        call_command('seed_perf_data', **SEED)
+
+        with self.assertRaises(CommandError):
+            call_command('seed_perf_data', **SEED)
+
+
+class BenchmarkApiTests(TestCase):
+    """Test benchmarking the APIs against seeded data"""
+
+    def setUp(self):
+        call_command('seed_perf_data', **SEED)
+        self.dir = tempfile.TemporaryDirectory()
+        self.output = os.path.join(self.dir.name, 'baseline.json')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def _benchmark(self, **options):
+        call_command(
+            'benchmark_api',
+            iterations=2,
+            warmup=1,
+            stdout=StringIO(),
+            **options,
+        )
+
+    def test_writes_baseline(self):
+        """Test every case is recorded and writes are rolled back"""
+        self._benchmark(output=self.output)
+
+        with open(self.output) as handle:
+            results = json.load(handle)
+        self.assertEqual(results['user'], 'user0@perf.example.com')
+        self.assertIn('recipie_create', results['cases'])
+        self.assertIn('recipie_filter_tags', results['cases'])
+        for result in results['cases'].values():
+            self.assertLessEqual(result['p50_ms'], result['max_ms'])
+            self.assertGreater(result['queries'], 0)
+        self.assertEqual(Recipie.objects.count(), 120)
+        self.assertFalse(
+            Recipie.objects.filter(title__startswith='Benchmark').exists()
+        )
+
+    def test_keeps_other_cache_entries(self):
+        """Test cold reads bypass cached lists without clearing caches"""
+        tokens = caches[TOKEN_CACHE_ALIAS]
+        tokens.set('sentinel', 1)
+
+        self._benchmark(output=self.output, cases='recipie_list')
+
+        self.assertEqual(tokens.get('sentinel'), 1)
+        with open(self.output) as handle:
+            result = json.load(handle)['cases']['recipie_list']
+        self.assertGreater(result['queries'], 0)
+        self.assertGreater(result['cache_calls'], 0)
+
+    def test_compare_detects_regressions(self):
+        """Test running more queries than the baseline fails"""
+        self._benchmark(output=self.output, cases='recipie_detail')
+        with open(self.output) as handle:
+            results = json.load(handle)
+        # Timings in tests are too noisy to compare; queries are exact
+        self._benchmark(
+            compare=self.output, cases='recipie_detail', threshold=100
+        )
+
+        results['cases']['recipie_detail']['queries'] -= 1
+        with open(self.output, 'w') as handle:
+            json.dump(results, handle)
+        with self.assertRaises(CommandError):
+            self._benchmark(
+                compare=self.output, cases='recipie_detail', threshold=100
+            )
+
+    def test_unknown_case(self):
+        """Test asking for a case that does not exist fails"""
+        with self.assertRaises(CommandError):
+            self._benchmark(cases='recipie_delete')
@@ -0,0 +1,154 @@
+"""
+Tests for the orjson and MessagePack renderers and parser
+"""
+
+import datetime
+import io
+import json
+import uuid
+from decimal import Decimal
+
+import msgpack
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.models import Recipie, Tag
+from core.parsers import ORJSONParser
+from core.renderers import MessagePackRenderer, ORJSONRenderer
+
+RECIPIES_URL = reverse('recipie:recipie-list')
+
+
+class ORJSONRendererTests(SimpleTestCase):
+    """Test orjson output matches DRF's JSON renderer byte for byte"""
+
+    def assertSameJSON(self, data, accepted_media_type=None, context=None):
+        expected = JSONRenderer().render(data, accepted_media_type, context)
+        self.assertEqual(
+            ORJSONRenderer().render(data, accepted_media_type, context),
+            expected,
+        )
+
+    def test_matches_drf(self):
+        """Test values DRF's encoder handles specially render the same"""
+        self.assertSameJSON({
+            'price': '5.50',
+            'decimal': Decimal('2.10'),
+            'naive': datetime.datetime(2024, 1, 2, 3, 4, 5, 600000),
+            'utc': datetime.datetime(
+                2024, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc
+            ),
+            'date': datetime.date(2024, 1, 2),
+            'time': datetime.time(3, 4, 5),
+            'duration': datetime.timedelta(minutes=90),
+            'uuid': uuid.UUID(int=1),
+            'text': 'Crème brûlée \u2028\u2029 "quoted"',
+            'nested': [{'id': 1}, (2, 3), None, True, 1.5],
+            1: 'integer key',
+        })
+
+    def test_indent_and_none(self):
+        """Test pretty printing and empty bodies behave like DRF"""
+        self.assertSameJSON({'a': [1]}, 'application/json; indent=4')
+        self.assertSameJSON({'a': [1]}, context={'indent': 2})
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+
+    def test_big_integers(self):
+        """Test values orjson cannot encode fall back to DRF's encoder"""
+        self.assertSameJSON({'big': 2 ** 70})
+
+
+class ORJSONParserTests(SimpleTestCase):
+    """Test the orjson parser"""
+
+    def test_parse(self):
+        """Test bodies parse to the same data as with DRF's parser"""
+        body = json.dumps({'title': 'Crème', 'price': '5.50', 'n': [1]})
+
+        data = ORJSONParser().parse(io.BytesIO(body.encode()))
+
+        self.assertEqual(data, json.loads(body))
+
+    def test_invalid_json(self):
+        """Test malformed bodies raise a parse error"""
+        for body in (b'{"title": ', b'{"price": NaN}'):
+            with self.subTest(body=body):
+                with self.assertRaises(ParseError):
+                    ORJSONParser().parse(io.BytesIO(body))
+
+
+class RendererAPITests(TestCase):
+    """Test the renderers are used by the API"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='renderers@example.com',
+            password='testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        recipie = Recipie.objects.create(
+            user=self.user,
+            title='Crème brûlée',
+            time_minutes=30,
+            price=Decimal('5.50'),
+        )
+        recipie.tags.add(Tag.objects.create(user=self.user, name='Dessert'))
+
+    def test_json_response(self):
+        """Test list responses are what DRF's renderer produces"""
+        res = self.client.get(RECIPIES_URL)
+
+        self.assertEqual(res['Content-Type'], 'application/json')
+        self.assertEqual(res.content, JSONRenderer().render(res.data))
+        self.assertEqual(res.json()['results'][0]['price'], '5.50')
+
+    def test_msgpack_response(self):
+        """Test MessagePack is chosen by Accept and holds the same values"""
+        json_res = self.client.get(RECIPIES_URL)
+        res = self.client.get(RECIPIES_URL, HTTP_ACCEPT='application/msgpack')
+
+        self.assertEqual(res['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(res.content), json_res.json())
+
+    def test_json_request(self):
+        """Test JSON request bodies are parsed"""
+        payload = {
+            'title': 'Soup',
+            'time_minutes': 5,
+            'price': '2.25',
+            'tags': [{'name': 'Starter'}],
+        }
+
+        res = self.client.post(RECIPIES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipie = Recipie.objects.get(id=res.data['id'])
+        self.assertEqual(recipie.price, Decimal('2.25'))
+        self.assertEqual(recipie.tags.get().name, 'Starter')
+
+
+class MessagePackRendererTests(SimpleTestCase):
+    """Test the MessagePack renderer"""
+
+    def test_values_match_json(self):
+        """Test values are encoded as in the JSON representation"""
+        data = {
+            'price': '5.50',
+            'created': datetime.datetime(
+                2024, 1, 2, tzinfo=datetime.timezone.utc
+            ),
+            'tags': [{'id': 1, 'name': 'Dessert'}],
+        }
+
+        rendered = MessagePackRenderer().render(data)
+
+        self.assertEqual(
+            msgpack.unpackb(rendered),
+            json.loads(JSONRenderer().render(data)),
+        )
@@ -0,0 +1,68 @@
+"""
+Tests for content addressed file storage
+"""
+
+import os
+import tempfile
+from unittest.mock import patch
+
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase
+
+from core.storage import ContentAddressedStorage
+
+NAME = 'upload/ab/cd/abcd.jpg'
+
+
+class ContentAddressedStorageTests(SimpleTestCase):
+    """Test files are written whole and reused only when complete"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.storage = ContentAddressedStorage(location=self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), self.directory.name)
+            for root, _, names in os.walk(self.directory.name)
+            for name in names
+        )
+
+    def test_existing_file_reused(self):
+        """Test a complete file under the name is kept and touched"""
+        self.storage.save(NAME, ContentFile(b'content'))
+        os.utime(self.storage.path(NAME), (0, 0))
+
+        with patch.object(ContentAddressedStorage, '_save') as save:
+            name = self.storage.save(NAME, ContentFile(b'content'))
+
+        save.assert_not_called()
+        self.assertEqual(name, NAME)
+        self.assertGreater(os.path.getmtime(self.storage.path(NAME)), 0)
+        self.assertEqual(self._files(), [NAME])
+
+    def test_partial_file_replaced(self):
+        """Test a truncated file under the name is written over"""
+        os.makedirs(os.path.dirname(self.storage.path(NAME)))
+        with open(self.storage.path(NAME), 'wb') as partial:
+            partial.write(b'cont')
+
+        name = self.storage.save(NAME, ContentFile(b'content'))
+
+        self.assertEqual(name, NAME)
+        with self.storage.open(NAME) as stored:
+            self.assertEqual(stored.read(), b'content')
+        self.assertEqual(self._files(), [NAME])
+
+    def test_failed_write_leaves_nothing(self):
+        """Test a write that fails leaves neither the file nor a temp"""
+        content = ContentFile(b'content')
+
+        with patch.object(content, 'chunks', side_effect=OSError):
+            with self.assertRaises(OSError):
+                self.storage.save(NAME, content)
+
+        self.assertEqual(self._files(), [])
@@ -0,0 +1,131 @@
+"""
+Tests for Server-Timing breakdowns of API requests
+"""
+
+import json
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import AsyncClient, TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import Recipie, Tag
+from core.timing import server_timing
+
+RECIPIES_URL = reverse('recipie:recipie-list')
+TIMING = {'HTTP_X_SERVER_TIMING': '1'}
+
+
+def timing_phases(response):
+    """Return phase names of a Server-Timing header in order"""
+    return [
+        entry.split(';')[0]
+        for entry in response['Server-Timing'].split(', ')
+    ]
+
+
+class ServerTimingTests(TestCase):
+    """Test phase timings are returned to staff who ask for them"""
+
+    def setUp(self):
+        self.staff = get_user_model().objects.create_user(
+            email='staff@example.com',
+            password='testpass123',
+            is_staff=True,
+        )
+        self.token = Token.objects.create(user=self.staff)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        recipie = Recipie.objects.create(
+            user=self.staff,
+            title='Timed soup',
+            time_minutes=10,
+            price=Decimal('3.00'),
+        )
+        recipie.tags.add(Tag.objects.create(user=self.staff, name='Soup'))
+        self.recipie = recipie
+
+    def test_header_and_log_for_staff(self):
+        """Test staff get a Server-Timing header and a log line"""
+        with self.assertLogs('core.timing', level='INFO') as logs:
+            res = self.client.get(RECIPIES_URL, **TIMING)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            timing_phases(res),
+            ['auth', 'permission', 'db', 'serialize', 'render', 'total'],
+        )
+        self.assertIn('queries"', res['Server-Timing'])
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['view'], 'RecipieViewSets')
+        self.assertEqual(line['action'], 'list')
+        self.assertEqual(line['status'], 200)
+        self.assertGreater(line['phases']['db']['queries'], 0)
+        self.assertGreaterEqual(
+            line['phases']['total']['ms'], line['phases']['render']['ms']
+        )
+
+    def test_detail_and_attributes(self):
+        """Test object permissions and attribute views are timed"""
+        with self.assertLogs('core.timing'):
+            detail = self.client.get(
+                reverse('recipie:recipie-detail', args=[self.recipie.id]),
+                **TIMING,
+            )
+            tags = self.client.get(reverse('recipie:tag-list'), **TIMING)
+
+        self.assertIn('permission', timing_phases(detail))
+        self.assertIn('render', timing_phases(tags))
+
+    def test_user_views(self):
+        """Test the user views are timed"""
+        with self.assertLogs('core.timing'):
+            res = self.client.get(reverse('user:me'), **TIMING)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('auth', timing_phases(res))
+
+    def test_not_requested(self):
+        """Test nothing is added without the request header"""
+        with self.assertNoLogs('core.timing'):
+            res = self.client.get(RECIPIES_URL)
+
+        self.assertNotIn('Server-Timing', res)
+
+    def test_not_staff(self):
+        """Test users who are not staff get no timings"""
+        user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+
+        with self.assertNoLogs('core.timing'):
+            res = client.get(RECIPIES_URL, **TIMING)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('Server-Timing', res)
+
+    async def test_async_views(self):
+        """Test async reads are timed"""
+        with self.assertLogs('core.timing'):
+            res = await AsyncClient().get(
+                reverse('recipie-async:recipie-list'),
+                AUTHORIZATION=f'Token {self.token.key}',
+                X_SERVER_TIMING='1',
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('db', timing_phases(res))
+        self.assertIn('serialize', timing_phases(res))
+
+    def test_server_timing_format(self):
+        """Test durations are in milliseconds with query counts"""
+        self.assertEqual(
+            server_timing({'db': (0.0125, 3), 'render': (0.001, 0)}),
+            'db;dur=12.50;desc="3 queries", render;dur=1.00',
+        )
@@ -0,0 +1,161 @@
+"""
+Server-Timing breakdown of the DRF request cycle
+
+Staff sending an X-Server-Timing header get the time a request spent in
+each phase in a Server-Timing response header, and the same numbers are
+logged as one JSON line. Other requests only pay for a header lookup.
+"""
+
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+from core.metrics import timed_queries
+
+TIMING_META = 'HTTP_X_SERVER_TIMING'
+PHASES = ('auth', 'permission', 'db', 'serialize', 'render')
+
+logger = logging.getLogger(__name__)
+
+
+class RequestTiming:
+    """Durations and query counts of the phases of one request"""
+
+    def __init__(self, queries):
+        self.queries = queries
+        self.started = time.perf_counter()
+        self.handler_started = None
+        self.phases = {}
+
+    def add(self, name, seconds, queries=0):
+        total, count = self.phases.get(name, (0.0, 0))
+        self.phases[name] = (total + seconds, count + queries)
+
+    @contextmanager
+    def phase(self, name):
+        started, queries = time.perf_counter(), self.queries.count
+        try:
+            yield
+        finally:
+            self.add(
+                name,
+                time.perf_counter() - started,
+                self.queries.count - queries,
+            )
+
+    def start_handler(self):
+        self.handler_started = (time.perf_counter(), self.queries.seconds)
+
+    def end_handler(self):
+        """Count handler time outside queries as serialization"""
+        if self.handler_started is None:
+            return
+        started, db_seconds = self.handler_started
+        self.add(
+            'serialize',
+            time.perf_counter() - started
+            - (self.queries.seconds - db_seconds),
+        )
+        self.handler_started = None
+
+    def finish(self):
+        """Return phases in order, with all queries and the total"""
+        self.add('db', self.queries.seconds, self.queries.count)
+        self.add('total', time.perf_counter() - self.started)
+        return {
+            name: self.phases[name]
+            for name in (*PHASES, 'total') if name in self.phases
+        }
+
+
+def server_timing(phases):
+    """Format phases as a Server-Timing header value"""
+    entries = []
+    for name, (seconds, queries) in phases.items():
+        entry = f'{name};dur={seconds * 1000:.2f}'
+        if queries:
+            entry += f';desc="{queries} queries"'
+        entries.append(entry)
+    return ', '.join(entries)
+
+
+class ServerTimingMixin:
+    """Time authentication, permissions, queries, the handler and rendering
+
+    Responses are rendered in finalize_response to time rendering, which
+    DRF otherwise leaves to Django after the view returns. The database
+    phase includes queries made in the other phases.
+    """
+    timing = None
+
+    def _timing_requested(self, request):
+        return TIMING_META in request.META
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self._timing_requested(request):
+            return super().dispatch(request, *args, **kwargs)
+        with timed_queries() as queries:
+            self.timing = RequestTiming(queries)
+            return super().dispatch(request, *args, **kwargs)
+
+    async def adispatch(self, request, *args, **kwargs):
+        if not self._timing_requested(request):
+            return await super().adispatch(request, *args, **kwargs)
+        with timed_queries() as queries:
+            self.timing = RequestTiming(queries)
+            return await super().adispatch(request, *args, **kwargs)
+
+    def perform_authentication(self, request):
+        if self.timing is None:
+            return super().perform_authentication(request)
+        with self.timing.phase('auth'):
+            super().perform_authentication(request)
+
+    def check_permissions(self, request):
+        if self.timing is None:
+            return super().check_permissions(request)
+        with self.timing.phase('permission'):
+            super().check_permissions(request)
+
+    def check_object_permissions(self, request, obj):
+        if self.timing is None:
+            return super().check_object_permissions(request, obj)
+        with self.timing.phase('permission'):
+            super().check_object_permissions(request, obj)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.timing is not None:
+            self.timing.start_handler()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        if self.timing is None:
+            return response
+        self.timing.end_handler()
+        if hasattr(response, 'render') and not response.is_rendered:
+            with self.timing.phase('render'):
+                response.render()
+        if request.user.is_staff:
+            phases = self.timing.finish()
+            response['Server-Timing'] = server_timing(phases)
+            self._log_timing(request, response, phases)
+        return response
+
+    def _log_timing(self, request, response, phases):
+        logger.info(json.dumps({
+            'event': 'server_timing',
+            'method': request.method,
+            'path': request.path,
+            'view': type(self).__name__,
+            'action': getattr(self, 'action', None),
+            'status': response.status_code,
+            'user': request.user.pk,
+            'phases': {
+                name: {'ms': round(seconds * 1000, 3), 'queries': queries}
+                for name, (seconds, queries) in phases.items()
+            },
+        }))
@@ -0,0 +1,38 @@
+"""URL mappings for the async Recipie read APIs"""
+
+from django.urls import path
+
+from recipie.views import RecipieViewSets, TagViewSet, IngredientViewSet
+
+app_name = 'recipie-async'
+
+urlpatterns = [
+    path(
+        'recipies/',
+        RecipieViewSets.as_async_view(
+            {'get': 'list'}, basename='recipie', detail=False
+        ),
+        name='recipie-list',
+    ),
+    path(
+        'recipies/<str:pk>/',
+        RecipieViewSets.as_async_view(
+            {'get': 'retrieve'}, basename='recipie', detail=True
+        ),
+        name='recipie-detail',
+    ),
+    path(
+        'tags/',
+        TagViewSet.as_async_view(
+            {'get': 'list'}, basename='tag', detail=False
+        ),
+        name='tag-list',
+    ),
+    path(
+        'ingredients/',
+        IngredientViewSet.as_async_view(
+            {'get': 'list'}, basename='ingredient', detail=False
+        ),
+        name='ingredient-list',
+    ),
+]
@@ -0,0 +1,95 @@
+"""
+Async read handlers for Recipie APIs
+
+Under ASGI a sync view holds a thread for the whole request. The views
+built by AsyncReadMixin.as_async_view run list and retrieve as
+coroutines instead and only leave the event loop for database work,
+which goes through Django's async ORM interface. The rest of the DRF
+request cycle (negotiation, permissions, caching, conditional requests,
+serialization) is shared with the sync views.
+"""
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from rest_framework.response import Response
+
+
+class AsyncReadMixin:
+    """Serve list and retrieve from async handlers"""
+
+    @classmethod
+    def as_async_view(cls, actions, **initkwargs):
+        """Return an async view for read actions, like as_view"""
+        actions = dict(actions)
+        if 'get' in actions and 'head' not in actions:
+            actions['head'] = actions['get']
+
+        async def view(request, *args, **kwargs):
+            self = cls(**initkwargs)
+            self.action_map = actions
+            for method, action in actions.items():
+                setattr(self, method, getattr(self, action))
+            self.request = request
+            self.args = args
+            self.kwargs = kwargs
+            return await self.adispatch(request, *args, **kwargs)
+
+        view.cls = cls
+        view.initkwargs = initkwargs
+        view.actions = actions
+        view.csrf_exempt = True
+        return view
+
+    async def adispatch(self, request, *args, **kwargs):
+        """Run the DRF request cycle around an async action handler"""
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            # Token lookups may miss the cache and read the database
+            await sync_to_async(self.perform_authentication)(request)
+            self.initial(request, *args, **kwargs)
+
+            handler = getattr(self, f'a{self.action}', None)
+            if handler is None:
+                self.http_method_not_allowed(request, *args, **kwargs)
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(
+            request, response, *args, **kwargs
+        )
+        return self.response
+
+    async def aget_object(self):
+        """Return the requested object, fetched with the async ORM"""
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await queryset.filter(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+            ).afirst()
+        except (TypeError, ValueError, ValidationError):
+            obj = None
+        if obj is None:
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = await self.paginator.apaginate_queryset(
+            queryset, request, view=self
+        )
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
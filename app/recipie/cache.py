@@ -0,0 +1,212 @@
+"""
+Versioned response cache for Recipie APIs
+
+Every user has a data version stored in the cache. Cached list
+responses are keyed by that version, so bumping it on writes makes all
+of the user's entries unreachable without scanning or purging them.
+"""
+
+import hashlib
+import threading
+import time
+from urllib.parse import urlencode
+
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from rest_framework.response import Response
+
+RESPONSE_CACHE_ALIAS = 'responses'
+
+_stats = {'hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+# Users whose version this thread bumped and has not read since
+_local = threading.local()
+
+
+def _version_key(user_id):
+    return f'data-version:{user_id}'
+
+
+def _modified_key(user_id):
+    return f'data-modified:{user_id}'
+
+
+def _new_version():
+    """Return a version newer than any a lost key could have reached"""
+    return time.time_ns()
+
+
+def _unread_bumps():
+    if not hasattr(_local, 'unread_bumps'):
+        _local.unread_bumps = set()
+    return _local.unread_bumps
+
+
+def versions_shared():
+    """Return whether every process reads the same data versions"""
+    return not isinstance(caches[RESPONSE_CACHE_ALIAS], LocMemCache)
+
+
+def get_data_version(user_id):
+    """Return the user's data version, starting a new one if missing"""
+    _unread_bumps().discard(user_id)
+    cache = caches[RESPONSE_CACHE_ALIAS]
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+async def aget_data_version(user_id):
+    """Like get_data_version, for async views"""
+    cache = caches[RESPONSE_CACHE_ALIAS]
+    key = _version_key(user_id)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, _new_version(), timeout=None)
+        version = await cache.aget(key)
+    return version
+
+
+def get_data_modified(user_id):
+    """Return when the user's data last changed, as a UNIX timestamp"""
+    cache = caches[RESPONSE_CACHE_ALIAS]
+    key = _modified_key(user_id)
+    modified = cache.get(key)
+    if modified is None:
+        cache.add(key, time.time(), timeout=None)
+        modified = cache.get(key)
+    return modified
+
+
+async def aget_data_modified(user_id):
+    """Like get_data_modified, for async views"""
+    cache = caches[RESPONSE_CACHE_ALIAS]
+    key = _modified_key(user_id)
+    modified = await cache.aget(key)
+    if modified is None:
+        await cache.aadd(key, time.time(), timeout=None)
+        modified = await cache.aget(key)
+    return modified
+
+
+def _incr_data_version(user_id):
+    cache = caches[RESPONSE_CACHE_ALIAS]
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        cache.set(_version_key(user_id), _new_version(), timeout=None)
+    cache.set(_modified_key(user_id), time.time(), timeout=None)
+
+
+class _CommitBump:
+    """Bump a user's data version when the transaction commits"""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+
+    def __call__(self):
+        _unread_bumps().discard(self.user_id)
+        _incr_data_version(self.user_id)
+
+
+def _commit_bump_pending(connection, user_id):
+    """Return whether the transaction already bumps the user on commit"""
+    return any(
+        isinstance(entry[1], _CommitBump) and entry[1].user_id == user_id
+        for entry in connection.run_on_commit
+    )
+
+
+def bump_data_version(user_id):
+    """Invalidate every cached response of a user
+
+    Inside a transaction the version is bumped again on commit, so a
+    response cached by a reader that ran before the commit is not served.
+    Further bumps in the transaction with no read of the version since
+    the last one, such as for each row of a cascading delete, are skipped.
+    """
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        _incr_data_version(user_id)
+        return
+    pending = _commit_bump_pending(connection, user_id)
+    if pending and user_id in _unread_bumps():
+        return
+    _incr_data_version(user_id)
+    _unread_bumps().add(user_id)
+    if not pending:
+        transaction.on_commit(_CommitBump(user_id))
+
+
+def record_cache_access(hit):
+    """Count a response cache hit or miss"""
+    with _stats_lock:
+        _stats['hits' if hit else 'misses'] += 1
+
+
+def cache_stats():
+    """Return hit and miss counts of this process for tuning"""
+    with _stats_lock:
+        hits, misses = _stats['hits'], _stats['misses']
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / total if total else 0.0,
+    }
+
+
+def request_fingerprint(request):
+    """Return a digest of the request URL with normalized query params"""
+    params = urlencode(sorted(request.query_params.lists()), doseq=True)
+    url = request.build_absolute_uri(request.path)
+    return hashlib.sha256(f'{url}?{params}'.encode()).hexdigest()
+
+
+class CachedListMixin:
+    """Serve list responses from the per-user versioned cache"""
+
+    def _list_cache_key(self, request, version):
+        """Return the cache key for the user, endpoint and query params"""
+        user_id = request.user.pk
+        return f'list:{user_id}:{version}:{request_fingerprint(request)}'
+
+    def _cached_response(self, data):
+        """Return a response for cached data, or None on a miss"""
+        record_cache_access(hit=data is not None)
+        if data is not None:
+            return Response(data, headers={'X-Cache': 'HIT'})
+        return None
+
+    def _miss(self, response):
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        cache = caches[RESPONSE_CACHE_ALIAS]
+        key = self._list_cache_key(
+            request, get_data_version(request.user.pk)
+        )
+        response = self._cached_response(cache.get(key))
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+            cache.set(key, response.data)
+            response = self._miss(response)
+        return response
+
+    async def alist(self, request, *args, **kwargs):
+        cache = caches[RESPONSE_CACHE_ALIAS]
+        key = self._list_cache_key(
+            request, await aget_data_version(request.user.pk)
+        )
+        response = self._cached_response(await cache.aget(key))
+        if response is None:
+            response = await super().alist(request, *args, **kwargs)
+            await cache.aset(key, response.data)
+            response = self._miss(response)
+        return response
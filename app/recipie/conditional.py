@@ -0,0 +1,190 @@
+"""
+Conditional request support for Recipie APIs
+"""
+
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from recipie.cache import (
+    aget_data_modified,
+    aget_data_version,
+    get_data_modified,
+    get_data_version,
+    request_fingerprint,
+    versions_shared,
+)
+
+
+def make_etag(*parts):
+    """Return a strong ETag built from the given representation parts"""
+    value = ':'.join(str(part) for part in parts)
+    return quote_etag(hashlib.sha256(value.encode()).hexdigest())
+
+
+class ConditionalRequestMixin:
+    """Answer conditional list requests and guard updates with If-Match
+
+    List validators come from the data version, so they are only sent when
+    the version is shared; a process with versions of its own would answer
+    304 for lists changed through another.
+    """
+
+    def _updated_at_queryset(self, lock=False):
+        """Return a query for updated_at of the requested object"""
+        queryset = self.get_queryset().prefetch_related(None)
+        if lock:
+            queryset = queryset.select_for_update()
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            queryset = queryset.filter(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+            )
+        except (TypeError, ValueError, ValidationError):
+            # Malformed lookups are left to get_object to answer with a 404
+            queryset = queryset.none()
+        return queryset.values_list('updated_at', flat=True)
+
+    def _object_updated_at(self, lock=False):
+        """Return updated_at of the requested object without its relations"""
+        return self._updated_at_queryset(lock).first()
+
+    def _object_validators(self, request, updated_at):
+        """Return the ETag and timestamp of one object's representation"""
+        etag = make_etag(
+            self.basename,
+            self.kwargs[self.lookup_url_kwarg or self.lookup_field],
+            updated_at.isoformat(),
+            request_fingerprint(request),
+            request.accepted_media_type,
+        )
+        return etag, updated_at.timestamp()
+
+    def _list_validators(self, request):
+        """Return the ETag and timestamp of a list from the data version"""
+        user_id = request.user.pk
+        etag = make_etag(
+            self.basename,
+            get_data_version(user_id),
+            request_fingerprint(request),
+            request.accepted_media_type,
+        )
+        return etag, get_data_modified(user_id)
+
+    async def _alist_validators(self, request):
+        """Like _list_validators, for async views"""
+        user_id = request.user.pk
+        etag = make_etag(
+            self.basename,
+            await aget_data_version(user_id),
+            request_fingerprint(request),
+            request.accepted_media_type,
+        )
+        return etag, await aget_data_modified(user_id)
+
+    def _set_validators(self, response, etag, last_modified):
+        """Add ETag and Last-Modified headers to a successful response"""
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def _conditional(self, request, validators, handler, *args, **kwargs):
+        """Return 304/412 when preconditions say so, else run the handler"""
+        etag, last_modified = validators
+        response = get_conditional_response(
+            request, etag=etag, last_modified=int(last_modified)
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        return self._set_validators(response, etag, last_modified)
+
+    async def _aconditional(self, request, validators, handler, *args,
+                            **kwargs):
+        """Like _conditional, awaiting an async handler"""
+        etag, last_modified = validators
+        response = get_conditional_response(
+            request, etag=etag, last_modified=int(last_modified)
+        )
+        if response is None:
+            response = await handler(request, *args, **kwargs)
+        return self._set_validators(response, etag, last_modified)
+
+    def list(self, request, *args, **kwargs):
+        if not versions_shared():
+            return super().list(request, *args, **kwargs)
+        return self._conditional(
+            request,
+            self._list_validators(request),
+            super().list,
+            *args,
+            **kwargs,
+        )
+
+    async def alist(self, request, *args, **kwargs):
+        if not versions_shared():
+            return await super().alist(request, *args, **kwargs)
+        return await self._aconditional(
+            request,
+            await self._alist_validators(request),
+            super().alist,
+            *args,
+            **kwargs,
+        )
+
+    def update(self, request, *args, **kwargs):
+        if not (
+            'HTTP_IF_MATCH' in request.META
+            or 'HTTP_IF_UNMODIFIED_SINCE' in request.META
+        ):
+            response = super().update(request, *args, **kwargs)
+        else:
+            with transaction.atomic():
+                updated_at = self._object_updated_at(lock=True)
+                if updated_at is None:
+                    return super().update(request, *args, **kwargs)
+                response = self._conditional(
+                    request,
+                    self._object_validators(request, updated_at),
+                    super().update,
+                    *args,
+                    **kwargs,
+                )
+
+        if response.status_code == 200:
+            updated_at = self._object_updated_at()
+            self._set_validators(
+                response, *self._object_validators(request, updated_at)
+            )
+        return response
+
+
+class ConditionalRetrieveMixin(ConditionalRequestMixin):
+    """Also answer conditional detail requests"""
+
+    def retrieve(self, request, *args, **kwargs):
+        updated_at = self._object_updated_at()
+        if updated_at is None:
+            return super().retrieve(request, *args, **kwargs)
+        return self._conditional(
+            request,
+            self._object_validators(request, updated_at),
+            super().retrieve,
+            *args,
+            **kwargs,
+        )
+
+    async def aretrieve(self, request, *args, **kwargs):
+        updated_at = await self._updated_at_queryset().afirst()
+        if updated_at is None:
+            return await super().aretrieve(request, *args, **kwargs)
+        return await self._aconditional(
+            request,
+            self._object_validators(request, updated_at),
+            super().aretrieve,
+            *args,
+            **kwargs,
+        )
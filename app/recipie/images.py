@@ -0,0 +1,117 @@
+"""
+Thumbnail and WebP variants of uploaded Recipie images
+
+Variants are generated off the request thread once the upload has been
+committed. Their names are derived from the original image, and the ones
+that were written are recorded on the recipie, so serializers can build
+URLs without touching storage.
+"""
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from core.models import Recipie
+from recipie.cache import bump_data_version
+
+logger = logging.getLogger(__name__)
+
+# Variant name: (bounding box, Pillow format)
+IMAGE_VARIANTS = {
+    'thumbnail': ((160, 160), 'JPEG'),
+    'thumbnail_webp': ((160, 160), 'WEBP'),
+    'medium': ((640, 640), 'JPEG'),
+    'medium_webp': ((640, 640), 'WEBP'),
+}
+
+EXTENSIONS = {'JPEG': 'jpg', 'WEBP': 'webp'}
+
+_executor = None
+
+
+def get_executor():
+    """Return the shared pool generating image variants"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_VARIANT_WORKERS,
+            thread_name_prefix='image-variants',
+        )
+    return _executor
+
+
+def variant_name(name, variant):
+    """Return the storage name of an image variant"""
+    extension = EXTENSIONS[IMAGE_VARIANTS[variant][1]]
+    return f'{os.path.splitext(name)[0]}__{variant}.{extension}'
+
+
+def render_variant(image, size, image_format):
+    """Return the encoded bytes of an image scaled to fit a box"""
+    variant = image.copy()
+    variant.thumbnail(size, Image.LANCZOS)
+    if image_format == 'JPEG' and variant.mode != 'RGB':
+        variant = variant.convert('RGB')
+    buffer = BytesIO()
+    variant.save(buffer, format=image_format, quality=80)
+    return buffer.getvalue()
+
+
+def generate_variants(recipie_id, user_id, name):
+    """Write every variant of an image and record them on the recipie"""
+    storage = Recipie._meta.get_field('image').storage
+    # Images are content addressed, so variants already stored are current
+    missing = [
+        variant for variant in IMAGE_VARIANTS
+        if not storage.exists(variant_name(name, variant))
+    ]
+    if missing:
+        with storage.open(name) as original:
+            image = ImageOps.exif_transpose(Image.open(original))
+            image.load()
+    for variant in missing:
+        size, image_format = IMAGE_VARIANTS[variant]
+        storage.save(variant_name(name, variant), ContentFile(
+            render_variant(image, size, image_format)
+        ))
+
+    # Conditional, so an image replaced or a recipie deleted meanwhile is
+    # left alone, and nothing else on the row is written back
+    updated = Recipie.objects.filter(pk=recipie_id, image=name).update(
+        image_variants=list(IMAGE_VARIANTS),
+        updated_at=timezone.now(),
+    )
+    if updated == 1:
+        bump_data_version(user_id)
+
+
+def delete_variants(name):
+    """Remove every variant of an image from storage"""
+    storage = Recipie._meta.get_field('image').storage
+    for variant in IMAGE_VARIANTS:
+        storage.delete(variant_name(name, variant))
+
+
+def _run(recipie_id, user_id, name):
+    close_old_connections()
+    try:
+        generate_variants(recipie_id, user_id, name)
+    except Exception:
+        logger.exception('Generating variants of %s failed', name)
+    finally:
+        close_old_connections()
+
+
+def schedule_variants(recipie):
+    """Generate variants of a recipie's image after the upload commits"""
+    recipie_id, user_id, name = recipie.pk, recipie.user_id, recipie.image.name
+    transaction.on_commit(
+        lambda: get_executor().submit(_run, recipie_id, user_id, name)
+    )
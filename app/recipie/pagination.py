@@ -0,0 +1,154 @@
+"""
+Pagination classes for Recipie APIs
+"""
+
+import json
+import operator
+from functools import reduce
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+
+
+class RecipieCursorPagination(CursorPagination):
+    """Opaque keyset pagination for recipies, newest first
+
+    Pagination is split into building the page query and reading its
+    results, so async views can fetch the page with the async ORM. With
+    several ordering fields the cursor holds the values of all of them,
+    and pages follow the compound key, so ties in the first field are
+    neither repeated nor skipped however many there are.
+    """
+    ordering = '-id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def get_ordering(self, request, queryset, view):
+        """Order ranked search results by rank, newest first within a rank"""
+        if 'rank' in queryset.query.annotations:
+            return ('-rank', '-id')
+        return super().get_ordering(request, queryset, view)
+
+    def _page_queryset(self, queryset, request, view):
+        """Decode the cursor and return the query for one page"""
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+        self._position = (offset, reverse, current_position)
+
+        # Cursor pagination always enforces an ordering.
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        # If we have a cursor with a fixed position then filter by that.
+        if current_position is not None:
+            queryset = queryset.filter(self._after(current_position))
+
+        # Fetch an extra item to tell whether a following page exists.
+        return queryset[offset:offset + self.page_size + 1]
+
+    def _after(self, position):
+        """Return a filter for the rows past a position in cursor order"""
+        if len(self.ordering) == 1:
+            values = [position]
+        else:
+            try:
+                values = json.loads(position)
+            except ValueError:
+                values = None
+            if not isinstance(values, list) or (
+                len(values) != len(self.ordering)
+            ):
+                raise NotFound(self.invalid_cursor_message)
+
+        # (a, b) past (x, y) is: a past x, or a equal to x and b past y
+        after = []
+        equal = Q()
+        for order, value in zip(self.ordering, values):
+            order_attr = order.lstrip('-')
+            # Test for: (cursor reversed) XOR (queryset reversed)
+            if self.cursor.reverse != order.startswith('-'):
+                lookup = order_attr + '__lt'
+            else:
+                lookup = order_attr + '__gt'
+            after.append(equal & Q(**{lookup: value}))
+            equal &= Q(**{order_attr: value})
+        return reduce(operator.or_, after)
+
+    def _get_position_from_instance(self, instance, ordering):
+        """Return the cursor position of an instance in every field"""
+        if len(ordering) == 1:
+            return super()._get_position_from_instance(instance, ordering)
+        position = super()._get_position_from_instance
+        return json.dumps([position(instance, (order,)) for order in ordering])
+
+    def _read_page(self, results):
+        """Keep one page of results and work out the adjacent cursors"""
+        offset, reverse, current_position = self._position
+        self.page = list(results[:self.page_size])
+
+        # Determine the position of the final item following the page.
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering
+            )
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            # The query ran in reverse, so restore the requested order.
+            self.page = list(reversed(self.page))
+
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        # Display page controls in the browsable API if there is more
+        # than one page.
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self._page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self._read_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Paginate like paginate_queryset, fetching the page async"""
+        queryset = self._page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self._read_page([obj async for obj in queryset])
+
+
+class RecipieAttrCursorPagination(RecipieCursorPagination):
+    """Keyset pagination for tags and ingredients ordered by name"""
+    ordering = ('-name', '-id')
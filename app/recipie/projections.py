@@ -0,0 +1,155 @@
+"""
+Lean read path for Recipie list APIs
+
+List pages are fetched with values(), with relations as arrays of ids
+and names from the same query, and turned into plain dicts without
+building model instances or walking serializer fields. The dicts match
+what the serializers return, so responses render to the same bytes.
+"""
+
+from functools import partial
+from operator import itemgetter
+
+from django.contrib.postgres.expressions import ArraySubquery
+from django.db.models import OuterRef
+from rest_framework.fields import DecimalField
+from rest_framework.response import Response
+
+from core.models import Recipie
+from recipie.images import IMAGE_VARIANTS, variant_name
+
+RELATIONS = ('tags', 'ingredients')
+
+
+class ValuesProjection:
+    """Rows made of the serialized model fields alone"""
+
+    def __init__(self, fields):
+        self.fields = list(fields)
+
+    def queryset(self, queryset):
+        return queryset.values(*self.fields)
+
+    def rows(self, page):
+        return page
+
+
+class RecipieProjection:
+    """Rows shaped like RecipieSerializer output for sparse fieldsets"""
+
+    def __init__(self, request, fields, expand):
+        self.request = request
+        self.fields = list(fields)
+        self.expand = expand
+        price = Recipie._meta.get_field('price')
+        self._price = DecimalField(
+            max_digits=price.max_digits,
+            decimal_places=price.decimal_places,
+        )
+        self._storage = Recipie._meta.get_field('image').storage
+
+    def queryset(self, queryset):
+        """Select the needed columns and aggregate relations per row"""
+        columns = {'id'} | set(self.fields) - set(RELATIONS)
+        if 'image_variants' in columns:
+            columns.add('image')
+        if 'rank' in queryset.query.annotations:
+            # Read back by the cursor paginator
+            columns.add('rank')
+
+        arrays = {}
+        for name in RELATIONS:
+            if name not in self.fields:
+                continue
+            related = Recipie._meta.get_field(name).related_model
+            linked = related.objects.filter(
+                recipie=OuterRef('pk')
+            ).order_by('id')
+            arrays[f'{name}_ids'] = ArraySubquery(linked.values('id'))
+            if name in self.expand:
+                arrays[f'{name}_names'] = ArraySubquery(linked.values('name'))
+        return queryset.values(*columns, **arrays)
+
+    def _url(self, name):
+        return self.request.build_absolute_uri(self._storage.url(name))
+
+    def _image(self, values):
+        return self._url(values['image']) if values['image'] else None
+
+    def _image_variants(self, values):
+        image = values['image']
+        if not image:
+            return {}
+        return {
+            variant: self._url(variant_name(image, variant))
+            for variant in values['image_variants']
+            if variant in IMAGE_VARIANTS
+        }
+
+    def _price_string(self, values):
+        return self._price.to_representation(values['price'])
+
+    def _related(self, values, name):
+        ids = values[f'{name}_ids']
+        if name not in self.expand:
+            return ids
+        return [
+            {'id': pk, 'name': related_name}
+            for pk, related_name in zip(ids, values[f'{name}_names'])
+        ]
+
+    def _converters(self):
+        """Return a function building each field from a values() row"""
+        converters = {
+            'price': self._price_string,
+            'image': self._image,
+            'image_variants': self._image_variants,
+        }
+        for name in RELATIONS:
+            converters[name] = partial(self._related, name=name)
+        return [
+            (name, converters.get(name) or itemgetter(name))
+            for name in self.fields
+        ]
+
+    def rows(self, page):
+        converters = self._converters()
+        return [
+            {name: convert(values) for name, convert in converters}
+            for values in page
+        ]
+
+
+class ProjectedListMixin:
+    """Serve list from the rows of get_projection() instead of serializers
+
+    The serializer class still describes the response for the schema.
+    Setting projected_list to False serves lists through the serializer.
+    """
+    projected_list = True
+
+    def get_projection(self):
+        return ValuesProjection(self.get_serializer_class().Meta.fields)
+
+    def _projected_queryset(self, projection):
+        return projection.queryset(self.filter_queryset(self.get_queryset()))
+
+    def list(self, request, *args, **kwargs):
+        if not self.projected_list:
+            return super().list(request, *args, **kwargs)
+        projection = self.get_projection()
+        queryset = self._projected_queryset(projection)
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(projection.rows(list(queryset)))
+        return self.get_paginated_response(projection.rows(page))
+
+    async def alist(self, request, *args, **kwargs):
+        if not self.projected_list:
+            return await super().alist(request, *args, **kwargs)
+        projection = self.get_projection()
+        queryset = self._projected_queryset(projection)
+        page = await self.paginator.apaginate_queryset(
+            queryset, request, view=self
+        )
+        return self.get_paginated_response(projection.rows(page))
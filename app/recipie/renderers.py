@@ -0,0 +1,68 @@
+"""
+Renderers for Recipie APIs
+"""
+
+import csv
+import io
+import json
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Newline delimited JSON, one object per line"""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+
+    def _line(self, item):
+        return json.dumps(item, cls=JSONEncoder).encode() + b'\n'
+
+    def stream(self, items):
+        """Yield one encoded line per item"""
+        for item in items:
+            yield self._line(item)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        items = data if isinstance(data, list) else [data]
+        return b''.join(self.stream(items))
+
+
+class CSVRenderer(BaseRenderer):
+    """Comma separated values with a header row from the first item"""
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def _cell(self, value):
+        """Flatten nested objects to a list of their names"""
+        if isinstance(value, dict):
+            return json.dumps(value)
+        if isinstance(value, list):
+            return ', '.join(
+                str(item['name']) if isinstance(item, dict) else str(item)
+                for item in value
+            )
+        return value
+
+    def stream(self, items):
+        """Yield the header then one encoded row per item"""
+        buffer = io.StringIO()
+        writer = None
+        for item in items:
+            if writer is None:
+                writer = csv.DictWriter(buffer, fieldnames=list(item))
+                writer.writeheader()
+            writer.writerow({k: self._cell(v) for k, v in item.items()})
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        items = data if isinstance(data, list) else [data]
+        return b''.join(self.stream(items))
@@ -2,8 +2,61 @@
 Seralizers for Recipie APIs
 """
 
+from django.db import transaction
+from django.db.models import prefetch_related_objects
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
 from core.models import Recipie, Tag, Ingredient
+from recipie.cache import bump_data_version
+from recipie.images import IMAGE_VARIANTS, variant_name
+from recipie.uploads import process_image
+
+
+def _get_or_create_by_name(model, user, names):
+    """Return user's objects keyed by name, inserting missing ones at once"""
+    names = set(names)
+    if not names:
+        return {}
+    objs = {
+        obj.name: obj
+        for obj in model.objects.filter(user=user, name__in=names)
+    }
+    missing = [model(user=user, name=name) for name in names - objs.keys()]
+    model.objects.bulk_create(missing)
+    objs.update((obj.name, obj) for obj in missing)
+    return objs
+
+
+def parse_field_list(value):
+    """Split a comma separated query param into a set of names"""
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class SparseFieldsMixin:
+    """Honour ?fields= and ?expand= when serializing reads"""
+
+    expandable_fields = ['tags', 'ingredients']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS:
+            return
+
+        params = request.query_params
+        if params.get('fields'):
+            wanted = parse_field_list(params['fields'])
+            for name in set(self.fields) - wanted:
+                self.fields.pop(name)
+
+        if 'expand' in params:
+            expand = parse_field_list(params['expand'])
+            for name in self.expandable_fields:
+                if name in self.fields and name not in expand:
+                    self.fields[name] = serializers.PrimaryKeyRelatedField(
+                        many=True, read_only=True
+                    )
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -24,42 +77,109 @@ class IngredientSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class RecipieSerializer(serializers.ModelSerializer):
+class RecipieListSerializer(serializers.ListSerializer):
+    """Create a batch of recipies with a fixed number of queries"""
+
+    max_batch_size = 5000
+
+    def to_internal_value(self, data):
+        """Reject batches too large to write in one transaction
+
+        Checked before any item is validated, as items look up their tags
+        and ingredients.
+        """
+        if isinstance(data, list) and len(data) > self.max_batch_size:
+            raise serializers.ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [
+                    f'Ensure this list has at most {self.max_batch_size} '
+                    'items.'
+                ],
+            })
+        return super().to_internal_value(data)
+
+    def _bulk_link(self, recipies, names, model, field):
+        """Resolve names for all recipies and insert the through rows"""
+        auth_user = self.context['request'].user
+        objs = _get_or_create_by_name(
+            model, auth_user, set().union(*names)
+        )
+        through = getattr(Recipie, field).through
+        column = f'{model._meta.model_name}_id'
+        through.objects.bulk_create([
+            through(recipie_id=recipie.id, **{column: objs[name].id})
+            for recipie, recipie_names in zip(recipies, names)
+            for name in recipie_names
+        ])
+
+    @transaction.atomic
+    def create(self, validated_data):
+        """Bulk create recipies with their tags and ingredients"""
+        recipies, tag_names, ingredient_names = [], [], []
+        for attrs in validated_data:
+            attrs = dict(attrs)
+            tag_names.append({t['name'] for t in attrs.pop('tags', [])})
+            ingredient_names.append(
+                {i['name'] for i in attrs.pop('ingredients', [])}
+            )
+            recipies.append(Recipie(**attrs))
+
+        Recipie.objects.bulk_create(recipies)
+        self._bulk_link(recipies, tag_names, Tag, 'tags')
+        self._bulk_link(recipies, ingredient_names, Ingredient, 'ingredients')
+        prefetch_related_objects(recipies, 'tags', 'ingredients')
+        bump_data_version(self.context['request'].user.pk)
+        return recipies
+
+
+class RecipieSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for Recipie"""
 
     tags = TagSerializer(many=True, required=False)
 
     ingredients = IngredientSerializer(many=True, required=False)
 
+    image_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = Recipie
         fields = [
             "id", 'title', 'time_minutes',
-            'price', 'link', 'tags', 'ingredients', 'image'
+            'price', 'link', 'tags', 'ingredients', 'image',
+            'image_variants',
         ]
         read_only_fields = ['id', ]
+        list_serializer_class = RecipieListSerializer
 
     def _get_or_create_tags(self, tags, recipie):
-        """Handlng Getting or Creating Tags as Needed"""
+        """Resolve tags by name in bulk and set them on the recipie"""
         auth_user = self.context['request'].user
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(
-                user=auth_user,
-                **tag,
-            )
-            recipie.tags.add(tag_obj)
-            recipie.save()
+        tag_objs = _get_or_create_by_name(
+            Tag, auth_user, (tag['name'] for tag in tags)
+        )
+        recipie.tags.set(tag_objs.values())
 
     def _get_or_create_ingredient(self, ingredients, recipie):
-        """Handle creating or updating an ingredient from a recipe"""
-
+        """Resolve ingredients by name in bulk and set them on the recipie"""
         auth_user = self.context['request'].user
-        for ingredient in ingredients:
-            ingredient_obj, created = Ingredient.objects.get_or_create(
-                user=auth_user,
-                **ingredient
+        ingredient_objs = _get_or_create_by_name(
+            Ingredient, auth_user, (i['name'] for i in ingredients)
+        )
+        recipie.ingredients.set(ingredient_objs.values())
+
+    def get_image_variants(self, recipie) -> dict:
+        """Return URLs of the generated image variants by name"""
+        if not recipie.image:
+            return {}
+        request = self.context.get('request')
+        urls = {}
+        for variant in recipie.image_variants:
+            if variant not in IMAGE_VARIANTS:
+                continue
+            url = recipie.image.storage.url(
+                variant_name(recipie.image.name, variant)
             )
-            recipie.ingredients.add(ingredient_obj)
+            urls[variant] = request.build_absolute_uri(url) if request else url
+        return urls
 
     def create(self, validated_data):
         '''Custom create method for Recipie Serializer '''
@@ -76,11 +196,9 @@ class RecipieSerializer(serializers.ModelSerializer):
         tags = validated_data.pop('tags', None)
         ingredients = validated_data.pop('ingredients', None)
         if tags is not None:
-            instance.tags.clear()
             self._get_or_create_tags(tags, instance)
 
         if ingredients is not None:
-            instance.ingredients.clear()
             self._get_or_create_ingredient(ingredients, instance)
 
         for attr, val in validated_data.items():
@@ -102,3 +220,15 @@ class RecipieImageSerializer(serializers.ModelSerializer):
         model = Recipie
         fields = ['id', 'image']
         extra_kwargs = {'image': {'required': 'True'}}
+
+    def validate_image(self, value):
+        """Downscale the image and strip its metadata"""
+        return process_image(value)
+
+    def update(self, instance, validated_data):
+        """Replace the image, forgetting variants of the previous one"""
+        instance.image_variants = []
+        try:
+            return super().update(instance, validated_data)
+        finally:
+            validated_data['image'].close()
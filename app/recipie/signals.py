@@ -0,0 +1,34 @@
+"""Signal handlers invalidating cached Recipie API responses"""
+
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import Recipie, Tag, Ingredient
+from recipie.cache import bump_data_version
+
+
+@receiver(post_save, sender=Recipie)
+@receiver(post_delete, sender=Recipie)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def bump_owner_version(sender, instance, **kwargs):
+    """Invalidate the owner's responses when an object changes"""
+    bump_data_version(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipie.tags.through)
+@receiver(m2m_changed, sender=Recipie.ingredients.through)
+def bump_version_on_links(sender, instance, action, **kwargs):
+    """Invalidate the owner's responses when recipie links change"""
+    if action.startswith('post_'):
+        bump_data_version(instance.user_id)
+
+
+@receiver(post_save, sender=get_user_model())
+def start_user_version(sender, instance, created, **kwargs):
+    """Give new users a fresh version so reused ids never hit old entries"""
+    if created:
+        bump_data_version(instance.pk)
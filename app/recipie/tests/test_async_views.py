@@ -0,0 +1,147 @@
+"""
+Tests for the async recipie read APIs
+"""
+
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import AsyncClient, TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import Recipie, Tag, Ingredient
+
+READ_URLS = [
+    ('recipie:recipie-list', 'recipie-async:recipie-list'),
+    ('recipie:tag-list', 'recipie-async:tag-list'),
+    ('recipie:ingredient-list', 'recipie-async:ingredient-list'),
+]
+
+
+class AsyncReadTests(TestCase):
+    """Test async read endpoints answer like the sync ones"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='async@example.com',
+            password='testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for i in range(3):
+            recipie = Recipie.objects.create(
+                user=self.user,
+                title=f'Recipie {i}',
+                time_minutes=i,
+                price=Decimal('1.50'),
+                description='Spicy soup',
+            )
+            recipie.tags.add(Tag.objects.create(user=self.user, name=f't{i}'))
+            recipie.ingredients.add(
+                Ingredient.objects.create(user=self.user, name=f'i{i}')
+            )
+        self.recipie = recipie
+
+    def assertSameResponse(self, sync_url, async_url, params=None):
+        sync_res = self.client.get(sync_url, params)
+        async_res = self.client.get(async_url, params)
+
+        self.assertEqual(async_res.status_code, sync_res.status_code)
+        self.assertEqual(async_res.json(), sync_res.json())
+        return async_res
+
+    def test_lists_match_sync(self):
+        """Test async lists return the same data as sync lists"""
+        for sync_name, async_name in READ_URLS:
+            with self.subTest(url=async_name):
+                res = self.assertSameResponse(
+                    reverse(sync_name), reverse(async_name)
+                )
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+                self.assertEqual(res['X-Cache'], 'MISS')
+
+    def test_recipie_list_params_match_sync(self):
+        """Test filters, search and sparse fields behave the same"""
+        tag = self.recipie.tags.get()
+        for params in (
+            {'tags': str(tag.id)},
+            {'q': 'soup'},
+            {'fields': 'id,title,tags', 'expand': ''},
+        ):
+            with self.subTest(params=params):
+                self.assertSameResponse(
+                    reverse('recipie:recipie-list'),
+                    reverse('recipie-async:recipie-list'),
+                    params,
+                )
+
+    def test_pagination(self):
+        """Test cursor links page through the async list"""
+        res = self.client.get(
+            reverse('recipie-async:recipie-list'), {'page_size': 2}
+        )
+        self.assertEqual(len(res.data['results']), 2)
+        self.assertIn('/api/async/recipie/', res.data['next'])
+
+        res = self.client.get(res.data['next'])
+
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertIsNone(res.data['next'])
+
+    def test_retrieve_matches_sync(self):
+        """Test async detail responses, ETags and 304s"""
+        res = self.assertSameResponse(
+            reverse('recipie:recipie-detail', args=[self.recipie.id]),
+            reverse('recipie-async:recipie-detail', args=[self.recipie.id]),
+        )
+
+        res = self.client.get(
+            reverse('recipie-async:recipie-detail', args=[self.recipie.id]),
+            HTTP_IF_NONE_MATCH=res['ETag'],
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_retrieve_not_found(self):
+        """Test other users' and malformed ids are not found"""
+        other = get_user_model().objects.create_user(
+            email='other@example.com',
+            password='testpass123',
+        )
+        recipie = Recipie.objects.create(
+            user=other, title='Other', time_minutes=1, price=Decimal('1')
+        )
+        for pk in (recipie.id, 'abc'):
+            res = self.client.get(
+                reverse('recipie-async:recipie-detail', args=[pk])
+            )
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_writes_not_allowed(self):
+        """Test the async routes only serve reads"""
+        res = self.client.post(
+            reverse('recipie-async:recipie-list'), {'title': 'x'}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    def test_auth_required(self):
+        """Test anonymous requests are refused"""
+        res = APIClient().get(reverse('recipie-async:recipie-list'))
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_asgi_request(self):
+        """Test a token authenticated request through the ASGI handler"""
+        token = await Token.objects.acreate(user=self.user)
+        client = AsyncClient()
+
+        res = await client.get(
+            reverse('recipie-async:recipie-list'),
+            AUTHORIZATION=f'Token {token.key}',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.json()['results']), 3)
@@ -0,0 +1,223 @@
+"""
+Tests for conditional requests on Recipie APIs
+"""
+
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipie, Tag
+
+RECIPIE_URL = reverse('recipie:recipie-list')
+TAG_URL = reverse('recipie:tag-list')
+
+
+# List validators need data versions shared between processes, as with
+# redis or memcached; the tests' locmem cache stands in for one
+shared_versions = patch(
+    'recipie.conditional.versions_shared', new=lambda: True
+)
+
+
+def detail_url(recipie_id):
+    """Create and return recipie detail URL"""
+    return reverse('recipie:recipie-detail', args=[recipie_id])
+
+
+def create_recipie(user, **params):
+    """Create and return a sample recipie"""
+    defaults = {
+        'title': 'Sample Recipie Title',
+        'time_minutes': 22,
+        'price': Decimal('50.25'),
+    }
+    defaults.update(params)
+    return Recipie.objects.create(user=user, **defaults)
+
+
+class ConditionalRequestTests(TestCase):
+    """Tests for ETag and Last-Modified handling"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='test@example.com',
+            password='testpassword123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipie = create_recipie(self.user)
+
+    def test_detail_has_validators(self):
+        """Test recipie detail returns ETag and Last-Modified"""
+        res = self.client.get(detail_url(self.recipie.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', res)
+
+    def test_detail_if_none_match_not_modified(self):
+        """Test a matching ETag returns 304 without serializing"""
+        res = self.client.get(detail_url(self.recipie.id))
+
+        with self.assertNumQueries(1):
+            res = self.client.get(
+                detail_url(self.recipie.id),
+                HTTP_IF_NONE_MATCH=res['ETag'],
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b'')
+
+    def test_detail_if_modified_since_not_modified(self):
+        """Test an up to date If-Modified-Since returns 304"""
+        res = self.client.get(detail_url(self.recipie.id))
+
+        res = self.client.get(
+            detail_url(self.recipie.id),
+            HTTP_IF_MODIFIED_SINCE=res['Last-Modified'],
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_detail_etag_changes_with_tag_links(self):
+        """Test linking a tag changes the recipie ETag"""
+        etag = self.client.get(detail_url(self.recipie.id))['ETag']
+
+        self.recipie.tags.add(Tag.objects.create(user=self.user, name='a'))
+        res = self.client.get(
+            detail_url(self.recipie.id), HTTP_IF_NONE_MATCH=etag
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+
+    def test_detail_etag_changes_with_tag_rename(self):
+        """Test renaming a linked tag changes the recipie ETag"""
+        tag = Tag.objects.create(user=self.user, name='a')
+        self.recipie.tags.add(tag)
+        etag = self.client.get(detail_url(self.recipie.id))['ETag']
+
+        tag.name = 'b'
+        tag.save()
+        res = self.client.get(
+            detail_url(self.recipie.id), HTTP_IF_NONE_MATCH=etag
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['tags'][0]['name'], 'b')
+
+    @shared_versions
+    def test_list_if_none_match_not_modified(self):
+        """Test an unchanged list returns 304 without queries"""
+        etag = self.client.get(RECIPIE_URL)['ETag']
+
+        with self.assertNumQueries(0):
+            res = self.client.get(RECIPIE_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+
+    def test_no_list_etag_from_local_versions(self):
+        """Test lists get no validators when versions are per process"""
+        caches = {
+            **settings.CACHES,
+            'responses': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            },
+        }
+        with self.settings(CACHES=caches):
+            res = self.client.get(RECIPIE_URL, HTTP_IF_NONE_MATCH='*')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('ETag', res)
+        self.assertNotIn('Last-Modified', res)
+
+    @shared_versions
+    def test_list_etag_changes_on_write(self):
+        """Test creating a recipie changes the list ETag"""
+        etag = self.client.get(RECIPIE_URL)['ETag']
+
+        create_recipie(self.user)
+        res = self.client.get(RECIPIE_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 2)
+
+    @shared_versions
+    def test_list_etag_varies_with_params(self):
+        """Test different query params have different ETags"""
+        etag = self.client.get(RECIPIE_URL)['ETag']
+
+        res = self.client.get(
+            RECIPIE_URL, {'page_size': 1}, HTTP_IF_NONE_MATCH=etag
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_update_if_match(self):
+        """Test updating with the current ETag succeeds"""
+        etag = self.client.get(detail_url(self.recipie.id))['ETag']
+
+        res = self.client.patch(
+            detail_url(self.recipie.id),
+            {'title': 'New title'},
+            HTTP_IF_MATCH=etag,
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        self.recipie.refresh_from_db()
+        self.assertEqual(self.recipie.title, 'New title')
+
+    def test_update_stale_if_match_fails(self):
+        """Test updating with a stale ETag fails and changes nothing"""
+        etag = self.client.get(detail_url(self.recipie.id))['ETag']
+        self.client.patch(detail_url(self.recipie.id), {'title': 'First'})
+
+        res = self.client.patch(
+            detail_url(self.recipie.id),
+            {'title': 'Second'},
+            HTTP_IF_MATCH=etag,
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.recipie.refresh_from_db()
+        self.assertEqual(self.recipie.title, 'First')
+
+    def test_update_etag_matches_detail(self):
+        """Test the ETag returned by an update matches a fresh GET"""
+        res = self.client.patch(detail_url(self.recipie.id), {'title': 'a'})
+
+        detail = self.client.get(detail_url(self.recipie.id))
+
+        self.assertEqual(res['ETag'], detail['ETag'])
+
+    def test_tag_update_if_match(self):
+        """Test tag updates honour If-Match"""
+        tag = Tag.objects.create(user=self.user, name='a')
+        url = reverse('recipie:tag-detail', args=[tag.id])
+        etag = self.client.patch(url, {'name': 'b'})['ETag']
+        self.client.patch(url, {'name': 'c'})
+
+        res = self.client.patch(url, {'name': 'd'}, HTTP_IF_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, 'c')
+
+    def test_update_missing_recipie_if_match(self):
+        """Test If-Match on an unknown recipie returns 404"""
+        res = self.client.patch(
+            detail_url(self.recipie.id + 1),
+            {'title': 'a'},
+            HTTP_IF_MATCH='"abc"',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
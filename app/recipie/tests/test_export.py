@@ -0,0 +1,160 @@
+"""
+Tests for streaming recipie export
+"""
+
+import csv
+import io
+import json
+from decimal import Decimal
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import AsyncClient, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.asgi import StreamingASGIHandler
+from core.models import Recipie, Tag
+from recipie.views import RecipieViewSets
+
+EXPORT_URL = reverse('recipie:recipie-export')
+
+
+def create_recipie(user, **params):
+    """Create and return a sample recipie"""
+    defaults = {
+        'title': 'Sample Recipie Title',
+        'time_minutes': 22,
+        'price': Decimal('50.25'),
+        'description': 'Sample description',
+    }
+    defaults.update(params)
+    return Recipie.objects.create(user=user, **defaults)
+
+
+class PublicExportTests(TestCase):
+    """Tests for unauthenticated export requests"""
+
+    def test_auth_required(self):
+        """Test auth is required to export"""
+        res = APIClient().get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateExportTests(TestCase):
+    """Tests for authenticated export requests"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='test@example.com',
+            password='testpassword123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_export_ndjson(self):
+        """Test exporting streams one JSON object per line"""
+        r1 = create_recipie(self.user, title='first')
+        r2 = create_recipie(self.user, title='second')
+        r2.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        create_recipie(
+            get_user_model().objects.create_user(
+                email='other@example.com', password='testpassword123'
+            )
+        )
+
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(res.streaming_content).decode().splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row['id'] for row in rows], [r2.id, r1.id])
+        self.assertEqual(rows[0]['tags'][0]['name'], 'Vegan')
+        self.assertEqual(rows[0]['price'], '50.25')
+        self.assertEqual(rows[0]['description'], 'Sample description')
+
+    def test_export_csv(self):
+        """Test exporting as CSV writes a header and one row per recipie"""
+        recipie = create_recipie(self.user, title='Curry, hot')
+        recipie.tags.add(
+            Tag.objects.create(user=self.user, name='Indian'),
+            Tag.objects.create(user=self.user, name='Spicy'),
+        )
+
+        res = self.client.get(EXPORT_URL, HTTP_ACCEPT='text/csv')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('recipies.csv', res['Content-Disposition'])
+        content = b''.join(res.streaming_content).decode()
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['title'], 'Curry, hot')
+        self.assertEqual(
+            sorted(rows[0]['tags'].split(', ')), ['Indian', 'Spicy']
+        )
+
+    def test_export_applies_filters(self):
+        """Test export honours the list filters"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipie = create_recipie(self.user)
+        recipie.tags.add(tag)
+        create_recipie(self.user)
+
+        res = self.client.get(EXPORT_URL, {'tags': tag.id})
+
+        lines = b''.join(res.streaming_content).splitlines()
+        ids = [json.loads(line)['id'] for line in lines]
+        self.assertEqual(ids, [recipie.id])
+
+    @patch.object(RecipieViewSets, 'export_chunk_size', 2)
+    def test_export_loads_relations_per_chunk(self):
+        """Test rows are fetched and prefetched in fixed size chunks"""
+        for i in range(5):
+            create_recipie(self.user, title=f'title{i}')
+
+        res = self.client.get(EXPORT_URL)
+        with CaptureQueriesContext(connection) as ctx:
+            lines = b''.join(res.streaming_content).splitlines()
+
+        self.assertEqual(len(lines), 5)
+        prefetches = [
+            q for q in ctx.captured_queries
+            if 'core_recipie_tags' in q['sql']
+        ]
+        self.assertEqual(len(prefetches), 3)
+
+    @patch.object(RecipieViewSets, 'export_chunk_size', 2)
+    async def test_export_over_asgi(self):
+        """Test the ASGI handler streams the export off the event loop"""
+        recipies = [
+            await sync_to_async(create_recipie)(self.user, title=f'title{i}')
+            for i in range(5)
+        ]
+        token = await Token.objects.acreate(user=self.user)
+        res = await AsyncClient().get(
+            EXPORT_URL, AUTHORIZATION=f'Token {token.key}'
+        )
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        # Iterating the body in the event loop would query the database
+        await StreamingASGIHandler().send_response(res, send)
+
+        self.assertEqual(messages[0]['status'], status.HTTP_200_OK)
+        self.assertEqual(messages[-1], {'type': 'http.response.body'})
+        body = b''.join(message.get('body', b'') for message in messages)
+        self.assertEqual(
+            [json.loads(line)['id'] for line in body.splitlines()],
+            [recipie.id for recipie in reversed(recipies)],
+        )
@@ -0,0 +1,162 @@
+"""
+Tests for background generation of recipie image variants
+"""
+
+import tempfile
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipie
+from recipie import images
+
+
+def image_upload_url(recipie_id):
+    return reverse('recipie:recipie-upload-image', args=[recipie_id])
+
+
+def detail_url(recipie_id):
+    return reverse('recipie:recipie-detail', args=[recipie_id])
+
+
+class ImageVariantTests(TestCase):
+    """Test thumbnail and WebP variants of uploaded images"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='variants@example.com',
+            password='testpass123',
+        )
+        self.client.force_authenticate(self.user)
+        self.recipie = Recipie.objects.create(
+            user=self.user,
+            title='Sample',
+            time_minutes=10,
+            price=Decimal('5.00'),
+        )
+
+    def tearDown(self):
+        self.recipie.refresh_from_db()
+        if self.recipie.image:
+            images.delete_variants(self.recipie.image.name)
+            self.recipie.image.delete()
+
+    def _upload(self, size=(1200, 800), color='red'):
+        """Upload an image, returning the response and scheduled jobs"""
+        with patch('recipie.images.get_executor') as get_executor:
+            with tempfile.NamedTemporaryFile(suffix='.png') as image_file:
+                Image.new('RGBA', size, color).save(image_file, format='PNG')
+                image_file.seek(0)
+                with self.captureOnCommitCallbacks(execute=True):
+                    res = self.client.post(
+                        image_upload_url(self.recipie.id),
+                        {'image': image_file},
+                        format='multipart',
+                    )
+        self.recipie.refresh_from_db()
+        return res, get_executor.return_value.submit.call_args_list
+
+    def test_upload_schedules_variants(self):
+        """Test uploading defers variant generation to the pool"""
+        res, jobs = self._upload()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(jobs), 1)
+        self.assertEqual(
+            jobs[0].args,
+            (
+                images._run,
+                self.recipie.id,
+                self.user.id,
+                self.recipie.image.name,
+            ),
+        )
+        self.assertEqual(self.recipie.image_variants, [])
+
+    def test_generate_variants(self):
+        """Test variants are written and exposed by the serializer"""
+        self._upload()
+
+        images.generate_variants(
+            self.recipie.id, self.user.id, self.recipie.image.name
+        )
+
+        self.recipie.refresh_from_db()
+        self.assertEqual(
+            sorted(self.recipie.image_variants), sorted(images.IMAGE_VARIANTS)
+        )
+        storage = self.recipie.image.storage
+        for variant, (box, image_format) in images.IMAGE_VARIANTS.items():
+            path = images.variant_name(self.recipie.image.name, variant)
+            with Image.open(storage.path(path)) as variant_image:
+                self.assertEqual(variant_image.format, image_format)
+                self.assertLessEqual(variant_image.width, box[0])
+                self.assertLessEqual(variant_image.height, box[1])
+
+        res = self.client.get(detail_url(self.recipie.id))
+
+        urls = res.data['image_variants']
+        self.assertEqual(set(urls), set(images.IMAGE_VARIANTS))
+        self.assertTrue(urls['thumbnail_webp'].startswith('http://'))
+        self.assertTrue(urls['thumbnail_webp'].endswith('.webp'))
+
+    def test_replaced_image_variants_not_recorded(self):
+        """Test variants of an image replaced meanwhile are not recorded"""
+        self._upload(color='green')
+        stale = self.recipie.image.name
+        self._upload(color='blue')
+
+        with patch('recipie.images.bump_data_version') as bump:
+            images.generate_variants(self.recipie.id, self.user.id, stale)
+
+        bump.assert_not_called()
+        self.recipie.refresh_from_db()
+        self.assertNotEqual(self.recipie.image.name, stale)
+        self.assertEqual(self.recipie.image_variants, [])
+        images.delete_variants(stale)
+        self.recipie.image.storage.delete(stale)
+
+    def test_recorded_variants_invalidate_responses(self):
+        """Test recording variants bumps the owner's data version once"""
+        self._upload()
+
+        with patch('recipie.images.bump_data_version') as bump:
+            images.generate_variants(
+                self.recipie.id, self.user.id, self.recipie.image.name
+            )
+
+        bump.assert_called_once_with(self.user.id)
+
+    def test_shared_image_reuses_variants(self):
+        """Test variants of identical uploads are generated only once"""
+        self._upload()
+        images.generate_variants(
+            self.recipie.id, self.user.id, self.recipie.image.name
+        )
+        other = Recipie.objects.create(
+            user=self.user, title='Other', time_minutes=1, price=Decimal('1')
+        )
+        other.image = self.recipie.image.name
+        other.save()
+
+        with patch('recipie.images.render_variant') as render_variant:
+            images.generate_variants(
+                other.id, self.user.id, other.image.name
+            )
+
+        render_variant.assert_not_called()
+        other.refresh_from_db()
+        self.assertEqual(other.image_variants, list(images.IMAGE_VARIANTS))
+
+    def test_no_image_no_variants(self):
+        """Test recipies without an image list no variants"""
+        res = self.client.get(detail_url(self.recipie.id))
+
+        self.assertEqual(res.data['image_variants'], {})
@@ -63,7 +63,7 @@ class PrivateIngredientApiTest(TestCase):
         serializer = IngredientSerializer(ingredients, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_ingredients_limited_to_user(self):
         """Test ingredient limited to authenticate user"""
@@ -79,9 +79,9 @@ class PrivateIngredientApiTest(TestCase):
         res = self.client.get(INGREDIENT_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], ingredient.name)
-        self.assertEqual(res.data[0]['id'], ingredient.id)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], ingredient.name)
+        self.assertEqual(res.data['results'][0]['id'], ingredient.id)
 
     def test_ingredient_update(self):
         """Test updating an existing ingredient"""
@@ -138,8 +138,8 @@ class PrivateIngredientApiTest(TestCase):
         s1 = IngredientSerializer(ingredient1)
         s2 = IngredientSerializer(ingredient2)
 
-        self.assertIn(s1.data, res.data)
-        self.assertNotIn(s2.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertNotIn(s2.data, res.data['results'])
 
     def test_filtered_ingredients_unique(self):
         """Test filtered ingredients returns a unique list"""
@@ -171,4 +171,4 @@ class PrivateIngredientApiTest(TestCase):
 
         res = self.client.get(INGREDIENT_URL, {'assigned_only': 1})
 
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data['results']), 1)
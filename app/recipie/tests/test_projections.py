@@ -0,0 +1,126 @@
+"""
+Tests for the lean list read path
+"""
+
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipie, Tag, Ingredient
+from recipie.cache import RESPONSE_CACHE_ALIAS
+from recipie.projections import ProjectedListMixin
+
+RECIPIES_URL = reverse('recipie:recipie-list')
+
+
+class ProjectionParityTests(TestCase):
+    """Test projected lists render exactly like serialized lists"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='projection@example.com',
+            password='testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        tags = [
+            Tag.objects.create(user=self.user, name=name)
+            for name in ('Dîner', 'Spicy', 'Quick')
+        ]
+        ingredients = [
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ('Salt', 'Crème fraîche')
+        ]
+        for i, price in enumerate(
+            ['5.00', '0.50', '999.99', '12.30', '7']
+        ):
+            recipie = Recipie.objects.create(
+                user=self.user,
+                title=f'Curry number {i}',
+                description='A spicy curry' if i % 2 else 'Mild soup',
+                time_minutes=i * 7,
+                price=Decimal(price),
+                link='' if i % 2 else f'https://example.com/{i}',
+            )
+            # Linked out of id order
+            recipie.tags.add(*reversed(tags[:i % 4]))
+            recipie.ingredients.add(*ingredients[i % 2:])
+        Recipie.objects.filter(id=recipie.id).update(
+            image='upload/recipie/ab/cd/abcd.jpg',
+            image_variants=['thumbnail', 'retired', 'medium_webp'],
+        )
+
+    def _get(self, url, params, projected):
+        caches[RESPONSE_CACHE_ALIAS].clear()
+        with patch.object(ProjectedListMixin, 'projected_list', projected):
+            return self.client.get(url, params)
+
+    def assertSameBytes(self, url, params=None):
+        serialized = self._get(url, params, projected=False)
+        projected = self._get(url, params, projected=True)
+
+        self.assertEqual(projected.status_code, serialized.status_code)
+        self.assertEqual(projected.content, serialized.content)
+        return projected
+
+    def test_recipie_lists(self):
+        """Test field selection, filters, search and paging"""
+        tag = Tag.objects.get(name='Spicy')
+        for params in (
+            None,
+            {'fields': 'id,price,image,image_variants'},
+            {'fields': 'title,tags', 'expand': 'tags'},
+            {'expand': ''},
+            {'expand': 'ingredients'},
+            {'tags': str(tag.id), 'match': 'all'},
+            {'q': 'spicy curry'},
+            {'q': 'curry', 'page_size': 2},
+            {'page_size': 2},
+            {'fields': 'nope'},
+        ):
+            with self.subTest(params=params):
+                self.assertSameBytes(RECIPIES_URL, params)
+
+    def test_following_pages(self):
+        """Test cursors from projected pages lead to the same pages"""
+        res = self.assertSameBytes(RECIPIES_URL, {'page_size': 2})
+        while res.data['next']:
+            res = self.assertSameBytes(res.data['next'])
+
+    def test_msgpack(self):
+        """Test MessagePack bodies are the same too"""
+        self.client.credentials(HTTP_ACCEPT='application/msgpack')
+
+        res = self.assertSameBytes(RECIPIES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_attribute_lists(self):
+        """Test tag and ingredient lists"""
+        for name in ('recipie:tag-list', 'recipie:ingredient-list'):
+            for params in (None, {'assigned_only': 1}, {'page_size': 1}):
+                with self.subTest(url=name, params=params):
+                    self.assertSameBytes(reverse(name), params)
+
+    def test_async_list(self):
+        """Test the async list serves projected rows"""
+        serialized = self._get(RECIPIES_URL, None, projected=False)
+        res = self._get(
+            reverse('recipie-async:recipie-list'), None, projected=True
+        )
+
+        self.assertEqual(res.json()['results'], serialized.json()['results'])
+
+    def test_single_query(self):
+        """Test a page with relations is read in one query"""
+        caches[RESPONSE_CACHE_ALIAS].clear()
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPIES_URL)
+
+        self.assertEqual(len(res.data['results']), 5)
@@ -8,11 +8,19 @@ from django.test import TestCase
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from core.models import Recipie, Tag, Ingredient
-from recipie.serializers import RecipieSerializer, RecipieDetailSerializer
+from recipie.pagination import RecipieCursorPagination
+from recipie.serializers import (
+    RecipieSerializer,
+    RecipieDetailSerializer,
+    RecipieListSerializer,
+)
 
 import tempfile
 import os
+from unittest.mock import patch
 from PIL import Image  # Pillow Library
 
 
@@ -90,7 +98,7 @@ class PrivateRecipieAPITests(TestCase):
         serializer = RecipieSerializer(recipies, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_recipie_list_limited_to_user(self):
         """Test list of recipies is limited to authenticated user"""
@@ -109,7 +117,7 @@ class PrivateRecipieAPITests(TestCase):
         serializer = RecipieSerializer(recipies, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(serializer.data, res.data)
+        self.assertEqual(serializer.data, res.data['results'])
 
     def test_get_recipie_detail(self):
         """Test for Recipie Detail View"""
@@ -474,6 +482,73 @@ class PrivateRecipieAPITests(TestCase):
 
         self.assertEqual(recipie.ingredients.count(), 0)
 
+    def test_create_recipie_query_count_constant(self):
+        """Test creating a recipie does not run a query per tag"""
+        def payload(count):
+            return {
+                'title': 'title',
+                'time_minutes': 10,
+                'price': Decimal('5.00'),
+                'tags': [{'name': f'tag{i}'} for i in range(count)],
+                'ingredients': [{'name': f'ing{i}'} for i in range(count)],
+            }
+
+        with CaptureQueriesContext(connection) as small:
+            self.client.post(RECIPIE_URL, payload(1), format='json')
+
+        Tag.objects.all().delete()
+        Ingredient.objects.all().delete()
+        with CaptureQueriesContext(connection) as large:
+            res = self.client.post(RECIPIE_URL, payload(10), format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data['tags']), 10)
+        self.assertEqual(len(small), len(large))
+
+    def test_update_recipie_tags_applies_difference(self):
+        """Test updating tags keeps unchanged links and swaps the rest"""
+        recipie = create_recipie(user=self.user)
+        keep = Tag.objects.create(user=self.user, name='keep')
+        drop = Tag.objects.create(user=self.user, name='drop')
+        recipie.tags.add(keep, drop)
+        link = Recipie.tags.through.objects.get(recipie=recipie, tag=keep)
+
+        payload = {'tags': [{'name': 'keep'}, {'name': 'new'}]}
+        res = self.client.patch(
+            detail_url(recipie.id), payload, format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            sorted(t.name for t in recipie.tags.all()),
+            ['keep', 'new'],
+        )
+        self.assertTrue(
+            Recipie.tags.through.objects.filter(id=link.id).exists()
+        )
+
+    def test_update_recipie_query_count_constant(self):
+        """Test updating tags does not run a query per tag"""
+        recipie = create_recipie(user=self.user)
+        url = detail_url(recipie.id)
+
+        def payload(count, prefix):
+            return {
+                'tags': [{'name': f'{prefix}{i}'} for i in range(count)],
+            }
+
+        self.client.patch(url, payload(1, 'a'), format='json')
+        with CaptureQueriesContext(connection) as small:
+            self.client.patch(url, payload(1, 'b'), format='json')
+
+        self.client.patch(url, payload(10, 'c'), format='json')
+        with CaptureQueriesContext(connection) as large:
+            res = self.client.patch(url, payload(10, 'd'), format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['tags']), 10)
+        self.assertEqual(len(small), len(large))
+
     def test_filter_by_tags(self):
         '''Test filter recipies by tags'''
         r1 = create_recipie(user=self.user, title='title1')
@@ -500,9 +575,9 @@ class PrivateRecipieAPITests(TestCase):
         s2 = RecipieSerializer(r2)
         s3 = RecipieSerializer(r3)
 
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertIn(s2.data, res.data['results'])
+        self.assertNotIn(s3.data, res.data['results'])
 
     def test_filter_by_ingredients(self):
         '''Test filter recipies by Ingredients'''
@@ -530,9 +605,410 @@ class PrivateRecipieAPITests(TestCase):
         s2 = RecipieSerializer(r2)
         s3 = RecipieSerializer(r3)
 
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertIn(s2.data, res.data['results'])
+        self.assertNotIn(s3.data, res.data['results'])
+
+    def test_filter_by_all_tags(self):
+        """Test match=all returns recipies having every given tag"""
+        tag1 = Tag.objects.create(user=self.user, name='tag1')
+        tag2 = Tag.objects.create(user=self.user, name='tag2')
+        r1 = create_recipie(user=self.user, title='title1')
+        r1.tags.add(tag1, tag2)
+        r2 = create_recipie(user=self.user, title='title2')
+        r2.tags.add(tag1)
+
+        params = {'tags': f'{tag1.id},{tag2.id}', 'match': 'all'}
+        res = self.client.get(RECIPIE_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['id'] for r in res.data['results']], [r1.id])
+
+    def test_filter_by_all_ingredients(self):
+        """Test match=all applies to ingredients"""
+        ing1 = Ingredient.objects.create(user=self.user, name='ing1')
+        ing2 = Ingredient.objects.create(user=self.user, name='ing2')
+        r1 = create_recipie(user=self.user, title='title1')
+        r1.ingredients.add(ing1, ing2)
+        r2 = create_recipie(user=self.user, title='title2')
+        r2.ingredients.add(ing2)
+
+        params = {'ingredients': f'{ing1.id},{ing2.id}', 'match': 'all'}
+        res = self.client.get(RECIPIE_URL, params)
+
+        self.assertEqual([r['id'] for r in res.data['results']], [r1.id])
+
+    def test_filter_by_any_tags_unique(self):
+        """Test recipies matching several tags are listed once"""
+        tag1 = Tag.objects.create(user=self.user, name='tag1')
+        tag2 = Tag.objects.create(user=self.user, name='tag2')
+        recipie = create_recipie(user=self.user)
+        recipie.tags.add(tag1, tag2)
+
+        params = {'tags': f'{tag1.id},{tag2.id}'}
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPIE_URL, params)
+
+        self.assertEqual(
+            [r['id'] for r in res.data['results']],
+            [recipie.id],
+        )
+        for query in ctx.captured_queries:
+            self.assertNotIn('DISTINCT', query['sql'].upper())
+
+    def test_filter_invalid_match_error(self):
+        """Test an unknown match mode returns an error"""
+        res = self.client.get(RECIPIE_URL, {'tags': '1', 'match': 'some'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def _bulk_payload(self, count):
+        """Return a list of recipie payloads sharing tags"""
+        return [
+            {
+                'title': f'title{i}',
+                'time_minutes': 10 + i,
+                'price': '5.00',
+                'tags': [{'name': 'Shared'}, {'name': f'tag{i}'}],
+                'ingredients': [{'name': 'salt'}],
+            }
+            for i in range(count)
+        ]
+
+    def test_bulk_create_recipies(self):
+        """Test creating many recipies with one request"""
+        Tag.objects.create(user=self.user, name='Shared')
+        payload = self._bulk_payload(3)
+
+        res = self.client.post(RECIPIE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data), 3)
+        self.assertEqual(Recipie.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(Tag.objects.filter(name='Shared').count(), 1)
+        self.assertEqual(Ingredient.objects.filter(name='salt').count(), 1)
+        for item, data in zip(payload, res.data):
+            recipie = Recipie.objects.get(id=data['id'])
+            self.assertEqual(recipie.title, item['title'])
+            self.assertEqual(recipie.user, self.user)
+            self.assertEqual(
+                sorted(t.name for t in recipie.tags.all()),
+                sorted(t['name'] for t in item['tags']),
+            )
+            self.assertEqual(
+                [i.name for i in recipie.ingredients.all()],
+                ['salt'],
+            )
+
+    def test_bulk_create_query_count_constant(self):
+        """Test bulk create runs the same queries for any batch size"""
+        with CaptureQueriesContext(connection) as small:
+            self.client.post(RECIPIE_URL, self._bulk_payload(2), format='json')
+
+        Recipie.objects.all().delete()
+        Tag.objects.all().delete()
+        Ingredient.objects.all().delete()
+        with CaptureQueriesContext(connection) as large:
+            res = self.client.post(
+                RECIPIE_URL, self._bulk_payload(20), format='json'
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(small), len(large))
+
+    def test_bulk_create_reports_item_errors(self):
+        """Test invalid items are reported and nothing is created"""
+        payload = self._bulk_payload(3)
+        del payload[1]['title']
+
+        res = self.client.post(RECIPIE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('title', res.data[1])
+        self.assertEqual(res.data[2], {})
+        self.assertFalse(Recipie.objects.exists())
+
+    @patch.object(RecipieListSerializer, 'max_batch_size', 2)
+    def test_bulk_create_too_many_items_error(self):
+        """Test batches over the size limit are rejected unvalidated"""
+        with patch.object(RecipieSerializer, 'run_validation') as child:
+            res = self.client.post(
+                RECIPIE_URL, self._bulk_payload(3), format='json'
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('non_field_errors', res.data)
+        child.assert_not_called()
+        self.assertFalse(Recipie.objects.exists())
+
+    def test_list_sparse_fields(self):
+        """Test ?fields= limits the response and the selected columns"""
+        recipie = create_recipie(user=self.user)
+        recipie.tags.add(Tag.objects.create(user=self.user, name='tag'))
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPIE_URL, {'fields': 'id,title'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data['results'],
+            [{'id': recipie.id, 'title': recipie.title}],
+        )
+        self.assertEqual(len(ctx), 1)
+        self.assertNotIn('"price"', ctx.captured_queries[0]['sql'])
+
+    def test_detail_sparse_fields_defers_description(self):
+        """Test detail ?fields= skips loading the description"""
+        recipie = create_recipie(user=self.user)
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(
+                detail_url(recipie.id), {'fields': 'id,price'}
+            )
+
+        self.assertEqual(dict(res.data), {'id': recipie.id, 'price': '50.25'})
+        for query in ctx.captured_queries:
+            self.assertNotIn('"description"', query['sql'])
+
+    def test_list_collapsed_relations(self):
+        """Test relations left out of ?expand= are returned as ids"""
+        recipie = create_recipie(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='tag')
+        ingredient = Ingredient.objects.create(user=self.user, name='salt')
+        recipie.tags.add(tag)
+        recipie.ingredients.add(ingredient)
+
+        res = self.client.get(RECIPIE_URL, {'expand': 'tags'})
+
+        item = res.data['results'][0]
+        self.assertEqual(item['tags'], [{'id': tag.id, 'name': 'tag'}])
+        self.assertEqual(item['ingredients'], [ingredient.id])
+
+        res = self.client.get(RECIPIE_URL, {'expand': ''})
+
+        item = res.data['results'][0]
+        self.assertEqual(item['tags'], [tag.id])
+        self.assertEqual(item['ingredients'], [ingredient.id])
+
+    def test_default_response_unchanged_by_sparse_support(self):
+        """Test responses are complete without ?fields= or ?expand="""
+        recipie = create_recipie(user=self.user)
+        recipie.tags.add(Tag.objects.create(user=self.user, name='tag'))
+
+        res = self.client.get(detail_url(recipie.id))
+
+        recipie.refresh_from_db()
+        self.assertEqual(res.data, RecipieDetailSerializer(recipie).data)
+
+    def test_sparse_unknown_field_error(self):
+        """Test unknown names in ?fields= or ?expand= return an error"""
+        res = self.client.get(RECIPIE_URL, {'fields': 'id,description'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(RECIPIE_URL, {'expand': 'image'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_sparse_fields_ignored_on_write(self):
+        """Test ?fields= does not restrict writable fields"""
+        recipie = create_recipie(user=self.user)
+
+        res = self.client.patch(
+            f'{detail_url(recipie.id)}?fields=id',
+            {'title': 'New title'},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['title'], 'New title')
+
+    def test_search_recipies(self):
+        """Test ?q= returns matching recipies ranked by relevance"""
+        in_description = create_recipie(
+            user=self.user,
+            title='Weeknight dinner',
+            description='A quick prawn curry',
+        )
+        in_title = create_recipie(
+            user=self.user,
+            title='Prawn curry',
+            description='Spicy',
+        )
+        create_recipie(user=self.user, title='Pancakes', description='Sweet')
+
+        res = self.client.get(RECIPIE_URL, {'q': 'curries'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [r['id'] for r in res.data['results']],
+            [in_title.id, in_description.id],
+        )
+
+    def test_search_follows_updates_and_bulk_create(self):
+        """Test the search vector is maintained on every write path"""
+        recipie = create_recipie(user=self.user, title='Pancakes')
+        recipie.title = 'Lemon tart'
+        recipie.save()
+        self.client.post(
+            RECIPIE_URL,
+            [{'title': 'Lemon cake', 'time_minutes': 5, 'price': '1.00'}],
+            format='json',
+        )
+
+        res = self.client.get(RECIPIE_URL, {'q': 'lemon'})
+
+        self.assertEqual(
+            sorted(r['title'] for r in res.data['results']),
+            ['Lemon cake', 'Lemon tart'],
+        )
+
+    def test_search_with_tag_filter(self):
+        """Test ?q= combines with tag filters"""
+        tag = Tag.objects.create(user=self.user, name='Dinner')
+        r1 = create_recipie(user=self.user, title='Prawn curry')
+        r1.tags.add(tag)
+        create_recipie(user=self.user, title='Chicken curry')
+
+        res = self.client.get(RECIPIE_URL, {'q': 'curry', 'tags': tag.id})
+
+        self.assertEqual([r['id'] for r in res.data['results']], [r1.id])
+
+    def test_search_results_paginate(self):
+        """Test ranked search results page without repeats"""
+        for i in range(4):
+            create_recipie(
+                user=self.user,
+                title='curry ' * (i + 1),
+                description='curry',
+            )
+
+        seen = []
+        res = self.client.get(RECIPIE_URL, {'q': 'curry', 'page_size': 1})
+        for _ in range(5):
+            seen += [r['id'] for r in res.data['results']]
+            if not res.data['next']:
+                break
+            res = self.client.get(res.data['next'])
+
+        self.assertEqual(len(seen), 4)
+        self.assertEqual(len(set(seen)), 4)
+
+    @patch.object(RecipieCursorPagination, 'offset_cutoff', 1)
+    def test_search_tied_ranks_paginate(self):
+        """Test equally ranked results past the offset cutoff all page"""
+        recipies = [
+            create_recipie(user=self.user, title='curry', description='')
+            for _ in range(5)
+        ]
+
+        seen = []
+        res = self.client.get(RECIPIE_URL, {'q': 'curry', 'page_size': 1})
+        for _ in range(6):
+            seen += [r['id'] for r in res.data['results']]
+            if not res.data['next']:
+                break
+            res = self.client.get(res.data['next'])
+
+        self.assertEqual(seen, [r.id for r in reversed(recipies)])
+
+        previous = self.client.get(res.data['previous'])
+        self.assertEqual(
+            [r['id'] for r in previous.data['results']], [recipies[1].id]
+        )
+
+    def test_recipie_list_cursor_pagination(self):
+        """Test recipie list is paginated with an opaque cursor"""
+        recipies = [
+            create_recipie(user=self.user, title=f'title{i}')
+            for i in range(5)
+        ]
+
+        res = self.client.get(RECIPIE_URL, {'page_size': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', res.data)
+        self.assertIsNone(res.data['previous'])
+        self.assertEqual(
+            [r['id'] for r in res.data['results']],
+            [recipies[4].id, recipies[3].id],
+        )
+
+        seen = []
+        next_url = res.data['next']
+        while next_url:
+            res = self.client.get(next_url)
+            seen += [r['id'] for r in res.data['results']]
+            next_url = res.data['next']
+
+        self.assertEqual(
+            seen,
+            [recipies[2].id, recipies[1].id, recipies[0].id],
+        )
+
+    def test_recipie_list_pagination_skips_count(self):
+        """Test paginating recipies never runs COUNT or OFFSET"""
+        for i in range(3):
+            create_recipie(user=self.user, title=f'title{i}')
+
+        res = self.client.get(RECIPIE_URL, {'page_size': 1})
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(res.data['next'])
+
+        for query in ctx.captured_queries:
+            self.assertNotIn('COUNT(', query['sql'].upper())
+            self.assertNotIn('OFFSET', query['sql'].upper())
+
+    def _create_tagged_recipies(self, count):
+        """Create recipies each with its own tag and ingredient"""
+        for i in range(count):
+            recipie = create_recipie(user=self.user, title=f'title{i}')
+            recipie.tags.add(
+                Tag.objects.create(user=self.user, name=f'tag{i}')
+            )
+            recipie.ingredients.add(
+                Ingredient.objects.create(user=self.user, name=f'ing{i}')
+            )
+            yield recipie
+
+    def test_recipie_list_query_count_constant(self):
+        """Test listing recipies does not run a query per row"""
+        list(self._create_tagged_recipies(2))
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(RECIPIE_URL)
+
+        list(self._create_tagged_recipies(10))
+        with CaptureQueriesContext(connection) as large:
+            res = self.client.get(RECIPIE_URL)
+
+        self.assertEqual(len(res.data['results']), 12)
+        self.assertEqual(len(small), len(large))
+
+    def test_recipie_filtered_list_query_count_constant(self):
+        """Test filtering recipies keeps relations batched"""
+        tag_ids = [
+            str(r.tags.get().id) for r in self._create_tagged_recipies(2)
+        ]
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(RECIPIE_URL, {'tags': ','.join(tag_ids)})
+
+        tag_ids += [
+            str(r.tags.get().id) for r in self._create_tagged_recipies(10)
+        ]
+        with CaptureQueriesContext(connection) as large:
+            res = self.client.get(RECIPIE_URL, {'tags': ','.join(tag_ids)})
+
+        self.assertEqual(len(res.data['results']), 12)
+        self.assertEqual(len(small), len(large))
+
+    def test_recipie_detail_prefetches_relations(self):
+        """Test recipie detail loads each relation in one query"""
+        recipie = next(self._create_tagged_recipies(1))
+        recipie.tags.add(Tag.objects.create(user=self.user, name='extra'))
+
+        # ETag validator lookup, the recipie and one query per relation
+        with self.assertNumQueries(4):
+            res = self.client.get(detail_url(recipie.id))
+
+        self.assertEqual(len(res.data['tags']), 2)
 
 
 class ImageUploadTest(TestCase):
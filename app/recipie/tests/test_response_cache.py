@@ -0,0 +1,188 @@
+"""
+Tests for the versioned response cache
+"""
+
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipie, Tag
+from recipie import cache
+from recipie.cache import RESPONSE_CACHE_ALIAS, cache_stats
+
+RECIPIE_URL = reverse('recipie:recipie-list')
+TAG_URL = reverse('recipie:tag-list')
+
+
+def create_recipie(user, **params):
+    """Create and return a sample recipie"""
+    defaults = {
+        'title': 'Sample Recipie Title',
+        'time_minutes': 22,
+        'price': Decimal('50.25'),
+    }
+    defaults.update(params)
+    return Recipie.objects.create(user=user, **defaults)
+
+
+class ResponseCacheTests(TestCase):
+    """Tests for cached list responses"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='test@example.com',
+            password='testpassword123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_repeated_list_served_from_cache(self):
+        """Test a repeated list request does not hit the database"""
+        create_recipie(self.user)
+        res = self.client.get(RECIPIE_URL)
+        self.assertEqual(res['X-Cache'], 'MISS')
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(RECIPIE_URL)
+
+        self.assertEqual(cached.status_code, status.HTTP_200_OK)
+        self.assertEqual(cached['X-Cache'], 'HIT')
+        self.assertEqual(cached.data, res.data)
+
+    def test_create_invalidates_cache(self):
+        """Test creating a recipie bumps the user's version"""
+        self.client.get(RECIPIE_URL)
+
+        recipie = create_recipie(self.user)
+        res = self.client.get(RECIPIE_URL)
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['results'][0]['id'], recipie.id)
+
+    def test_link_change_invalidates_cache(self):
+        """Test adding a tag to a recipie bumps the user's version"""
+        recipie = create_recipie(self.user)
+        self.client.get(RECIPIE_URL)
+
+        recipie.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        res = self.client.get(RECIPIE_URL)
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['results'][0]['tags'][0]['name'], 'Vegan')
+
+    def test_tag_update_invalidates_cache(self):
+        """Test renaming a tag invalidates the tag list"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.client.get(TAG_URL)
+
+        tag.name = 'Dessert'
+        tag.save()
+        res = self.client.get(TAG_URL)
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['results'][0]['name'], 'Dessert')
+
+    def test_query_params_cached_separately(self):
+        """Test different filters do not share cache entries"""
+        self.client.get(RECIPIE_URL, {'tags': '1'})
+
+        res = self.client.get(RECIPIE_URL, {'tags': '2'})
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+
+    def test_query_param_order_normalized(self):
+        """Test reordered query params share a cache entry"""
+        self.client.get(RECIPIE_URL, {'tags': '1', 'match': 'all'})
+
+        res = self.client.get(f'{RECIPIE_URL}?match=all&tags=1')
+
+        self.assertEqual(res['X-Cache'], 'HIT')
+
+    def test_cache_limited_to_user(self):
+        """Test users never receive each other's cached responses"""
+        create_recipie(self.user)
+        self.client.get(RECIPIE_URL)
+
+        other = get_user_model().objects.create_user(
+            email='other@example.com',
+            password='testpassword123',
+        )
+        self.client.force_authenticate(other)
+        res = self.client.get(RECIPIE_URL)
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['results'], [])
+
+    def test_version_shared_between_processes(self):
+        """Test a bump through another cache instance is seen"""
+        self.client.get(RECIPIE_URL)
+        self.assertEqual(self.client.get(RECIPIE_URL)['X-Cache'], 'HIT')
+
+        # As a management command or another worker would see the cache
+        other = caches.create_connection(RESPONSE_CACHE_ALIAS)
+        with patch.object(cache, 'caches', {RESPONSE_CACHE_ALIAS: other}):
+            cache.bump_data_version(self.user.pk)
+
+        self.assertEqual(self.client.get(RECIPIE_URL)['X-Cache'], 'MISS')
+
+    def test_bump_after_read_in_transaction(self):
+        """Test a write after reading the list in a transaction is seen"""
+        create_recipie(self.user)
+        self.client.get(RECIPIE_URL)
+
+        create_recipie(self.user)
+        res = self.client.get(RECIPIE_URL)
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(len(res.data['results']), 2)
+
+    def test_cache_stats(self):
+        """Test hits and misses are counted"""
+        before = cache_stats()
+
+        self.client.get(TAG_URL)
+        self.client.get(TAG_URL)
+
+        after = cache_stats()
+        self.assertEqual(after['hits'] - before['hits'], 1)
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertGreater(after['hit_rate'], 0)
+
+
+class VersionBumpTests(TransactionTestCase):
+    """Tests for data version bumps in committed transactions"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='test@example.com',
+            password='testpassword123',
+        )
+
+    def test_cascade_bumps_version_once(self):
+        """Test deleting many rows bumps the version once, then on commit"""
+        for _ in range(5):
+            create_recipie(self.user)
+
+        with patch.object(
+            cache, '_incr_data_version', wraps=cache._incr_data_version
+        ) as incr:
+            Recipie.objects.filter(user=self.user).delete()
+
+        self.assertEqual(incr.call_count, 2)
+
+    def test_autocommit_writes_bump_each(self):
+        """Test writes outside a transaction each bump the version"""
+        with patch.object(
+            cache, '_incr_data_version', wraps=cache._incr_data_version
+        ) as incr:
+            create_recipie(self.user)
+            create_recipie(self.user)
+
+        self.assertEqual(incr.call_count, 2)
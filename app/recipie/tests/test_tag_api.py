@@ -3,6 +3,7 @@ Tests for Tag API's
 """
 
 from decimal import Decimal
+from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
 from django.urls import reverse
@@ -12,6 +13,7 @@ from rest_framework import status
 from rest_framework.test import APIClient
 
 from core.models import Tag, Recipie
+from recipie.pagination import RecipieCursorPagination
 from recipie.serializers import TagSerializer
 
 TAG_URL = reverse("recipie:tag-list")
@@ -60,7 +62,7 @@ class PrivateTagsAPITest(TestCase):
         serializer = TagSerializer(tags, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_tags_limited_to_user(self):
         """Test lsit of tags related to authenticate user"""
@@ -72,9 +74,9 @@ class PrivateTagsAPITest(TestCase):
         res = self.client.get(TAG_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], tag.name)
-        self.assertEqual(res.data[0]['id'], tag.id)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], tag.name)
+        self.assertEqual(res.data['results'][0]['id'], tag.id)
 
     def test_update_tag(self):
         """Test Update Tag"""
@@ -129,8 +131,8 @@ class PrivateTagsAPITest(TestCase):
         s1 = TagSerializer(tag1)
         s2 = TagSerializer(tag2)
 
-        self.assertIn(s1.data, res.data)
-        self.assertNotIn(s2.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertNotIn(s2.data, res.data['results'])
 
     def test_filtered_tags_unique(self):
         """Test filtered tags returns a unique list"""
@@ -162,4 +164,39 @@ class PrivateTagsAPITest(TestCase):
 
         res = self.client.get(TAG_URL, {'assigned_only': 1})
 
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_tags_cursor_pagination(self):
+        """Test tags are paginated by name with an opaque cursor"""
+        for name in ['a', 'b', 'c']:
+            Tag.objects.create(user=self.user, name=name)
+
+        res = self.client.get(TAG_URL, {'page_size': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [t['name'] for t in res.data['results']],
+            ['c', 'b'],
+        )
+
+        res = self.client.get(res.data['next'])
+
+        self.assertEqual([t['name'] for t in res.data['results']], ['a'])
+        self.assertIsNone(res.data['next'])
+
+    @patch.object(RecipieCursorPagination, 'offset_cutoff', 1)
+    def test_tags_same_name_paginate(self):
+        """Test tags sharing a name page by id without repeats"""
+        tags = [
+            Tag.objects.create(user=self.user, name='same') for _ in range(4)
+        ]
+
+        seen = []
+        res = self.client.get(TAG_URL, {'page_size': 1})
+        for _ in range(5):
+            seen += [t['id'] for t in res.data['results']]
+            if not res.data['next']:
+                break
+            res = self.client.get(res.data['next'])
+
+        self.assertEqual(seen, [t.id for t in reversed(tags)])
@@ -0,0 +1,198 @@
+"""
+Tests for bounded and hardened recipie image uploads
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image, ImageFile
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipie
+
+# Writes a large JPEG without growing the memory of the test process
+MAKE_LARGE_JPEG = '''
+import sys
+from PIL import Image
+Image.linear_gradient('L').resize((6000, 4000)).convert('RGB').save(
+    sys.argv[1], format='JPEG', quality=70
+)
+'''
+
+# Processes the large JPEG on several threads and prints the sizes made
+# and how much the peak memory of the process grew meanwhile
+PROCESS_CONCURRENTLY = '''
+import json
+import resource
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+django.setup()
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from PIL import Image
+from recipie.uploads import process_image
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def process(_):
+    upload = TemporaryUploadedFile('large.jpg', 'image/jpeg', 0, None)
+    with open(sys.argv[1], 'rb') as source:
+        upload.write(source.read())
+    upload.seek(0)
+    with process_image(upload) as output:
+        return Image.open(output).size
+
+
+before = peak_rss_mb()
+with ThreadPoolExecutor(max_workers=4) as executor:
+    sizes = sorted(set(executor.map(process, range(8))))
+print(json.dumps({'sizes': sizes, 'growth': peak_rss_mb() - before}))
+'''
+
+
+def image_upload_url(recipie_id):
+    return reverse('recipie:recipie-upload-image', args=[recipie_id])
+
+
+class ImageUploadLimitTests(TestCase):
+    """Test limits applied to uploaded images"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.large_jpeg = os.path.join(cls.tmpdir.name, 'large.jpg')
+        subprocess.run(
+            [sys.executable, '-c', MAKE_LARGE_JPEG, cls.large_jpeg],
+            check=True,
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='uploads@example.com',
+            password='testpass123',
+        )
+        self.client.force_authenticate(self.user)
+        self.recipie = Recipie.objects.create(
+            user=self.user,
+            title='Sample',
+            time_minutes=10,
+            price=Decimal('5.00'),
+        )
+
+    def tearDown(self):
+        self.recipie.refresh_from_db()
+        if self.recipie.image:
+            self.recipie.image.delete()
+
+    def _post(self, path):
+        with patch('recipie.images.get_executor'):
+            with open(path, 'rb') as image_file:
+                return self.client.post(
+                    image_upload_url(self.recipie.id),
+                    {'image': image_file},
+                    format='multipart',
+                )
+
+    def _save(self, image, name, **options):
+        path = os.path.join(self.tmpdir.name, name)
+        image.save(path, **options)
+        return path
+
+    def test_large_image_downscaled(self):
+        """Test large images are stored scaled to the maximum dimension"""
+        res = self._post(self.large_jpeg)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipie.refresh_from_db()
+        with Image.open(self.recipie.image.path) as stored:
+            self.assertEqual(stored.format, 'JPEG')
+            self.assertEqual(stored.size, (2048, 1365))
+
+    def test_metadata_stripped(self):
+        """Test EXIF data is removed and orientation applied"""
+        exif = Image.Exif()
+        exif[0x010f] = 'Camera maker'
+        exif[0x0112] = 6  # Rotated 90 degrees clockwise
+        path = self._save(
+            Image.new('RGB', (40, 20), 'red'), 'exif.jpg', exif=exif
+        )
+
+        res = self._post(path)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipie.refresh_from_db()
+        with Image.open(self.recipie.image.path) as stored:
+            self.assertNotIn('exif', stored.info)
+            self.assertEqual(stored.size, (20, 40))
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=1024)
+    def test_oversized_upload_rejected(self):
+        """Test uploads over the byte limit are refused"""
+        res = self._post(self.large_jpeg)
+
+        self.assertEqual(
+            res.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        )
+        self.recipie.refresh_from_db()
+        self.assertFalse(self.recipie.image)
+
+    @override_settings(IMAGE_UPLOAD_MAX_PIXELS=1_000_000)
+    def test_too_many_pixels_rejected_before_decoding(self):
+        """Test dimensions are checked from the header alone"""
+        with patch.object(
+            ImageFile.ImageFile, 'load', autospec=True
+        ) as load:
+            res = self._post(self.large_jpeg)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('6000x4000', str(res.data['image']))
+        load.assert_not_called()
+
+    def test_unsupported_format_rejected(self):
+        """Test only formats we can re-encode are accepted"""
+        path = self._save(Image.new('RGB', (10, 10)), 'image.gif')
+
+        res = self._post(path)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_concurrent_large_images_bounded_memory(self):
+        """Test concurrent large images never decode at full size"""
+        # A fresh process, as the peak of this one may already be higher
+        result = subprocess.run(
+            [sys.executable, '-c', PROCESS_CONCURRENTLY, self.large_jpeg],
+            check=True,
+            capture_output=True,
+            cwd=settings.BASE_DIR,
+            env={
+                **os.environ,
+                'DJANGO_SETTINGS_MODULE': 'app.settings',
+                'IMAGE_MAX_DIMENSION': '512',
+            },
+        )
+        result = json.loads(result.stdout)
+
+        self.assertEqual(result['sizes'], [[512, 341]])
+        # Pillow holds a single full size decode in 72 MB
+        self.assertLess(result['growth'], 64)
@@ -0,0 +1,116 @@
+"""
+Bounded handling of uploaded Recipie images
+
+Uploads are streamed to a temporary file and rejected once they exceed
+IMAGE_UPLOAD_MAX_BYTES. Dimensions are checked from the image header
+before anything is decoded, oversized images are scaled down while
+decoding where the format allows it, and the result is re-encoded
+without metadata. Decoding is limited to IMAGE_DECODE_CONCURRENCY images
+at a time so concurrent large uploads cannot exhaust a worker's memory.
+"""
+
+import math
+import os
+import threading
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image, ImageOps
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+# Pillow format: (extension, content type, save options)
+OUTPUT_FORMATS = {
+    'JPEG': ('.jpg', 'image/jpeg', {'quality': 90, 'optimize': True}),
+    'PNG': ('.png', 'image/png', {'optimize': True}),
+    'WEBP': ('.webp', 'image/webp', {'quality': 90}),
+}
+
+# Room for the multipart boundaries and the other form fields
+MULTIPART_OVERHEAD = 64 * 1024
+
+_decode_slots = None
+_decode_slots_lock = threading.Lock()
+
+
+class ImageTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Uploaded image is too large.'
+    default_code = 'image_too_large'
+
+
+class BoundedImageUploadHandler(TemporaryFileUploadHandler):
+    """Stream uploads to disk, stopping once they pass the size limit"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_bytes = settings.IMAGE_UPLOAD_MAX_BYTES
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        if content_length > self.max_bytes + MULTIPART_OVERHEAD:
+            raise ImageTooLarge()
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.max_bytes:
+            self.upload_interrupted()
+            raise ImageTooLarge()
+        return super().receive_data_chunk(raw_data, start)
+
+
+def _slots():
+    global _decode_slots
+    with _decode_slots_lock:
+        if _decode_slots is None:
+            _decode_slots = threading.BoundedSemaphore(
+                settings.IMAGE_DECODE_CONCURRENCY
+            )
+    return _decode_slots
+
+
+def _open_checked(file):
+    """Open an image, checking its header before any pixels are decoded"""
+    file.seek(0)
+    image = Image.open(file)
+    if image.format not in OUTPUT_FORMATS:
+        raise ValidationError(f'Unsupported image format {image.format}.')
+    width, height = image.size
+    if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+        raise ValidationError(
+            f'Image is {width}x{height} pixels, more than the allowed '
+            f'{settings.IMAGE_UPLOAD_MAX_PIXELS}.'
+        )
+    return image
+
+
+def process_image(file):
+    """Return a size limited, metadata free copy of an uploaded image"""
+    image = _open_checked(file)
+    image_format = image.format
+    extension, content_type, options = OUTPUT_FORMATS[image_format]
+    box = (settings.IMAGE_MAX_DIMENSION, settings.IMAGE_MAX_DIMENSION)
+    name = f'{os.path.splitext(file.name)[0]}{extension}'
+
+    with _slots():
+        scale = min(1, box[0] / image.width, box[1] / image.height)
+        # Let JPEG decode at a reduced scale that still covers the target
+        image.draft('RGB', (
+            math.ceil(image.width * scale), math.ceil(image.height * scale)
+        ))
+        ImageOps.exif_transpose(image, in_place=True)
+        image.thumbnail(box, Image.LANCZOS)
+
+        output = TemporaryUploadedFile(name, content_type, 0, None)
+        # Saving without exif drops EXIF, XMP and comments
+        image.save(
+            output,
+            format=image_format,
+            icc_profile=image.info.get('icc_profile'),
+            **options,
+        )
+        image.close()
+
+    output.size = output.tell()
+    output.seek(0)
+    return output
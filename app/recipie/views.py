@@ -2,6 +2,13 @@
 Views for Recipie App
 '''
 
+from itertools import islice
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import Exists, F, FloatField, OuterRef, Prefetch
+from django.db.models.functions import Cast
+from django.http import StreamingHttpResponse
+
 from drf_spectacular.utils import (
     extend_schema_view,
     extend_schema,
@@ -14,9 +21,9 @@ from rest_framework import (
     mixins,
     status,
 )
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
 from core.models import (
@@ -24,54 +31,216 @@ from core.models import (
     Tag,
     Ingredient,
 )
+from core.timing import ServerTimingMixin
 from recipie import serializers
+from recipie.async_views import AsyncReadMixin
+from recipie.cache import CachedListMixin
+from recipie.images import schedule_variants
+from recipie.projections import (
+    RELATIONS,
+    ProjectedListMixin,
+    RecipieProjection,
+)
+from recipie.uploads import BoundedImageUploadHandler
+from recipie.conditional import (
+    ConditionalRequestMixin,
+    ConditionalRetrieveMixin,
+)
+from user.authentication import CachedTokenAuthentication
+from recipie.renderers import NDJSONRenderer, CSVRenderer
+from recipie.pagination import (
+    RecipieCursorPagination,
+    RecipieAttrCursorPagination,
+)
+
+
+SPARSE_PARAMETERS = [
+    OpenApiParameter(
+        'fields',
+        OpenApiTypes.STR,
+        description="Comma separated list of fields to return"
+    ),
+    OpenApiParameter(
+        'expand',
+        OpenApiTypes.STR,
+        description=(
+            "Comma separated relations (tags, ingredients) to return as "
+            "objects. Relations left out are returned as id arrays"
+        )
+    ),
+]
+
+
+FILTER_PARAMETERS = [
+    OpenApiParameter(
+        'tags',
+        OpenApiTypes.STR,
+        description="Comma separated list of Tag ids to filter"
+    ),
+    OpenApiParameter(
+        'ingredients',
+        OpenApiTypes.STR,
+        description="Comma separated list of ingredient ids to filter"
+    ),
+    OpenApiParameter(
+        'q',
+        OpenApiTypes.STR,
+        description="Full text search over title and description"
+    ),
+    OpenApiParameter(
+        'match',
+        OpenApiTypes.STR, enum=['any', 'all'],
+        description="Match any (default) or all of the given ids"
+    ),
+]
 
 
 @extend_schema_view(
-    list=extend_schema(
-        parameters=[
-            OpenApiParameter(
-                'tags',
-                OpenApiTypes.STR,
-                description="Comma separated list of Tag ids to filter"
-            ),
-            OpenApiParameter(
-                'ingredients',
-                OpenApiTypes.STR,
-                description="Comma separated list of ingredient ids to filter"
-            )
-        ]
-    )
+    retrieve=extend_schema(parameters=SPARSE_PARAMETERS),
+    list=extend_schema(parameters=SPARSE_PARAMETERS + FILTER_PARAMETERS),
+    export=extend_schema(
+        parameters=FILTER_PARAMETERS,
+        responses={
+            (200, 'application/x-ndjson'): OpenApiTypes.STR,
+            (200, 'text/csv'): OpenApiTypes.STR,
+        },
+    ),
 )
-class RecipieViewSets(viewsets.ModelViewSet):
+class RecipieViewSets(
+    ServerTimingMixin,
+    ConditionalRetrieveMixin,
+    CachedListMixin,
+    ProjectedListMixin,
+    AsyncReadMixin,
+    viewsets.ModelViewSet,
+):
     """View for manage for recipie APIs"""
 
     serializer_class = serializers.RecipieDetailSerializer
     queryset = Recipie.objects.all()
-    authentication_classes = [TokenAuthentication, ]
+    authentication_classes = [CachedTokenAuthentication, ]
     permission_classes = [IsAuthenticated, ]
+    pagination_class = RecipieCursorPagination
+    export_chunk_size = 2000
 
     def _params_to_ints(self, params):
         '''Converts string parameters to integers'''
         return [int(str_id) for str_id in params.split(',')]
 
+    def _filter_by_related(self, queryset, through, field, ids, match):
+        """Filter recipies linked to the given ids with EXISTS subqueries"""
+        links = through.objects.filter(recipie_id=OuterRef('pk'))
+        if match == 'all':
+            for related_id in ids:
+                queryset = queryset.filter(
+                    Exists(links.filter(**{field: related_id}))
+                )
+            return queryset
+        return queryset.filter(
+            Exists(links.filter(**{f'{field}__in': ids}))
+        )
+
     def get_queryset(self):
         """Retrive Recipies for authenticated users"""
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
+        match = self.request.query_params.get('match', 'any')
+        search = self.request.query_params.get('q', '').strip()
         queryset = self.queryset
 
+        if search:
+            query = SearchQuery(
+                search, config='english', search_type='websearch'
+            )
+            # ts_rank returns a real; cast so cursors round-trip exactly
+            queryset = queryset.filter(search_vector=query).annotate(
+                rank=Cast(SearchRank(F('search_vector'), query), FloatField())
+            )
+
+        if match not in ('any', 'all'):
+            raise ValidationError({'match': "Must be 'any' or 'all'."})
+
         if tags:
             tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
+            queryset = self._filter_by_related(
+                queryset, Recipie.tags.through, 'tag_id', tag_ids, match
+            )
 
         if ingredients:
             ingredients_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredients_ids)
+            queryset = self._filter_by_related(
+                queryset,
+                Recipie.ingredients.through,
+                'ingredient_id',
+                ingredients_ids,
+                match,
+            )
 
-        return queryset.filter(
-            user=self.request.user
-        ).order_by('-id').distinct()
+        ordering = ['-rank', '-id'] if search else ['-id']
+        queryset = queryset.filter(user=self.request.user).order_by(*ordering)
+
+        if self.action == 'list' and self.projected_list:
+            # Columns and relations are picked by get_projection()
+            return queryset
+        if self.action in ('list', 'retrieve'):
+            return self._narrow_queryset(queryset)
+        return queryset.prefetch_related(
+            *(self._related(name) for name in RELATIONS)
+        )
+
+    def _names_param(self, name, allowed):
+        """Parse a comma separated param, rejecting unknown names"""
+        names = serializers.parse_field_list(self.request.query_params[name])
+        unknown = names - allowed
+        if unknown:
+            raise ValidationError(
+                {name: f"Unknown names: {', '.join(sorted(unknown))}"}
+            )
+        return names
+
+    def _sparse_selection(self):
+        """Return the fields in serializer order and relations to expand"""
+        params = self.request.query_params
+        available = self.get_serializer_class().Meta.fields
+        relations = set(serializers.RecipieSerializer.expandable_fields)
+
+        fields = available
+        if params.get('fields'):
+            wanted = self._names_param('fields', set(available))
+            fields = [name for name in available if name in wanted]
+
+        expand = relations
+        if 'expand' in params:
+            expand = self._names_param('expand', relations)
+        return fields, expand
+
+    def _related(self, name, expand=True):
+        """Prefetch a relation in id order, as the list projection does"""
+        related_model = Recipie._meta.get_field(name).related_model
+        queryset = related_model.objects.order_by('id')
+        if not expand:
+            queryset = queryset.only('id')
+        return Prefetch(name, queryset=queryset)
+
+    def _narrow_queryset(self, queryset):
+        """Load only the columns and relations the response will show"""
+        fields, expand = self._sparse_selection()
+        relations = set(serializers.RecipieSerializer.expandable_fields)
+
+        columns = set(fields) - relations
+        if 'image_variants' in columns:
+            columns.add('image')
+        queryset = queryset.only('id', *columns)
+        for name in sorted(set(fields) & relations):
+            queryset = queryset.prefetch_related(
+                self._related(name, name in expand)
+            )
+        return queryset
+
+    def get_projection(self):
+        """Build list rows from values() in the shape of the serializer"""
+        fields, expand = self._sparse_selection()
+        return RecipieProjection(self.request, fields, expand)
 
     def get_serializer_class(self):
         """Return the Serializer class for a request"""
@@ -83,18 +252,53 @@ class RecipieViewSets(viewsets.ModelViewSet):
             return serializers.RecipieImageSerializer
         return self.serializer_class
 
+    def get_serializer(self, *args, **kwargs):
+        """Accept a list of recipies to create them in bulk"""
+        if self.action == 'create' and isinstance(kwargs.get('data'), list):
+            kwargs['many'] = True
+        return super().get_serializer(*args, **kwargs)
+
     def perform_create(self, serializer):
         """Create a new Recipie"""
         serializer.save(user=self.request.user)
 
+    def _export_rows(self, queryset):
+        """Yield serialized recipies one chunk at a time"""
+        rows = queryset.iterator(chunk_size=self.export_chunk_size)
+        context = self.get_serializer_context()
+        while chunk := list(islice(rows, self.export_chunk_size)):
+            yield from serializers.RecipieDetailSerializer(
+                chunk, many=True, context=context
+            ).data
+
+    @action(
+        methods=['GET'],
+        detail=False,
+        renderer_classes=[NDJSONRenderer, CSVRenderer],
+    )
+    def export(self, request):
+        """Stream every matching recipie as NDJSON or CSV"""
+        renderer = request.accepted_renderer
+        queryset = self.filter_queryset(self.get_queryset())
+        response = StreamingHttpResponse(
+            renderer.stream(self._export_rows(queryset)),
+            content_type=renderer.media_type,
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="recipies.{renderer.format}"'
+        )
+        return response
+
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
         """Upload a new Image to the Recipie"""
+        request.upload_handlers = [BoundedImageUploadHandler(request)]
         recipie = self.get_object()
         serializer = self.get_serializer(recipie, data=request.data)
 
         if serializer.is_valid():
-            serializer.save()
+            recipie = serializer.save()
+            schedule_variants(recipie)
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -111,14 +315,20 @@ class RecipieViewSets(viewsets.ModelViewSet):
     )
 )
 class BaseRecipieAttrViewSet(
+    ServerTimingMixin,
+    ConditionalRequestMixin,
+    CachedListMixin,
+    ProjectedListMixin,
+    AsyncReadMixin,
     viewsets.GenericViewSet,
     mixins.ListModelMixin,
     mixins.UpdateModelMixin,
     mixins.DestroyModelMixin
 ):
     """Base ViewSet for recipie attributes"""
-    authentication_classes = [TokenAuthentication, ]
+    authentication_classes = [CachedTokenAuthentication, ]
     permission_classes = [IsAuthenticated, ]
+    pagination_class = RecipieAttrCursorPagination
 
     def get_queryset(self):
         """Filter QuerySet based on Login User"""
@@ -128,11 +338,16 @@ class BaseRecipieAttrViewSet(
         queryset = self.queryset
 
         if assigned_only:
-            queryset = queryset.filter(recipie__isnull=False)
+            model = queryset.model
+            queryset = queryset.filter(Exists(
+                model.recipie_set.through.objects.filter(**{
+                    f'{model._meta.model_name}_id': OuterRef('pk'),
+                })
+            ))
 
         return queryset.filter(
             user=self.request.user
-        ).order_by('-name').distinct()
+        ).order_by('-name')
 
 
 class TagViewSet(BaseRecipieAttrViewSet):
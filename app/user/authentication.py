@@ -0,0 +1,65 @@
+"""Authentication classes for the API"""
+
+import hashlib
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import router
+from rest_framework.authentication import TokenAuthentication
+
+TOKEN_CACHE_ALIAS = 'auth_tokens'
+
+# User fields kept in the token cache; the rest load on first access
+CACHED_USER_FIELDS = ('id', 'is_active', 'is_staff', 'is_superuser')
+
+
+def token_cache_key(key):
+    """Return the cache key for a token without storing it in clear"""
+    return 'auth-token:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def invalidate_token(key):
+    """Drop a cached token so the next request re-reads the database"""
+    caches[TOKEN_CACHE_ALIAS].delete(token_cache_key(key))
+
+
+def _from_cache(model, values):
+    """Return an instance holding only the cached field values"""
+    fields = [
+        field.attname for field in model._meta.concrete_fields
+        if field.attname in values
+    ]
+    return model.from_db(
+        router.db_for_read(model),
+        fields,
+        [values[name] for name in fields],
+    )
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication that caches token to user lookups
+
+    Only the user's id and flags are cached, never the password hash or
+    profile. Other fields of request.user are deferred and read from the
+    database when first used.
+
+    Entries expire after the cache TIMEOUT and are dropped by the
+    signals in user.signals when a token is deleted or its user saved.
+    Failed lookups are never cached.
+    """
+
+    def authenticate_credentials(self, key):
+        cache = caches[TOKEN_CACHE_ALIAS]
+        cache_key = token_cache_key(key)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            user = _from_cache(get_user_model(), cached)
+            token = _from_cache(self.get_model(), {'key': key})
+            token.user = user
+            return user, token
+
+        user, token = super().authenticate_credentials(key)
+        cache.set(cache_key, {
+            name: getattr(user, name) for name in CACHED_USER_FIELDS
+        })
+        return user, token
@@ -0,0 +1,25 @@
+"""Signal handlers keeping the token cache in sync"""
+
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from user.authentication import invalidate_token
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """Forget a token once it is deleted"""
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    """Forget a user's token when the user changes, e.g. is deactivated"""
+    if created:
+        return
+    for key in Token.objects.filter(user=instance).values_list(
+        'key', flat=True
+    ):
+        invalidate_token(key)
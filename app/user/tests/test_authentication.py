@@ -0,0 +1,126 @@
+"""
+Tests for cached token authentication
+"""
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from user.authentication import TOKEN_CACHE_ALIAS, token_cache_key
+
+ME_URL = reverse('user:me')
+RECIPIE_URL = reverse('recipie:recipie-list')
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Tests for token authentication backed by the cache"""
+
+    def setUp(self):
+        caches[TOKEN_CACHE_ALIAS].clear()
+        self.user = get_user_model().objects.create_user(
+            email='test@example.com',
+            password='testpassword123',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_warm_request_skips_database(self):
+        """Test a cached token and list are served without queries"""
+        self.client.get(RECIPIE_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(RECIPIE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_user_endpoint_uses_cache(self):
+        """Test the user endpoint only reads the user, not the token"""
+        self.client.get(ME_URL)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], self.user.email)
+
+    def test_cache_holds_no_password(self):
+        """Test only the user's id and flags are cached"""
+        self.client.get(ME_URL)
+
+        cached = caches[TOKEN_CACHE_ALIAS].get(token_cache_key(self.token.key))
+
+        self.assertEqual(cached, {
+            'id': self.user.pk,
+            'is_active': True,
+            'is_staff': False,
+            'is_superuser': False,
+        })
+
+    def test_cache_shared_between_processes(self):
+        """Test a token dropped by another cache instance is re-read
+
+        A separate instance stands in for the cache of another worker.
+        """
+        self.client.get(RECIPIE_URL)
+
+        other = caches.create_connection(TOKEN_CACHE_ALIAS)
+        other.delete(token_cache_key(self.token.key))
+
+        with self.assertNumQueries(1):
+            self.client.get(RECIPIE_URL)
+
+    def test_update_reads_current_user(self):
+        """Test updating the user does not save a cached copy over changes"""
+        self.client.get(ME_URL)
+        get_user_model().objects.filter(pk=self.user.pk).update(
+            name='Changed elsewhere'
+        )
+
+        res = self.client.patch(ME_URL, {'password': 'newpassword123'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.name, 'Changed elsewhere')
+        self.assertTrue(self.user.check_password('newpassword123'))
+
+    def test_deleted_token_rejected(self):
+        """Test deleting a token invalidates the cached entry"""
+        self.client.get(ME_URL)
+
+        self.token.delete()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_user_rejected(self):
+        """Test deleting a user invalidates the cached token"""
+        self.client.get(ME_URL)
+
+        self.user.delete()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_rejected(self):
+        """Test deactivating a user invalidates the cached token"""
+        self.client.get(ME_URL)
+
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_invalid_token_rejected(self):
+        """Test unknown tokens are rejected"""
+        self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
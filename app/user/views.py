@@ -1,31 +1,38 @@
 """Views for USer API"""
 
-from rest_framework import generics, authentication, permissions
+from django.contrib.auth import get_user_model
+from rest_framework import generics, permissions
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
+from core.timing import ServerTimingMixin
+from user.authentication import CachedTokenAuthentication
 from user.serializers import (
     UserSerializer,
     AuthTokenSerializer,
 )
 
 
-class CreateUserView(generics.CreateAPIView):
+class CreateUserView(ServerTimingMixin, generics.CreateAPIView):
     """Create a new user in system"""
     serializer_class = UserSerializer
 
 
-class CreateTokenView(ObtainAuthToken):
+class CreateTokenView(ServerTimingMixin, ObtainAuthToken):
     '''Authentication using Token'''
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+class ManageUserView(ServerTimingMixin, generics.RetrieveUpdateAPIView):
     """Manage Authenticated User"""
     serializer_class = UserSerializer
-    authentication_classes = [authentication.TokenAuthentication,]
+    authentication_classes = [CachedTokenAuthentication,]
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
-        """retrive and return the authenticated user"""
-        return self.request.user
+        """retrive and return the authenticated user
+
+        Read afresh, as request.user may come from the token cache and
+        saving a stale copy would undo concurrent changes.
+        """
+        return get_user_model().objects.get(pk=self.request.user.pk)